@@ -0,0 +1,170 @@
+import queue
+import socket
+import threading
+import time
+
+from Crypto.Cipher import AES
+
+from latency_trace import now_us
+from pipeline_log import get_logger
+
+# Movement class senders for the robot (FireBeetle, XOR over TCP, waits for an ACK) and
+# Unity (AES-CBC over TCP), shared by the bridge (tcp_unity.py) and the publisher's
+# direct mode. Each sink has its own lock held across connect / send / ACK, so two
+# callers never interleave on one socket; ActuatorQueue runs the sends on one thread
+# so a reconnect or a slow ACK never blocks the caller (e.g. a direct-link reader).
+XOR_KEY = bytes([0x55, 0xAA, 0x33, 0xCC, 0x0F, 0xF0, 0x99, 0x66,
+                 0x12, 0x34, 0x56, 0x78, 0xAB, 0xCD, 0xEF, 0x01])
+AES_KEY = b"1234567890abcdef"
+CONNECT_TIMEOUT_S = 10
+RETRY_S = 3
+
+log = get_logger("actuators")
+
+
+class Actuators:
+    """FireBeetle and Unity TCP sinks, connected on first use and after a send error"""
+
+    def __init__(self, firebeetle_addr, unity_addr, xor_key=XOR_KEY, aes_key=AES_KEY):
+        self.firebeetle_addr = firebeetle_addr
+        self.unity_addr = unity_addr
+        self.xor_key = xor_key
+        self.aes_key = aes_key
+        self.firebeetle_socket = None
+        self.unity_socket = None
+        self.firebeetle_lock = threading.Lock()
+        self.unity_lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def _connect(self, name, addr):
+        """Connect, retrying every RETRY_S until it succeeds or close() is called"""
+        while not self.stopping.is_set():
+            try:
+                sock = socket.create_connection(addr, timeout=CONNECT_TIMEOUT_S)
+                log.info("Connected to %s", name)
+                return sock
+            except OSError as e:
+                log.warning("%s connection failed: %s, retrying...", name, e)
+                self.stopping.wait(RETRY_S)
+        return None
+
+    def connect(self):
+        """Connect whichever sink is not connected"""
+        with self.firebeetle_lock:
+            if self.firebeetle_socket is None:
+                self.firebeetle_socket = self._connect("FireBeetle", self.firebeetle_addr)
+        with self.unity_lock:
+            if self.unity_socket is None:
+                self.unity_socket = self._connect("Unity", self.unity_addr)
+
+    def send_to_firebeetle(self, movement_class: int):
+        """Send a movement class to the robot; returns the send time (latency_trace clock) or None"""
+        with self.firebeetle_lock:
+            if self.firebeetle_socket is None:
+                self.firebeetle_socket = self._connect("FireBeetle", self.firebeetle_addr)
+                if self.firebeetle_socket is None:
+                    return None
+            try:
+                plaintext = str(movement_class).encode('utf-8').ljust(16, b'\x00')
+                encrypted = bytes([plaintext[i] ^ self.xor_key[i] for i in range(16)])
+                log.debug("Sending to FireBeetle: %s", movement_class)
+                self.firebeetle_socket.sendall(encrypted)
+                sent_us = now_us()
+
+                try:
+                    ack = self.firebeetle_socket.recv(1024)
+                    log.debug("FireBeetle ACK: %s", ack.decode().strip())
+                except socket.timeout:
+                    log.warning("No ACK received")
+                return sent_us
+            except Exception as e:
+                log.error("FireBeetle send error: %s", e)
+                self.firebeetle_socket.close()
+                self.firebeetle_socket = None
+                return None
+
+    def send_to_unity(self, movement_class: int):
+        with self.unity_lock:
+            if self.unity_socket is None:
+                self.unity_socket = self._connect("Unity", self.unity_addr)
+                if self.unity_socket is None:
+                    return
+            try:
+                cipher = AES.new(self.aes_key, AES.MODE_CBC, iv=b'\x00' * 16)
+                plaintext = str(movement_class).encode('utf-8').ljust(16, b'\x00')
+                encrypted = cipher.encrypt(plaintext)
+
+                log.debug("Sending to Unity: %s", movement_class)
+                self.unity_socket.sendall(encrypted)
+            except Exception as e:
+                log.error("Unity send error: %s", e)
+                self.unity_socket.close()
+                self.unity_socket = None
+
+    def send(self, movement_class: int):
+        """Robot then Unity; returns the robot send time or None"""
+        sent_us = self.send_to_firebeetle(movement_class)
+        self.send_to_unity(movement_class)
+        return sent_us
+
+    def close(self):
+        self.stopping.set()
+        with self.firebeetle_lock:
+            if self.firebeetle_socket:
+                self.firebeetle_socket.close()
+                self.firebeetle_socket = None
+        with self.unity_lock:
+            if self.unity_socket:
+                self.unity_socket.close()
+                self.unity_socket = None
+
+
+class ActuatorQueue:
+    """
+    One actuator thread: submit() queues a movement class and returns at once, the
+    thread sends it and calls on_sent(movement_class, sent_us, send_ms, context).
+    """
+
+    def __init__(self, actuators, on_sent=None, queue_size=64):
+        self.actuators = actuators
+        self.on_sent = on_sent
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker = None
+        self.dropped = 0
+
+    def submit(self, movement_class, context=None):
+        """Queue a movement class; returns False (and counts a drop) if the queue is full"""
+        try:
+            self.queue.put_nowait((movement_class, context))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        self.worker = threading.Thread(target=self._run_worker, daemon=True)
+        self.worker.start()
+        return self
+
+    def stop(self):
+        self.actuators.close()    # ends a reconnect loop the worker may be in
+        if self.worker:
+            try:
+                self.queue.put((None, None), timeout=1)
+            except queue.Full:
+                pass
+            self.worker.join(timeout=2)
+            self.worker = None
+
+    def _run_worker(self):
+        while True:
+            movement_class, context = self.queue.get()
+            if movement_class is None:
+                break
+            start = time.perf_counter()
+            sent_us = self.actuators.send(movement_class)
+            if self.on_sent:
+                try:
+                    self.on_sent(movement_class, sent_us, (time.perf_counter() - start) * 1000, context)
+                except Exception as e:
+                    log.error("Actuator result handler error: %s", e)
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import timeit
+
+# Isolated hot-path timings, next to the end-to-end numbers of bench_pipeline.py:
+# CRC16, AES decrypt, IMU text parsing, binary frame processing (71-byte CRC packets
+# of ultra96_mqtt.py and 120-byte frames of ultra96_ai.py), the CSV log write and
+# the JSON encoding of the response documents. Each benchmark calls the repo's own
+# function on a representative input (components are built without their network
+# setup); the figure is the best of `repeat` timeit runs in us per call, the usual
+# timeit practice since noise only ever adds time.
+#   --save-baseline  store the timings (with commit / host) as the baseline
+#   --check          exit 1 if any hot path is slower than the baseline by > margin
+# Baselines are per machine: save one on the board / laptop that runs the check.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_micro_baseline.json")
+DEFAULT_MARGIN = 0.25
+
+
+def _imu_values():
+    return [0.012 * i - 0.2 if i % 6 < 3 else 1.5 * i - 20.0 for i in range(30)]
+
+
+def build_benchmarks(workdir):
+    """name -> zero-argument callable running one hot-path call"""
+    if REPO_ROOT not in sys.path:
+        sys.path.append(REPO_ROOT)
+    from imu_features import DEFAULT_WINDOW_SIZE, FrameWindow
+    from hardware_mqtt_tcp_temp import FireBeetleMQTTPublisher
+    from load_generator import encrypted_line
+    from serializer import dumps_response, sample_response
+    from ultra96_ai import Ultra96MQTTSubscriber
+    from ultra96_mqtt import Ultra96ProcessorMQTT
+    import metrics
+
+    values = _imu_values()
+    line = encrypted_line(values).strip()
+    text = ";".join(f"IMU{imu}:" + ",".join(f"{v:.3f}" for v in values[imu * 6:imu * 6 + 6]) for imu in range(5))
+    frame = struct.pack("!30f", *values)
+    # FireBeetle SENSOR_DATA packet, packed (fakeFB's native-aligned header makes it 74 bytes)
+    readings_71 = [int(v * 1000) if i % 6 < 3 else int(v * 100) for i, v in enumerate(values)]
+    packet = struct.pack("<BII30h", 0x10, 42, 1430326798, *(readings_71[imu * 6 + axis]
+                                                           for axis in range(6) for imu in range(5)))
+
+    publisher = FireBeetleMQTTPublisher()
+
+    # Processing objects without their MQTT clients; CSV logs go to workdir
+    processor = Ultra96ProcessorMQTT.__new__(Ultra96ProcessorMQTT)
+    processor.session_counter = 1000
+    processor.csv_file = os.path.join(workdir, "imu_data_71.csv")
+    packet += struct.pack("<H", processor.calculate_crc16(packet))
+    subscriber = Ultra96MQTTSubscriber.__new__(Ultra96MQTTSubscriber)
+    subscriber.session_counter = 1000
+    subscriber.csv_file = os.path.join(workdir, "imu_data_120.csv")
+    subscriber.parse_hist = metrics.histogram("parse")
+    subscriber.log_write_hist = metrics.histogram("log_write")
+    window = FrameWindow(DEFAULT_WINDOW_SIZE)
+    readings = subscriber.process_binary_sensor_data(frame, window)["sensor_data"]
+
+    response_71 = sample_response()
+    response_120 = {"source": socket.gethostname(), "movement_class": 2, "confidence": 0.9731,
+                    "inference_ms": 0.412, "status": "success", "session_id": 1000, "sequence": 42,
+                    "timestamp": "2025-10-16T12:00:00.123456"}
+    return {
+        "crc16_69B": lambda: processor.calculate_crc16(packet[:69]),
+        "decrypt_data": lambda: publisher.decrypt_data(line),
+        "parse_imu_data": lambda: publisher.parse_imu_data(text),
+        "process_binary_71B": lambda: processor.process_binary_sensor_data(packet),
+        "process_binary_120B": lambda: subscriber.process_binary_sensor_data(frame, window),
+        "write_to_csv": lambda: subscriber.write_to_csv(readings),
+        "json_dumps_response_71B": lambda: json.dumps(response_71),
+        "dumps_response_71B": lambda: dumps_response(response_71),
+        "json_dumps_result_120B": lambda: json.dumps(response_120),
+    }
+
+
+def run(benchmarks, repeat=5, min_time_s=0.2, only=None):
+    """name -> best us per call"""
+    results = {}
+    for name, fn in benchmarks.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        number = max(1, int(number * min_time_s / 0.2))
+        best = min(timer.repeat(repeat, number)) / number
+        results[name] = round(best * 1e6, 3)
+    return results
+
+
+def check(results, baseline, margin):
+    """(report lines, names slower than baseline * (1 + margin))"""
+    lines = [f"{'benchmark':<26} {'us/call':>10} {'baseline':>10} {'change':>8}"]
+    regressions = []
+    for name, us in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            lines.append(f"{name:<26} {us:>10.3f} {'-':>10} {'new':>8}")
+            continue
+        change = (us - base) / base
+        flag = ""
+        if change > margin:
+            regressions.append(name)
+            flag = "  SLOWER"
+        lines.append(f"{name:<26} {us:>10.3f} {base:>10.3f} {100 * change:>+7.1f}%{flag}")
+    return lines, regressions
+
+
+def git_commit():
+    from bench_pipeline import git_commit as commit
+    return commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks with a baseline regression check")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timeit run")
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name contains one of these")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these timings as the baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a regression beyond --margin")
+    parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--out", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_micro_")
+    results = run(build_benchmarks(workdir), args.repeat, args.min_time, args.only)
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+    record = {"commit": git_commit(), "host": socket.gethostname(), "python": sys.version.split()[0],
+              "results": results}
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(record, file, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print("=" * 60)
+    if baseline:
+        print(f"Baseline: commit {baseline.get('commit')} on {baseline.get('host')} (margin {100 * args.margin:g}%)")
+        lines, regressions = check(results, baseline, args.margin)
+        print("\n".join(lines))
+    else:
+        regressions = []
+        for name, us in results.items():
+            print(f"{name:<26} {us:>10.3f} us/call")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(record, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.check:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            sys.exit(2)
+        if regressions:
+            print(f"Regression beyond {100 * args.margin:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions")
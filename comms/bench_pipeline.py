@@ -0,0 +1,407 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from metrics import histogram_delta
+
+# End-to-end pipeline benchmark on localhost, one process per component:
+#   load (load_generator.py gloves or a session_recorder.py replay)
+#     -> publisher (hardware_mqtt_tcp_temp.py) -> broker (mini_broker.py)
+#     -> Ultra96MQTTSubscriber -> broker -> bridge (tcp_unity.py)
+#     -> stub FireBeetle (ACKs every command) / Unity sinks in this process
+# Components run unmodified; only their endpoints, metrics ports and TLS settings are
+# overridden. After warmup_s the measurement window starts: sustained frames/s come
+# from the counters on each process's /metrics.json, end-to-end latency from the
+# bridge's end_to_end histogram (traced results, publisher tcp_rx -> FireBeetle send;
+# the bucket delta over the window, so warmup is left out), CPU (% of one core) and peak RSS per process
+# from psutil or /proc. Results go to a JSON file with the git commit, so runs can
+# be compared with --compare.
+ROLES = ("broker", "ultra96", "bridge", "publisher", "load")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ---------------- Component processes ----------------
+def _client_tls(config):
+    """(context, configure(paho client)) for the bench: bench certificates or plain TCP (None)"""
+    from tls_context import client_context
+
+    if not config["ca"]:
+        return None, lambda client: None
+    context = client_context(config["ca"], config["cert"], config["key"])
+    return context, lambda client: client.tls_set_context(context)
+
+
+def _plain_tcp(module):
+    """Components log TLS handshake stats on connect; without TLS there are none"""
+    module.client_context = lambda *args, **kwargs: None
+    module.handshake_stats = lambda context: {}
+
+
+def run_role(role, config):
+    """Child process entry point: start one component against the bench endpoints"""
+    os.chdir(config["workdir"])
+    if REPO_ROOT not in sys.path:
+        sys.path.append(REPO_ROOT)
+    from pipeline_log import setup_logging
+
+    setup_logging()     # the component's own __main__ would have done this
+    ports = config["ports"]
+    tls_context, configure = _client_tls(config)
+
+    if role == "broker":
+        from mini_broker import MiniBroker
+        from tls_context import server_context
+
+        context = server_context(config["server_cert"], config["server_key"]) if config["ca"] else None
+        broker = MiniBroker("127.0.0.1", ports["broker"], context).start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            broker.stop()
+
+    elif role == "ultra96":
+        import ultra96_ai
+        from inference_engine import create_backend
+        from prediction_filter import PredictionSmoother
+
+        if not config["ca"]:
+            _plain_tcp(ultra96_ai)
+
+        def configure_tls(self, client):
+            self.tls_context = tls_context
+            configure(client)
+
+        ultra96_ai.Ultra96MQTTSubscriber.configure_tls = configure_tls
+        subscriber = ultra96_ai.Ultra96MQTTSubscriber()
+        subscriber.MQTT_BROKER = "127.0.0.1"
+        subscriber.MQTT_PORT = ports["broker"]
+        subscriber.METRICS_PORT = ports["ultra96_metrics"]
+        if config["backend"]:
+            subscriber.AI_BACKEND = config["backend"]
+            subscriber.engine.backend = create_backend(config["backend"])
+        if config["every_window"]:
+            # Classify (and send) every window instead of completed gestures only
+            subscriber.SEGMENTATION_ENABLED = False
+            source_state = subscriber.source_state
+
+            def every_window_state(source):
+                state = source_state(source)
+                if state.frames == 0:
+                    state.smoother = PredictionSmoother(vote_size=1, min_votes=1, cooldown_s=0.0,
+                                                        suppress_repeats=False)
+                return state
+
+            subscriber.source_state = every_window_state
+        subscriber.start()
+
+    elif role == "bridge":
+        import tcp_unity
+
+        if not config["ca"]:
+            _plain_tcp(tcp_unity)
+        tcp_unity.configure_tls = configure
+        tcp_unity.BROKER_IP = "127.0.0.1"
+        tcp_unity.BROKER_PORT = ports["broker"]
+        tcp_unity.FIREBEETLE_IP = tcp_unity.UNITY_IP = "127.0.0.1"
+        tcp_unity.FIREBEETLE_PORT = ports["firebeetle"]
+        tcp_unity.UNITY_PORT = ports["unity"]
+        tcp_unity.METRICS_PORT = ports["bridge_metrics"]
+        tcp_unity.main()
+
+    elif role == "publisher":
+        import hardware_mqtt_tcp_temp
+
+        if not config["ca"]:
+            _plain_tcp(hardware_mqtt_tcp_temp)
+        publisher = hardware_mqtt_tcp_temp.FireBeetleMQTTPublisher()
+        publisher.configure_tls = configure
+        publisher.MQTT_BROKER = "127.0.0.1"
+        publisher.MQTT_PORT = ports["broker"]
+        publisher.TCP_IP = "127.0.0.1"
+        publisher.TCP_PORT = ports["publisher"]
+        publisher.METRICS_PORT = ports["publisher_metrics"]
+        publisher.TRACE_EVERY = config["trace_every"]
+        publisher.BATCH_MAX_DELAY_MS = config["batch_ms"]
+        publisher.start()
+
+    elif role == "load":
+        stopping = threading.Event()
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+        if config["replay"]:
+            from session_recorder import TCPReplayTarget, read_session, replay
+
+            target = TCPReplayTarget("127.0.0.1", ports["publisher"])
+            while not stopping.is_set():
+                replay(read_session(config["replay"]), target, config["speed"])
+            target.close()
+            return
+        import load_generator
+
+        threads = []
+        for i in range(config["gloves"]):
+            glove = load_generator.Glove(f"glove{i}", config["rate"], config["profile"], config["jitter_ms"], "tcp", i)
+            send, close = load_generator.tcp_sender("127.0.0.1", ports["publisher"])
+            thread = threading.Thread(target=glove.run, args=(send, float("inf"), stopping), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+
+# ---------------- Stub actuators ----------------
+class Sink:
+    """TCP server standing in for the FireBeetle (ACK per 16-byte command) or Unity"""
+
+    def __init__(self, port, ack=False):
+        self.ack = ack
+        self.messages = 0
+        self.server = socket.socket()
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", port))
+        self.server.listen(4)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        buffer = b""
+        with conn:
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    return
+                buffer += data
+                while len(buffer) >= 16:
+                    buffer = buffer[16:]
+                    self.messages += 1
+                    if self.ack:
+                        conn.sendall(b"ACK\n")
+
+    def close(self):
+        self.server.close()
+
+
+# ---------------- Measurement ----------------
+def fetch_metrics(port, timeout=1.0):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics.json?buckets=1", timeout=timeout) as response:
+            return json.loads(response.read())
+    except OSError:
+        return None
+
+
+def process_usage(pid):
+    """(CPU seconds, RSS bytes) of a process, None where neither psutil nor /proc is available"""
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        cpu = process.cpu_times()
+        return cpu.user + cpu.system, process.memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as file:
+            rss_pages = int(file.read().split()[1])
+        return ((int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"),
+                rss_pages * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _rate(before, after, name, elapsed_s):
+    if not before or not after:
+        return None
+    return round((after["counters"].get(name, 0) - before["counters"].get(name, 0)) / elapsed_s, 1)
+
+
+def run_benchmark(args):
+    ports = {name: free_port() for name in ("broker", "publisher", "firebeetle", "unity", "publisher_metrics",
+                                            "ultra96_metrics", "bridge_metrics")}
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    config = {
+        "ports": ports, "workdir": workdir,
+        "ca": args.ca, "cert": args.cert, "key": args.key,
+        "server_cert": args.server_cert, "server_key": args.server_key,
+        "backend": args.backend, "every_window": args.every_window, "batch_ms": args.batch_ms,
+        "trace_every": args.trace_every,
+        "gloves": args.gloves, "rate": args.rate, "profile": args.profile, "jitter_ms": args.jitter_ms,
+        "replay": os.path.abspath(args.replay) if args.replay else None, "speed": args.speed,
+    }
+    os.environ["PIPELINE_LOG_LEVEL"] = args.log_level
+    firebeetle = Sink(ports["firebeetle"], ack=True)
+    unity = Sink(ports["unity"])
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    for role in ROLES:
+        processes[role] = context.Process(target=run_role, args=(role, config), name=role, daemon=True)
+        processes[role].start()
+        time.sleep(0.5 if role == "broker" else 0.2)
+
+    metric_ports = {"publisher": ports["publisher_metrics"], "ultra96": ports["ultra96_metrics"],
+                    "bridge": ports["bridge_metrics"]}
+    load = f"replay of {args.replay} at {args.speed:g}x" if args.replay else \
+        f"{args.gloves} gloves x {args.rate:g} Hz ({args.profile})"
+    print(f"Pipeline up ({load}), warming up for {args.warmup:g} s...")
+    time.sleep(args.warmup)
+
+    before = {role: fetch_metrics(port) for role, port in metric_ports.items()}
+    usage_before = {role: process_usage(p.pid) for role, p in processes.items()}
+    actuated_before = firebeetle.messages
+    peak_rss = {role: 0 for role in processes}
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        time.sleep(0.5)
+        for role, process in processes.items():
+            usage = process_usage(process.pid)
+            if usage:
+                peak_rss[role] = max(peak_rss[role], usage[1])
+    elapsed_s = time.perf_counter() - start
+    after = {role: fetch_metrics(port) for role, port in metric_ports.items()}
+    usage_after = {role: process_usage(p.pid) for role, p in processes.items()}
+    actuated = firebeetle.messages - actuated_before
+
+    for role in reversed(ROLES):
+        process = processes[role]
+        if process.is_alive():
+            if hasattr(signal, "pthread_kill"):
+                os.kill(process.pid, signal.SIGINT)     # normal Ctrl+C shutdown of the component
+            else:
+                process.terminate()
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+    firebeetle.close()
+    unity.close()
+    shutil.rmtree(workdir, ignore_errors=True)    # the Ultra96 CSV log
+
+    end_to_end = {}
+    if after["bridge"] and "end_to_end" in after["bridge"]["histograms"]:
+        end_to_end = histogram_delta((before["bridge"] or {}).get("histograms", {}).get("end_to_end"),
+                                     after["bridge"]["histograms"]["end_to_end"])
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": socket.gethostname(),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in config.items() if key not in ("ports", "workdir")},
+        "window_s": round(elapsed_s, 3),
+        "throughput": {
+            "publisher_frames_per_s": _rate(before["publisher"], after["publisher"], "frames_in", elapsed_s),
+            "ultra96_frames_per_s": _rate(before["ultra96"], after["ultra96"], "frames_in", elapsed_s),
+            "windows_per_s": _rate(before["ultra96"], after["ultra96"], "windows_inferred", elapsed_s),
+            "results_per_s": _rate(before["bridge"], after["bridge"], "results_in", elapsed_s),
+            "actuations_per_s": round(actuated / elapsed_s, 1),
+        },
+        "latency_ms": {
+            "end_to_end_count": end_to_end.get("count", 0),
+            "end_to_end_p50": end_to_end.get("p50_ms"),
+            "end_to_end_p99": end_to_end.get("p99_ms"),
+            "end_to_end_max": end_to_end.get("max_ms"),
+        },
+        "processes": {},
+        "metrics": after,
+    }
+    for role in processes:
+        if usage_before[role] and usage_after[role]:
+            result["processes"][role] = {
+                "cpu_percent": round(100.0 * (usage_after[role][0] - usage_before[role][0]) / elapsed_s, 1),
+                "peak_rss_mb": round(peak_rss[role] / 2 ** 20, 1),
+            }
+    return result
+
+
+def summary_lines(result):
+    lines = [f"commit {result['commit']}  window {result['window_s']} s"]
+    lines += [f"  {name:<24} {value}" for name, value in result["throughput"].items()]
+    lines += [f"  {name:<24} {value}" for name, value in result["latency_ms"].items()]
+    lines += [f"  {role:<10} CPU {usage['cpu_percent']:>6}%  RSS {usage['peak_rss_mb']} MB"
+              for role, usage in result["processes"].items()]
+    return lines
+
+
+def compare(old, new):
+    """Side-by-side throughput / latency / CPU of two result files"""
+    rows = [(f"throughput.{k}", old["throughput"].get(k), v) for k, v in new["throughput"].items()]
+    rows += [(f"latency_ms.{k}", old["latency_ms"].get(k), v) for k, v in new["latency_ms"].items()]
+    rows += [(f"{role}.cpu_percent", old["processes"].get(role, {}).get("cpu_percent"), usage["cpu_percent"])
+             for role, usage in new["processes"].items()]
+    lines = [f"{'':<34} {old['commit'] or '?':>10} {new['commit'] or '?':>10}"]
+    for name, before, after in rows:
+        change = ""
+        if isinstance(before, (int, float)) and isinstance(after, (int, float)) and before:
+            change = f"{100.0 * (after - before) / before:+.1f}%"
+        lines.append(f"{name:<34} {before if before is not None else '-':>10} "
+                     f"{after if after is not None else '-':>10} {change:>8}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on localhost")
+    parser.add_argument("--seconds", type=float, default=20, help="measurement window")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--gloves", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=100, help="frames/s per glove")
+    parser.add_argument("--profile", default="gesture", help="load_generator motion profile")
+    parser.add_argument("--jitter-ms", type=float, default=1.0)
+    parser.add_argument("--replay", help="session_recorder.py recording to replay (looped) instead")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = as fast as possible")
+    parser.add_argument("--backend", help="Ultra96 inference backend (default: its configured one)")
+    parser.add_argument("--every-window", action="store_true",
+                        help="classify and send every window (no gesture segmentation / smoothing)")
+    parser.add_argument("--batch-ms", type=float, default=0, help="publisher BATCH_MAX_DELAY_MS")
+    parser.add_argument("--trace-every", type=int, default=1,
+                        help="publisher TRACE_EVERY (latency figures come from traced messages only)")
+    parser.add_argument("--ca", help="CA certificate (TLS everywhere; default plain TCP)")
+    parser.add_argument("--cert", help="client certificate")
+    parser.add_argument("--key", help="client key")
+    parser.add_argument("--server-cert", help="broker certificate")
+    parser.add_argument("--server-key", help="broker key")
+    parser.add_argument("--log-level", default="WARNING", help="PIPELINE_LOG_LEVEL of the components")
+    parser.add_argument("--out", default="bench_pipeline.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    with open(args.out, "w") as file:
+        json.dump(result, file, indent=2)
+    print("=" * 60)
+    print("\n".join(summary_lines(result)))
+    print(f"Results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as file:
+            print("\n".join(compare(json.load(file), result)))
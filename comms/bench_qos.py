@@ -0,0 +1,120 @@
+import argparse
+import os
+import ssl
+import struct
+import time
+
+import paho.mqtt.client as mqtt
+
+from mqtt_common import TOPIC_SENSOR
+
+# Latency/CPU comparison of QoS 0 vs QoS 1 for live sensor frames through the laptop broker.
+# Publisher and subscriber run in this process so send/receive times share one clock;
+# pass --broker-pid (mosquitto's PID, Linux/WSL) to also report broker CPU.
+
+STAMP = struct.Struct("!Qd")    # sequence, perf_counter at publish
+
+
+def _proc_cpu_seconds(pid):
+    """utime + stime of a process from /proc (Linux only)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _make_client(client_id, tls):
+    client = mqtt.Client(client_id=client_id)
+    if tls:
+        client.tls_set(ca_certs=tls[0], certfile=tls[1], keyfile=tls[2], tls_version=ssl.PROTOCOL_TLSv1_2)
+        client.tls_insecure_set(True)
+    client.max_inflight_messages_set(100)
+    client.max_queued_messages_set(0)
+    return client
+
+
+def run_case(host, port, qos, rate, seconds, tls=None, broker_pid=None, topic=TOPIC_SENSOR + "/bench"):
+    latencies = []
+    received = [0]
+
+    def on_message(c, userdata, msg):
+        _, sent_at = STAMP.unpack_from(msg.payload)
+        latencies.append((time.perf_counter() - sent_at) * 1000)
+        received[0] += 1
+
+    sub = _make_client(f"qos_bench_sub_{os.getpid()}", tls)
+    sub.on_message = on_message
+    sub.connect(host, port, 60)
+    sub.subscribe(topic, qos=qos)
+    sub.loop_start()
+    pub = _make_client(f"qos_bench_pub_{os.getpid()}", tls)
+    pub.connect(host, port, 60)
+    pub.loop_start()
+    time.sleep(0.5)
+
+    padding = b"\x00" * (120 - STAMP.size)
+    period = 1.0 / rate
+    cpu_start = os.times()
+    broker_start = _proc_cpu_seconds(broker_pid) if broker_pid else None
+    start = time.perf_counter()
+    next_send = start
+    sent = 0
+    while time.perf_counter() - start < seconds:
+        pub.publish(topic, STAMP.pack(sent, time.perf_counter()) + padding, qos=qos)
+        sent += 1
+        next_send += period
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    send_elapsed = time.perf_counter() - start
+    time.sleep(1.0)  # let the tail drain
+    cpu_end = os.times()
+
+    result = {
+        "qos": qos,
+        "sent": sent,
+        "received": received[0],
+        "send_rate": round(sent / send_elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies), 3) if latencies else 0.0,
+        "client_cpu_s": round((cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system), 3),
+    }
+    if broker_pid:
+        result["broker_cpu_s"] = round(_proc_cpu_seconds(broker_pid) - broker_start, 3)
+
+    for client in (pub, sub):
+        client.loop_stop()
+        client.disconnect()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare QoS 0 and QoS 1 for live sensor frames")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=8883)
+    parser.add_argument("--ca", help="CA certificate (enables TLS)")
+    parser.add_argument("--cert")
+    parser.add_argument("--key")
+    parser.add_argument("--rate", type=float, default=500, help="frames/sec")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--broker-pid", type=int, help="mosquitto PID for broker CPU usage")
+    args = parser.parse_args()
+
+    tls = (args.ca, args.cert, args.key) if args.ca else None
+    print("=" * 60)
+    print(f"QoS benchmark: {args.rate:.0f} frames/sec for {args.seconds:.0f} s via {args.broker}:{args.port}")
+    print("=" * 60)
+    for qos in (0, 1):
+        r = run_case(args.broker, args.port, qos, args.rate, args.seconds, tls, args.broker_pid)
+        line = (f"QoS {qos}: sent {r['sent']} received {r['received']}  latency p50 {r['p50_ms']} ms "
+                f"p99 {r['p99_ms']} ms max {r['max_ms']} ms  client CPU {r['client_cpu_s']} s")
+        if "broker_cpu_s" in r:
+            line += f"  broker CPU {r['broker_cpu_s']} s"
+        print(line)
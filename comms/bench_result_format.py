@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from bench_qos import _make_client, _percentile, _proc_cpu_seconds
+from mqtt_common import TOPIC_PROCESSED
+from wire_format import pack_result, unpack_result
+
+# Binary vs JSON movement-class results: encode/decode cost per message, and with
+# --broker the end-to-end latency and CPU through the laptop broker. Publisher and
+# subscriber run in this process so the embedded timestamps share one clock.
+
+
+def encode_json(movement_class, confidence, seq, ts_us):
+    """The JSON document ultra96_ai.py publishes with RESULT_FORMAT = "json" (MQTT 3.1.1)"""
+    return json.dumps({
+        "source": "default",
+        "movement_class": movement_class,
+        "confidence": round(confidence, 4),
+        "inference_ms": 1.234,
+        "status": "success",
+        "session_id": 1000,
+        "sequence": seq,
+        "timestamp": datetime.fromtimestamp(ts_us / 1e6).isoformat(),
+        "ts_us": ts_us,
+    })
+
+
+def decode_json(payload):
+    message = json.loads(payload)
+    return message["movement_class"], message["ts_us"]
+
+
+def encode_binary(movement_class, confidence, seq, ts_us):
+    return pack_result(movement_class, confidence, seq, ts_us)
+
+
+def decode_binary(payload):
+    movement_class, _, _, ts_us = unpack_result(payload)
+    return movement_class, ts_us
+
+
+FORMATS = {
+    "json": (encode_json, decode_json),
+    "binary": (encode_binary, decode_binary),
+}
+
+
+def codec_case(name, count=100000):
+    """Encode + decode cost per result, measured in process CPU time"""
+    encode, decode = FORMATS[name]
+    start = time.process_time()
+    payloads = [encode(i % 4, 0.87, i, time.time_ns() // 1000) for i in range(count)]
+    encoded = time.process_time()
+    for payload in payloads:
+        decode(payload)
+    decoded = time.process_time()
+    return {
+        "format": name,
+        "bytes": len(payloads[0]),
+        "encode_us": round(1e6 * (encoded - start) / count, 3),
+        "decode_us": round(1e6 * (decoded - encoded) / count, 3),
+    }
+
+
+def broker_case(name, host, port, rate, seconds, tls=None, broker_pid=None, topic=TOPIC_PROCESSED + "/bench"):
+    encode, decode = FORMATS[name]
+    latencies = []
+
+    def on_message(c, userdata, msg):
+        _, ts_us = decode(msg.payload)
+        latencies.append((time.time_ns() // 1000 - ts_us) / 1000.0)
+
+    sub = _make_client(f"result_bench_sub_{os.getpid()}", tls)
+    sub.on_message = on_message
+    sub.connect(host, port, 60)
+    sub.subscribe(topic, qos=1)
+    sub.loop_start()
+    pub = _make_client(f"result_bench_pub_{os.getpid()}", tls)
+    pub.connect(host, port, 60)
+    pub.loop_start()
+    time.sleep(0.5)
+
+    period = 1.0 / rate
+    cpu_start = os.times()
+    broker_start = _proc_cpu_seconds(broker_pid) if broker_pid else None
+    start = time.perf_counter()
+    next_send = start
+    sent = 0
+    while time.perf_counter() - start < seconds:
+        pub.publish(topic, encode(sent % 4, 0.87, sent, time.time_ns() // 1000), qos=1)
+        sent += 1
+        next_send += period
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    time.sleep(1.0)  # let the tail drain
+    cpu_end = os.times()
+
+    result = {
+        "format": name,
+        "sent": sent,
+        "received": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "client_cpu_s": round((cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system), 3),
+    }
+    if broker_pid:
+        result["broker_cpu_s"] = round(_proc_cpu_seconds(broker_pid) - broker_start, 3)
+
+    for client in (pub, sub):
+        client.loop_stop()
+        client.disconnect()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare binary and JSON movement-class results")
+    parser.add_argument("--count", type=int, default=100000, help="results for the codec benchmark")
+    parser.add_argument("--broker", help="MQTT broker host; omit to measure encode/decode only")
+    parser.add_argument("--port", type=int, default=8883)
+    parser.add_argument("--ca", help="CA certificate (enables TLS)")
+    parser.add_argument("--cert")
+    parser.add_argument("--key")
+    parser.add_argument("--rate", type=float, default=200, help="results/sec")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--broker-pid", type=int, help="mosquitto PID for broker CPU usage")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Result format benchmark")
+    print("=" * 60)
+    for name in FORMATS:
+        r = codec_case(name, args.count)
+        print(f"{name:<6}: {r['bytes']:>4} bytes  encode {r['encode_us']} us  decode {r['decode_us']} us")
+
+    if args.broker:
+        tls = (args.ca, args.cert, args.key) if args.ca else None
+        print(f"\nEnd to end via {args.broker}:{args.port} at {args.rate:.0f} results/sec for {args.seconds:.0f} s")
+        for name in FORMATS:
+            r = broker_case(name, args.broker, args.port, args.rate, args.seconds, tls, args.broker_pid)
+            line = (f"{name:<6}: sent {r['sent']} received {r['received']}  latency p50 {r['p50_ms']} ms "
+                    f"p99 {r['p99_ms']} ms  client CPU {r['client_cpu_s']} s")
+            if "broker_cpu_s" in r:
+                line += f"  broker CPU {r['broker_cpu_s']} s"
+            print(line)
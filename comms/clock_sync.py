@@ -0,0 +1,173 @@
+import argparse
+import socket
+import threading
+import time
+from collections import deque
+
+from latency_trace import now_us
+from pipeline_log import get_logger, setup_logging
+from wire_format import CLOCK_PING, CLOCK_PONG, pack_clock_ping, pack_clock_pong, unpack_clock
+
+# NTP-style offset estimation between the laptop and Ultra96 trace clocks
+# (latency_trace.now_us). The laptop sends a ping with t1; the Ultra96 answers with
+# t2 (ping received) and t3 (pong sent) on its clock; the laptop stamps t4:
+#   rtt    = (t4 - t1) - (t3 - t2)
+#   offset = ((t2 - t1) + (t3 - t4)) / 2       (peer clock - local clock)
+# Queueing only ever adds delay, so of the last `window` samples the one with the
+# smallest rtt gives the best offset. Pings run every interval_s, which also tracks drift.
+# Channels: robot/clock/ping/<pinger> -> robot/clock/pong/<pinger> over MQTT (every
+# Ultra96 worker answers; workers on one board share a clock and a responder id),
+# or the direct link stream.
+RESPONDER_ID = socket.gethostname()
+
+log = get_logger("clock_sync")
+
+
+def answer_ping(payload, received_us, responder=RESPONDER_ID):
+    """Pong for a ping payload (None if it isn't a ping); received_us = t2, stamped on arrival"""
+    kind, ping_id, t1_us, _, _, _ = unpack_clock(payload)
+    if kind != CLOCK_PING:
+        return None
+    return pack_clock_pong(ping_id, t1_us, received_us, now_us(), responder)
+
+
+class PeerClock:
+    """Offset / RTT estimate for one peer from its recent ping samples"""
+
+    def __init__(self, window=16):
+        self.samples = deque(maxlen=window)   # (rtt us, offset us)
+        self.total = 0
+
+    def add(self, t1_us, t2_us, t3_us, t4_us):
+        rtt_us = (t4_us - t1_us) - (t3_us - t2_us)
+        offset_us = ((t2_us - t1_us) + (t3_us - t4_us)) / 2.0
+        self.samples.append((rtt_us, offset_us))
+        self.total += 1
+        return rtt_us, offset_us
+
+    def estimate(self):
+        """(offset us, rtt us) of the minimum-RTT sample, or None before the first pong"""
+        if not self.samples:
+            return None
+        rtt_us, offset_us = min(self.samples)
+        return offset_us, rtt_us
+
+
+class ClockSync:
+    """
+    Pinger side (laptop). send_ping(payload) puts a ping on the channel; every
+    pong that comes back goes to on_pong(payload). offset(peer) converts the trace
+    stamps of that Ultra96 (a traced result's responder id) to local ones:
+    local = peer - offset.
+    """
+
+    def __init__(self, send_ping, interval_s=1.0, window=16):
+        self.send_ping = send_ping
+        self.interval_s = interval_s
+        self.window = window
+        self.peers = {}                 # responder id -> PeerClock
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.running = False
+        self.thread = None
+
+        # Stats
+        self.pings = 0
+        self.pongs = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            self.ping()
+            time.sleep(self.interval_s)
+
+    def ping(self):
+        self.next_id += 1
+        try:
+            self.send_ping(pack_clock_ping(self.next_id, now_us()))
+            self.pings += 1
+        except Exception as e:
+            log.warning("Clock ping failed: %s", e)
+
+    def on_pong(self, payload, received_us=None):
+        """Record a pong; pass received_us (t4) if it was stamped earlier than this call"""
+        t4_us = now_us() if received_us is None else received_us
+        kind, _, t1_us, t2_us, t3_us, responder = unpack_clock(payload)
+        if kind != CLOCK_PONG:
+            return None
+        with self.lock:
+            peer = self.peers.get(responder)
+            if peer is None:
+                peer = self.peers[responder] = PeerClock(self.window)
+            self.pongs += 1
+            return peer.add(t1_us, t2_us, t3_us, t4_us)
+
+    def offset(self, peer=None):
+        """Offset in us of a peer's clock (peer None: the only peer), None if unknown or ambiguous"""
+        with self.lock:
+            if peer is None and len(self.peers) == 1:
+                peer = next(iter(self.peers))
+            clock = self.peers.get(peer)
+            estimate = clock.estimate() if clock else None
+        return estimate[0] if estimate else None
+
+    def peer_ids(self):
+        """Responder ids of the boards that have answered a ping"""
+        with self.lock:
+            return list(self.peers)
+
+    def stats(self):
+        with self.lock:
+            result = {}
+            for name, clock in self.peers.items():
+                offset_us, rtt_us = clock.estimate()
+                result[name] = {
+                    "offset_ms": round(offset_us / 1000.0, 3),
+                    "rtt_ms": round(rtt_us / 1000.0, 3),
+                    "samples": clock.total,
+                }
+            return result
+
+
+# ---------------- Loopback check ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate a simulated clock offset over a lossy, jittery channel")
+    parser.add_argument("--offset-ms", type=float, default=1234.5, help="simulated peer clock offset")
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="base one-way delay")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="extra random one-way delay (max)")
+    parser.add_argument("--pings", type=int, default=30)
+    args = parser.parse_args()
+    setup_logging()
+
+    import random
+
+    def delayed(fn, *fn_args):
+        time.sleep((args.delay_ms + random.random() * args.jitter_ms) / 1000.0)
+        fn(*fn_args)
+
+    def peer_receive(payload):
+        # Peer clock = local clock + offset
+        shift = int(args.offset_ms * 1000)
+        kind, ping_id, t1_us, _, _, _ = unpack_clock(payload)
+        t2_us = now_us() + shift
+        pong = pack_clock_pong(ping_id, t1_us, t2_us, now_us() + shift, "simulated")
+        threading.Thread(target=delayed, args=(sync.on_pong, pong), daemon=True).start()
+
+    sync = ClockSync(lambda payload: threading.Thread(target=delayed, args=(peer_receive, payload),
+                                                      daemon=True).start(), interval_s=0.05)
+    for _ in range(args.pings):
+        sync.ping()
+        time.sleep(0.05)
+    time.sleep((args.delay_ms + args.jitter_ms) * 2 / 1000.0 + 0.1)
+    stats = sync.stats()["simulated"]
+    print(f"true offset {args.offset_ms:.3f} ms  estimated {stats['offset_ms']:.3f} ms  "
+          f"error {stats['offset_ms'] - args.offset_ms:+.3f} ms  min rtt {stats['rtt_ms']:.3f} ms  "
+          f"({stats['samples']} samples)")
@@ -0,0 +1,379 @@
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+
+from clock_sync import ClockSync, answer_ping
+from latency_trace import now_us
+from pipeline_log import get_logger, setup_logging
+from tls_context import client_context, server_context
+from wire_format import (FRAME_BYTES, is_clock_message, pack_frames, pack_result, result_responder, result_trace,
+                         unpack_frames, unpack_frames_traced, unpack_result)
+
+log = get_logger("direct_link")
+
+# Direct laptop <-> Ultra96 transport that skips both broker hops.
+# One persistent (TLS) TCP stream per sensor source; every message is a '!I'
+# length prefix followed by the payload:
+#   laptop -> Ultra96: first message = source id (utf-8), then batched sensor
+#                      messages (wire_format.pack_frames, always with a header so
+#                      the sequence number travels too)
+#   Ultra96 -> laptop: binary results (wire_format.pack_result)
+# plus clock sync pings (laptop -> Ultra96) and pongs (Ultra96 -> laptop), see clock_sync.py
+LENGTH = struct.Struct("!I")
+DEFAULT_PORT = 9000
+MAX_MESSAGE = 1 << 20
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_message(sock):
+    (length,) = LENGTH.unpack(_recv_exactly(sock, LENGTH.size))
+    if length > MAX_MESSAGE:
+        raise ValueError(f"Message too large: {length} bytes")
+    return _recv_exactly(sock, length)
+
+
+def send_message(sock, payload):
+    sock.sendall(LENGTH.pack(len(payload)) + payload)
+
+
+def _tune(sock):
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class DirectLinkServer:
+    """
+    Ultra96 side. Accepts publisher connections; on_frames(source, first_seq, frames, traces)
+    is called on the connection's reader thread for every sensor message (traces is None
+    unless the publisher traces frames, see latency_trace.py), and
+    send_result(payload, source) goes back to the publisher of that source only.
+    """
+
+    def __init__(self, on_frames, host="0.0.0.0", port=DEFAULT_PORT, ssl_context=None):
+        self.on_frames = on_frames
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.listener = None
+        self.clients = {}           # socket -> source id
+        self.sources = {}           # source id -> socket (latest connection of the source)
+        self.write_locks = {}       # socket -> lock held while writing to it
+        self.lock = threading.Lock()   # clients / sources / write_locks only, never held while sending
+        self.running = False
+
+        # Stats
+        self.messages_in = 0
+        self.results_out = 0
+        self.results_unrouted = 0
+
+    def start(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        log.info("Direct link listening on %s:%d%s", self.host, self.port, " (TLS)" if self.ssl_context else "")
+        return self
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, addr = self.listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_client, args=(sock, addr), daemon=True).start()
+
+    def _serve_client(self, sock, addr):
+        try:
+            _tune(sock)
+            if self.ssl_context:
+                sock = self.ssl_context.wrap_socket(sock, server_side=True)
+            source = recv_message(sock).decode("utf-8")
+            write_lock = threading.Lock()
+            with self.lock:
+                self.clients[sock] = source
+                self.sources[source] = sock
+                self.write_locks[sock] = write_lock
+            log.info("Direct link: %s connected from %s:%d", source, addr[0], addr[1])
+            while self.running:
+                payload = recv_message(sock)
+                if is_clock_message(payload):
+                    pong = answer_ping(payload, now_us())
+                    if pong:
+                        with write_lock:
+                            send_message(sock, pong)
+                    continue
+                self.messages_in += 1
+                first_seq, frames, traces = unpack_frames_traced(payload)
+                self.on_frames(source, first_seq, frames, traces)
+        except (ConnectionError, OSError, ValueError) as e:
+            log.info("Direct link from %s:%d closed: %s", addr[0], addr[1], e)
+        finally:
+            with self.lock:
+                source = self.clients.pop(sock, None)
+                self.write_locks.pop(sock, None)
+                if self.sources.get(source) is sock:
+                    del self.sources[source]
+            sock.close()
+
+    def send_result(self, payload, source=None):
+        """Result to the publisher of source (None: every connected publisher)"""
+        with self.lock:
+            if source is None:
+                clients = list(self.write_locks.items())
+            else:
+                sock = self.sources.get(source)
+                clients = [(sock, self.write_locks[sock])] if sock in self.write_locks else []
+        if not clients:
+            self.results_unrouted += 1
+        for sock, write_lock in clients:
+            try:
+                with write_lock:
+                    send_message(sock, payload)
+                self.results_out += 1
+            except OSError as e:
+                log.warning("Direct link result send failed: %s", e)
+
+    def stop(self):
+        self.running = False
+        if self.listener:
+            self.listener.close()
+        with self.lock:
+            for sock in self.clients:
+                sock.close()
+
+    def stats(self):
+        return {"clients": len(self.clients), "messages_in": self.messages_in, "results_out": self.results_out,
+                "results_unrouted": self.results_unrouted}
+
+
+class DirectLinkClient:
+    """
+    Laptop (publisher) side. Connects in the background and reconnects after a drop;
+    send() drops frames while disconnected (they would be stale anyway).
+    on_result(movement_class, confidence, seq, ts_us, trace, responder) runs on the reader
+    thread; trace is the result's trace stamps and responder the id of the board that
+    stamped them (clock.offset(responder)), both None for an untraced result. While
+    connected the clock offset to the Ultra96 is tracked every clock_interval_s
+    (self.clock, 0 disables).
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, source="default", ssl_context=None,
+                 on_result=None, retry_s=1.0, clock_interval_s=1.0):
+        self.host = host
+        self.port = port
+        self.source = source
+        self.ssl_context = ssl_context
+        self.on_result = on_result
+        self.retry_s = retry_s
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.connected = threading.Event()
+        self.running = False
+        self.clock = ClockSync(self._send_ping, clock_interval_s) if clock_interval_s else None
+
+        # Stats
+        self.sent = 0
+        self.dropped = 0
+        self.results = 0
+        self.connects = 0
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        if self.clock:
+            self.clock.start()
+        return self
+
+    def _send_ping(self, payload):
+        sock = self.sock
+        if sock is not None and self.connected.is_set():
+            with self.send_lock:
+                send_message(sock, payload)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=10)
+        _tune(sock)
+        if self.ssl_context:
+            sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+        sock.settimeout(None)
+        send_message(sock, self.source.encode("utf-8"))
+        return sock
+
+    def _run(self):
+        while self.running:
+            try:
+                self.sock = self._connect()
+                self.connects += 1
+                self.connected.set()
+                log.info("Direct link connected to %s:%d", self.host, self.port)
+                while self.running:
+                    payload = recv_message(self.sock)
+                    if is_clock_message(payload):
+                        if self.clock:
+                            self.clock.on_pong(payload)
+                        continue
+                    movement_class, confidence, seq, ts_us = unpack_result(payload)
+                    self.results += 1
+                    if self.on_result:
+                        self.on_result(movement_class, confidence, seq, ts_us, result_trace(payload),
+                                       result_responder(payload))
+            except (ConnectionError, OSError, ValueError) as e:
+                if self.running:
+                    log.warning("Direct link to %s:%d failed: %s, retrying...", self.host, self.port, e)
+            finally:
+                self.connected.clear()
+                if self.sock:
+                    self.sock.close()
+                    self.sock = None
+            if self.running:
+                time.sleep(self.retry_s)
+
+    def send(self, payload, first_seq=0):
+        """Send one sensor message (bare frames get a header so the sequence travels)"""
+        if len(payload) == FRAME_BYTES:
+            payload = pack_frames([payload], first_seq)
+        sock = self.sock
+        if sock is None or not self.connected.is_set():
+            self.dropped += 1
+            return False
+        try:
+            with self.send_lock:
+                send_message(sock, payload)
+            self.sent += 1
+            return True
+        except OSError:
+            self.dropped += 1
+            return False
+
+    def stop(self):
+        self.running = False
+        if self.clock:
+            self.clock.stop()
+        if self.sock:
+            self.sock.close()
+
+    def stats(self):
+        return {"sent": self.sent, "dropped": self.dropped, "results": self.results, "connects": self.connects,
+                "clock": self.clock.stats() if self.clock else {}}
+
+
+# ---------------- Loopback latency comparison ----------------
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def _round_trips(send, results, count, rate):
+    """send(frame, seq) count frames; results[seq] is filled with the return time"""
+    frame = os.urandom(FRAME_BYTES)
+    sent_at = {}
+    period = 1.0 / rate
+    next_send = time.perf_counter()
+    for seq in range(count):
+        sent_at[seq] = time.perf_counter()
+        send(frame, seq)
+        next_send += period
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    time.sleep(0.5)
+    latencies = [(results[seq] - sent_at[seq]) * 1000 for seq in sent_at if seq in results]
+    return {
+        "sent": count,
+        "received": len(latencies),
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+    }
+
+
+def bench_direct(count, rate, server_tls=None, client_tls=None):
+    results = {}
+
+    def on_frames(source, first_seq, frames, traces):
+        for i in range(len(frames)):
+            server.send_result(pack_result(1, 0.9, first_seq + i, 0), source)
+
+    server = DirectLinkServer(on_frames, "127.0.0.1", 0, server_tls).start()
+    client = DirectLinkClient("127.0.0.1", server.port, "bench", client_tls,
+                              on_result=lambda c, conf, seq, ts, trace, responder: results.__setitem__(seq, time.perf_counter()))
+    client.start()
+    client.connected.wait(5)
+    result = _round_trips(client.send, results, count, rate)
+    client.stop()
+    server.stop()
+    return result
+
+
+def bench_mqtt(count, rate, server_tls=None, client_tls=None):
+    """Publisher -> broker -> Ultra96 subscriber -> broker -> bridge, all on loopback"""
+    from mini_broker import MiniBroker
+    from mqtt_common import TOPIC_PROCESSED, TOPIC_SENSOR, MQTTConnection
+
+    results = {}
+    broker = MiniBroker("127.0.0.1", 0, server_tls).start()
+
+    def configure(client):
+        if client_tls:
+            client.tls_set_context(client_tls)
+
+    def on_sensor(client, userdata, msg):
+        first_seq, frames = unpack_frames(msg.payload)
+        for i in range(len(frames)):
+            client.publish(TOPIC_PROCESSED, pack_result(1, 0.9, first_seq + i, 0))
+
+    def on_result(client, userdata, msg):
+        results[unpack_result(msg.payload)[2]] = time.perf_counter()
+
+    ultra96 = MQTTConnection("bench_ultra96", use_v5=False, configure=configure, on_message=on_sensor,
+                             on_connect=lambda c, u, f, rc: c.subscribe(TOPIC_SENSOR))
+    bridge = MQTTConnection("bench_bridge", use_v5=False, configure=configure, on_message=on_result,
+                            on_connect=lambda c, u, f, rc: c.subscribe(TOPIC_PROCESSED))
+    publisher = MQTTConnection("bench_publisher", use_v5=False, configure=configure)
+    for client in (ultra96, bridge, publisher):
+        client.connect("127.0.0.1", broker.port)
+    time.sleep(0.3)
+    result = _round_trips(lambda frame, seq: publisher.publish(TOPIC_SENSOR, pack_frames([frame], seq)),
+                          results, count, rate)
+    for client in (publisher, ultra96, bridge):
+        client.loop_stop()
+        client.disconnect()
+    broker.stop()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Direct link vs MQTT round-trip latency on loopback")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200, help="frames/sec")
+    parser.add_argument("--ca", help="CA certificate (enables TLS on both paths)")
+    parser.add_argument("--cert", help="server certificate")
+    parser.add_argument("--key", help="server key")
+    args = parser.parse_args()
+    setup_logging()
+
+    server_tls = client_tls = None
+    if args.ca:
+        server_tls = server_context(args.cert, args.key)
+        client_tls = client_context(args.ca)
+
+    print("=" * 60)
+    print(f"Round trip frame -> movement class, {args.count} frames at {args.rate:.0f}/s"
+          f"{' (TLS)' if args.ca else ''}")
+    print("=" * 60)
+    for name, bench in (("mqtt", bench_mqtt), ("direct", bench_direct)):
+        r = bench(args.count, args.rate, server_tls, client_tls)
+        print(f"{name:<6}: received {r['received']}/{r['sent']}  p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms")
@@ -1,10 +1,26 @@
 # ai_model.py
-import pandas as pd
+# Loaded once by the Ultra96 inference engine (ModuleBackend): load() runs at
+# startup, classify_window() is called per (W, 5, 6) window of IMU frames.
+
+def load():
+    """Load weights / overlays here - called once at startup"""
+    pass
+
+
+def classify_window(window):
+    """
+    Predicts a movement class from the latest frame of the window.
+    """
+    last_row = window[-1].reshape(-1)  # 30 values, same order as imu_data.csv
+    # --- Replace this with real AI logic ---
+    return int(sum(last_row) % 4)  # dummy logic
+
 
 def classify_from_csv(csv_file):
     """
     Reads the latest row from imu_data.csv and predicts a movement class.
     """
+    import pandas as pd
     try:
         df = pd.read_csv(csv_file)
         if df.empty:
@@ -16,4 +32,3 @@ def classify_from_csv(csv_file):
     except Exception as e:
         print(f"AI model error: {e}")
         return -1
-
@@ -0,0 +1,203 @@
+import argparse
+import os
+import struct
+import threading
+import time
+
+from latency_trace import now_us
+from wire_format import FRAME_BYTES, pack_frames, unpack_frames
+
+
+class FrameBatcher:
+    """
+    Accumulate sensor frames and publish them as one batched message once
+    max_frames are pending or the oldest pending frame is max_delay_ms old.
+    max_delay_ms = 0 keeps the original behaviour: every frame is published
+    immediately as a bare 120-byte payload.
+    publish_fn(payload, first_seq) does the actual MQTT publish.
+    add(frame, trace) with the frame's (tcp_rx, decrypt) stamps sends one message
+    in trace_every as a traced message (24 bytes more per frame) instead; the
+    publish stamp is taken when the message is packed.
+    """
+
+    def __init__(self, publish_fn, max_frames=10, max_delay_ms=0, trace_every=1):
+        self.publish_fn = publish_fn
+        self.max_frames = max(1, max_frames)
+        self.trace_every = max(1, trace_every)
+        self.max_delay = max_delay_ms / 1000.0
+        self.enabled = max_delay_ms > 0 and self.max_frames > 1
+
+        self.lock = threading.Condition()
+        self.pending = []
+        self.pending_since = 0.0
+        self.next_seq = 0
+        self.running = True
+        self.flusher = None
+        if self.enabled:
+            self.flusher = threading.Thread(target=self._run_flusher, daemon=True)
+            self.flusher.start()
+
+        # Stats
+        self.frames = 0
+        self.messages = 0
+        self.total_wait = 0.0   # sum over frames of time spent waiting in the batch
+        self.max_wait = 0.0
+
+    def add(self, frame, trace=None):
+        if not self.enabled:
+            self.frames += 1
+            self.messages += 1
+            self.next_seq += 1
+            if trace and self.messages % self.trace_every == 0:
+                frame = pack_frames([frame], self.next_seq - 1, [tuple(trace) + (now_us(),)])
+            self.publish_fn(frame, self.next_seq - 1)
+            return
+        with self.lock:
+            if not self.pending:
+                self.pending_since = time.monotonic()
+                self.lock.notify()
+            self.pending.append((frame, time.monotonic(), trace))
+            if len(self.pending) >= self.max_frames:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        now = time.monotonic()
+        first_seq = self.next_seq
+        self.next_seq += len(batch)
+        for _, added, _ in batch:
+            wait = now - added
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        self.frames += len(batch)
+        self.messages += 1
+        traces = None
+        if self.messages % self.trace_every == 0 and all(trace for _, _, trace in batch):
+            publish_us = now_us()
+            traces = [tuple(trace) + (publish_us,) for _, _, trace in batch]
+        self.publish_fn(pack_frames([frame for frame, _, _ in batch], first_seq, traces), first_seq)
+
+    def _run_flusher(self):
+        with self.lock:
+            while self.running:
+                if not self.pending:
+                    self.lock.wait()
+                    continue
+                remaining = self.pending_since + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    self.lock.wait(remaining)
+                    continue
+                self._flush_locked()
+
+    def close(self):
+        with self.lock:
+            self._flush_locked()
+            self.running = False
+            self.lock.notify()
+        if self.flusher:
+            self.flusher.join(timeout=1)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "messages": self.messages,
+            "frames_per_message": round(self.frames / self.messages, 2) if self.messages else 0.0,
+            "avg_added_latency_ms": round(1000 * self.total_wait / self.frames, 3) if self.frames else 0.0,
+            "max_added_latency_ms": round(1000 * self.max_wait, 3),
+        }
+
+
+# ---------------- Benchmark ----------------
+def _run_case(max_frames, max_delay_ms, rate, seconds, publish_fn):
+    batcher = FrameBatcher(publish_fn, max_frames, max_delay_ms)
+    frame = os.urandom(FRAME_BYTES)
+    period = 1.0 / rate if rate else 0.0
+    start = time.perf_counter()
+    next_send = start
+    sent = 0
+    while time.perf_counter() - start < seconds:
+        batcher.add(frame)
+        sent += 1
+        if period:
+            next_send += period
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    batcher.close()
+    elapsed = time.perf_counter() - start
+    result = batcher.stats()
+    result["frames_per_sec"] = round(sent / elapsed, 1)
+    return result
+
+
+def benchmark(cases, rate=0, seconds=2.0, broker=None, port=1883, qos=1):
+    """Run each (max_frames, max_delay_ms) case against a null sink or a real broker"""
+    client = None
+    received = [0]
+    if broker:
+        import paho.mqtt.client as mqtt
+        topic = "robot/bench/batching"
+        client = mqtt.Client(client_id=f"batch_bench_{os.getpid()}")
+        client.max_queued_messages_set(0)
+
+        def on_message(c, userdata, msg):
+            received[0] += len(unpack_frames(msg.payload)[1])
+
+        client.on_message = on_message
+        client.connect(broker, port, 60)
+        client.subscribe(topic, qos=qos)
+        client.loop_start()
+        time.sleep(0.5)
+
+        def publish_fn(payload, first_seq):
+            client.publish(topic, payload, qos=qos)
+    else:
+        def publish_fn(payload, first_seq):
+            struct.unpack_from("!B", payload)  # touch the payload
+
+    results = []
+    for max_frames, max_delay_ms in cases:
+        received[0] = 0
+        result = _run_case(max_frames, max_delay_ms, rate, seconds, publish_fn)
+        if client:
+            time.sleep(0.5)
+            result["frames_received"] = received[0]
+        result["max_frames"] = max_frames
+        result["max_delay_ms"] = max_delay_ms
+        results.append(result)
+
+    if client:
+        client.loop_stop()
+        client.disconnect()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark MQTT frame batching")
+    parser.add_argument("--broker", help="MQTT broker host (plain TCP); omit to measure the batcher alone")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--qos", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0, help="frames/sec offered (0 = as fast as possible)")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--sizes", default="1,5,10,25,50", help="comma-separated max_frames values")
+    parser.add_argument("--delay", type=float, default=20.0, help="max_delay_ms for batched cases")
+    args = parser.parse_args()
+
+    cases = [(n, 0 if n == 1 else args.delay) for n in (int(s) for s in args.sizes.split(","))]
+    print("=" * 60)
+    print(f"Frame batching benchmark ({'broker ' + args.broker if args.broker else 'null sink'}, "
+          f"rate={'max' if not args.rate else args.rate})")
+    print("=" * 60)
+    for r in benchmark(cases, args.rate, args.seconds, args.broker, args.port, args.qos):
+        line = (f"N={r['max_frames']:<3} T={r['max_delay_ms']:>5.1f} ms: {r['frames_per_sec']:>10.0f} frames/sec  "
+                f"{r['messages']:>7} msgs  added latency avg {r['avg_added_latency_ms']:.3f} ms "
+                f"max {r['max_added_latency_ms']:.3f} ms")
+        if "frames_received" in r:
+            line += f"  received {r['frames_received']}"
+        print(line)
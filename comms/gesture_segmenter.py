@@ -0,0 +1,131 @@
+import argparse
+
+import numpy as np
+
+from imu_features import DEFAULT_WINDOW_SIZE, FrameWindow, load_csv_frames
+
+
+def motion_energy(frames):
+    """
+    Gyro variance of a short run of frames: variance of gx/gy/gz around their
+    per-axis means, pooled over frames and IMUs (the same measure
+    Ultra96ProcessorMQTT._determine_activity uses for a single frame).
+    """
+    gyro = np.asarray(frames, dtype=np.float32)[..., 3:].reshape(-1, 3)
+    return float(gyro.var(axis=0).mean())
+
+
+class GestureSegmenter:
+    """
+    Online gesture segmentation over a FrameWindow ring buffer.
+    A gesture starts once motion energy stays above start_threshold for
+    start_frames frames and ends once it stays below stop_threshold for
+    stop_frames frames (hysteresis), or when it fills the ring buffer.
+    update() returns a (size, 5, 6) window to classify when a gesture ends,
+    otherwise None. Default thresholds follow _determine_activity's
+    "sleeping" (< 0.1) and "resting" (< 1.0) bands.
+    """
+
+    def __init__(self, window, energy_frames=5, start_threshold=1.0, stop_threshold=0.1,
+                 start_frames=2, stop_frames=10, min_gesture_frames=10, max_gesture_frames=None,
+                 preroll_frames=5):
+        self.window = window
+        self.energy_frames = energy_frames
+        self.start_threshold = start_threshold
+        self.stop_threshold = stop_threshold
+        self.start_frames = start_frames
+        self.stop_frames = stop_frames
+        self.min_gesture_frames = min_gesture_frames
+        self.max_gesture_frames = max_gesture_frames or window.size
+        self.preroll_frames = preroll_frames
+
+        self.active = False
+        self.above = 0          # consecutive frames above start_threshold while idle
+        self.below = 0          # consecutive frames below stop_threshold while active
+        self.length = 0         # frames in the current gesture (including pre-roll)
+        self.last_energy = 0.0
+
+        # Stats
+        self.frames = 0
+        self.gestures = 0
+        self.rejected = 0
+
+    def update(self):
+        """Call after each window.push(); returns the gesture window when one completes"""
+        self.frames += 1
+        self.last_energy = motion_energy(self.window.latest(self.energy_frames))
+
+        if not self.active:
+            self.above = self.above + 1 if self.last_energy >= self.start_threshold else 0
+            if self.above >= self.start_frames:
+                self.active = True
+                self.below = 0
+                self.length = min(self.above + self.preroll_frames, self.window.count)
+            return None
+
+        self.length += 1
+        self.below = self.below + 1 if self.last_energy < self.stop_threshold else 0
+        if self.below >= self.stop_frames or self.length >= self.max_gesture_frames:
+            return self._finish()
+        return None
+
+    def _finish(self):
+        # Drop the trailing still frames that confirmed the end of the gesture
+        frames = self.window.latest(min(self.length, self.window.size))
+        frames = frames[:len(frames) - self.below]
+        self.active = False
+        self.above = 0
+        self.below = 0
+        self.length = 0
+        if len(frames) < self.min_gesture_frames:
+            self.rejected += 1
+            return None
+        self.gestures += 1
+        return self._fit(frames)
+
+    def _fit(self, frames):
+        """Edge-pad a gesture at the front to the classifier's fixed window size"""
+        missing = self.window.size - len(frames)
+        if missing <= 0:
+            return frames
+        return np.concatenate((np.repeat(frames[:1], missing, axis=0), frames))
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "gestures": self.gestures,
+            "rejected": self.rejected,
+            "active": self.active,
+            "energy": round(self.last_energy, 4),
+        }
+
+
+def segment_recording(frames, window_size=DEFAULT_WINDOW_SIZE, **options):
+    """Run the segmenter over an (N, 5, 6) recording; returns (gesture windows, segmenter)"""
+    window = FrameWindow(window_size)
+    segmenter = GestureSegmenter(window, **options)
+    gestures = []
+    for frame in frames:
+        window.push(frame)
+        gesture = segmenter.update()
+        if gesture is not None:
+            gestures.append(gesture)
+    return gestures, segmenter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline gesture segmentation of a recorded imu_data.csv")
+    parser.add_argument("csv")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_SIZE)
+    parser.add_argument("--start", type=float, default=1.0, help="start threshold (gyro variance)")
+    parser.add_argument("--stop", type=float, default=0.1, help="stop threshold (gyro variance)")
+    args = parser.parse_args()
+
+    frames = load_csv_frames(args.csv)
+    gestures, segmenter = segment_recording(frames, args.window,
+                                            start_threshold=args.start, stop_threshold=args.stop)
+    print(f"Frames: {len(frames)}")
+    print(f"Gestures emitted: {len(gestures)} (rejected as too short: {segmenter.rejected})")
+    if len(frames):
+        print(f"Inference calls / publishes: {len(gestures)} instead of {len(frames)} "
+              f"({100.0 * (1 - len(gestures) / len(frames)):.1f}% fewer)")
@@ -0,0 +1,207 @@
+import argparse
+import time
+
+import numpy as np
+
+# Frame layout shared with the publisher: 5 IMUs x (ax, ay, az, gx, gy, gz),
+# packed as big-endian float32 ('!6f' per IMU, 120 bytes per frame)
+NUM_IMUS = 5
+NUM_CHANNELS = 6
+FRAME_BYTES = NUM_IMUS * NUM_CHANNELS * 4
+CHANNEL_NAMES = ["ax", "ay", "az", "gx", "gy", "gz"]
+STAT_NAMES = ["mean", "var", "rms", "min", "max", "zcr"]
+DEFAULT_FFT_BANDS = 4
+DEFAULT_WINDOW_SIZE = 50
+
+
+# ---------------- Frame conversion ----------------
+def frame_from_bytes(raw_data):
+    """Decode one 120-byte binary frame into a (5, 6) float32 array"""
+    return np.frombuffer(raw_data, dtype=">f4", count=NUM_IMUS * NUM_CHANNELS) \
+        .astype(np.float32).reshape(NUM_IMUS, NUM_CHANNELS)
+
+
+def frame_from_readings(sensor_readings):
+    """Convert the sensor_readings dict list into a (5, 6) array (missing IMUs are zero, as in the CSV)"""
+    frame = np.zeros((NUM_IMUS, NUM_CHANNELS), dtype=np.float32)
+    for reading in sensor_readings:
+        sensor_id = reading["sensor_id"]
+        if isinstance(sensor_id, str) and sensor_id.startswith("IMU"):
+            sensor_id = sensor_id[3:]
+        try:
+            i = int(sensor_id)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= i < NUM_IMUS:
+            acc = reading["acceleration"]
+            gyro = reading["gyroscope"]
+            frame[i] = (acc["x"], acc["y"], acc["z"], gyro["x"], gyro["y"], gyro["z"])
+    return frame
+
+
+def readings_to_array(sensor_readings):
+    """Stack whatever readings are present into an (n, 6) array, in arrival order"""
+    rows = []
+    for reading in sensor_readings:
+        acc = reading["acceleration"]
+        gyro = reading["gyroscope"]
+        rows.append((acc["x"], acc["y"], acc["z"], gyro["x"], gyro["y"], gyro["z"]))
+    return np.asarray(rows, dtype=np.float64).reshape(-1, NUM_CHANNELS)
+
+
+# ---------------- Live ring buffer ----------------
+class FrameWindow:
+    """Fixed-size ring buffer of the most recent frames, shape (size, 5, 6)"""
+
+    def __init__(self, size=DEFAULT_WINDOW_SIZE):
+        self.size = size
+        self.buffer = np.zeros((size, NUM_IMUS, NUM_CHANNELS), dtype=np.float32)
+        self.count = 0      # total frames pushed
+        self.head = 0       # next slot to write
+
+    def push(self, frame):
+        self.buffer[self.head] = frame
+        self.head = (self.head + 1) % self.size
+        self.count += 1
+
+    def is_full(self):
+        return self.count >= self.size
+
+    def latest(self, n=None):
+        """Return the last n frames (default: whole window), oldest first, as a new array"""
+        available = min(self.count, self.size)
+        n = available if n is None else min(n, available)
+        start = (self.head - n) % self.size
+        if start + n <= self.size:
+            return self.buffer[start:start + n].copy()
+        return np.concatenate((self.buffer[start:], self.buffer[:self.head]))
+
+    def snapshot(self):
+        """Return the full (size, 5, 6) window, oldest first; zero-padded until the buffer fills"""
+        return np.concatenate((self.buffer[self.head:], self.buffer[:self.head]))
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+
+# ---------------- Feature extraction ----------------
+def feature_names(fft_bands=DEFAULT_FFT_BANDS):
+    """Names of the columns returned by extract_features, in order"""
+    names = []
+    for i in range(NUM_IMUS):
+        for stat in STAT_NAMES:
+            names.extend(f"IMU{i}_{ch}_{stat}" for ch in CHANNEL_NAMES)
+        names.extend([f"IMU{i}_acc_mag", f"IMU{i}_gyro_mag"])
+        for band in range(fft_bands):
+            names.extend(f"IMU{i}_{ch}_band{band}" for ch in CHANNEL_NAMES)
+    return names
+
+
+def extract_features(windows, fft_bands=DEFAULT_FFT_BANDS):
+    """
+    Compute per-IMU window features in one vectorized pass.
+    windows: (W, 5, 6) for a single window or (B, W, 5, 6) for a batch.
+    Per IMU and channel: mean, variance, RMS, min, max, zero-crossing rate
+    (of the mean-removed signal) and FFT band energies; per IMU: mean
+    accel / gyro magnitude. Returns float32 (F,) or (B, F), F = 5 * (38 + 6 * fft_bands).
+    """
+    x = np.asarray(windows, dtype=np.float32)
+    single = x.ndim == 3
+    if single:
+        x = x[np.newaxis]
+    if x.ndim != 4 or x.shape[2:] != (NUM_IMUS, NUM_CHANNELS):
+        raise ValueError(f"Expected (W, 5, 6) or (B, W, 5, 6) windows, got {x.shape}")
+    batch, length = x.shape[:2]
+    if length < 2 * fft_bands:
+        raise ValueError(f"Window of {length} frames too short for {fft_bands} FFT bands")
+
+    mean = x.mean(axis=1)                                   # (B, 5, 6)
+    centered = x - mean[:, np.newaxis]
+    var = np.square(centered).mean(axis=1)
+    rms = np.sqrt(np.square(x).mean(axis=1))
+    low = x.min(axis=1)
+    high = x.max(axis=1)
+    signs = np.signbit(centered)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1).astype(np.float32) / (length - 1)
+
+    acc_mag = np.sqrt(np.square(x[..., :3]).sum(axis=-1)).mean(axis=1)    # (B, 5)
+    gyro_mag = np.sqrt(np.square(x[..., 3:]).sum(axis=-1)).mean(axis=1)
+
+    # Power spectrum without the DC bin, summed into equal-width bands
+    power = np.square(np.abs(np.fft.rfft(centered, axis=1)[:, 1:])).astype(np.float32)
+    edges = np.linspace(0, power.shape[1], fft_bands + 1).astype(int)[:-1]
+    bands = np.add.reduceat(power, edges, axis=1) / length   # (B, bands, 5, 6)
+    bands = bands.transpose(0, 2, 1, 3).reshape(batch, NUM_IMUS, fft_bands * NUM_CHANNELS)
+
+    per_imu = np.concatenate(
+        (mean, var, rms, low, high, zcr,
+         acc_mag[..., np.newaxis], gyro_mag[..., np.newaxis], bands),
+        axis=-1,
+    ).reshape(batch, -1)
+    return per_imu[0] if single else per_imu
+
+
+# ---------------- Offline helpers ----------------
+def load_csv_frames(csv_file):
+    """Load imu_data.csv (30 columns, header row) into an (N, 5, 6) array"""
+    data = np.loadtxt(csv_file, delimiter=",", skiprows=1, dtype=np.float32, ndmin=2)
+    return data.reshape(-1, NUM_IMUS, NUM_CHANNELS)
+
+
+def sliding_windows(frames, size=DEFAULT_WINDOW_SIZE, step=1):
+    """View an (N, 5, 6) recording as (B, size, 5, 6) overlapping windows (no copy)"""
+    if len(frames) < size:
+        return np.empty((0, size, NUM_IMUS, NUM_CHANNELS), dtype=np.float32)
+    view = np.lib.stride_tricks.sliding_window_view(frames, size, axis=0)  # (B, 5, 6, size)
+    return view.transpose(0, 3, 1, 2)[::step]
+
+
+def features_from_csv(csv_file, size=DEFAULT_WINDOW_SIZE, step=1, fft_bands=DEFAULT_FFT_BANDS):
+    """Feature matrix (B, F) for every window of a recorded CSV session"""
+    return extract_features(sliding_windows(load_csv_frames(csv_file), size, step), fft_bands)
+
+
+# ---------------- Benchmark ----------------
+def benchmark(window_size=DEFAULT_WINDOW_SIZE, batch=64, seconds=2.0, fft_bands=DEFAULT_FFT_BANDS):
+    rng = np.random.default_rng(0)
+    windows = rng.standard_normal((batch, window_size, NUM_IMUS, NUM_CHANNELS)).astype(np.float32)
+    results = {}
+    for label, batch_size in (("single", 1), ("batched", batch)):
+        calls = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            if batch_size == 1:
+                extract_features(windows[calls % batch], fft_bands)
+            else:
+                extract_features(windows, fft_bands)
+            calls += 1
+        elapsed = time.perf_counter() - start
+        results[label] = calls * batch_size / elapsed
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IMU window feature extraction")
+    parser.add_argument("--csv", help="extract features from a recorded imu_data.csv instead of benchmarking")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_SIZE)
+    parser.add_argument("--step", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--bands", type=int, default=DEFAULT_FFT_BANDS)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--out", help="save the offline feature matrix to this .npy file")
+    args = parser.parse_args()
+
+    if args.csv:
+        features = features_from_csv(args.csv, args.window, args.step, args.bands)
+        print(f"{args.csv}: {features.shape[0]} windows x {features.shape[1] if features.ndim == 2 else 0} features")
+        if args.out:
+            np.save(args.out, features)
+            print(f"Saved features to {args.out}")
+    else:
+        print("=" * 60)
+        print(f"Feature extraction benchmark: window={args.window}, bands={args.bands}")
+        print("=" * 60)
+        rates = benchmark(args.window, args.batch, args.seconds, args.bands)
+        print(f"Single window per call : {rates['single']:10.0f} windows/sec")
+        print(f"Batch of {args.batch:<4d} per call : {rates['batched']:10.0f} windows/sec")
@@ -0,0 +1,228 @@
+import importlib
+import queue
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+from imu_features import DEFAULT_WINDOW_SIZE, NUM_IMUS, NUM_CHANNELS
+import metrics
+from pipeline_log import get_logger
+
+log = get_logger("inference")
+
+
+# ---------------- Backends ----------------
+class InferenceBackend:
+    """
+    A model behind the inference engine. load() is called once at startup;
+    predict_batch() gets a float32 (B, W, 5, 6) array and returns
+    (classes, confidences), each of length B.
+    """
+    name = "base"
+
+    def load(self):
+        pass
+
+    def predict_batch(self, windows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RandomBackend(InferenceBackend):
+    """Placeholder model: a random movement class 0..num_classes-1 per window"""
+    name = "random"
+
+    def __init__(self, num_classes=4, seed=None):
+        self.num_classes = num_classes
+        self.rng = random.Random(seed)
+
+    def predict_batch(self, windows):
+        classes = [self.rng.randint(0, self.num_classes - 1) for _ in range(len(windows))]
+        return classes, [1.0 / self.num_classes] * len(windows)
+
+
+class ModuleBackend(InferenceBackend):
+    """
+    Wrap an external model module (e.g. /home/xilinx/ai_code/ai_model.py).
+    The module is imported once in load(); it may define load(), and must
+    define predict_batch(windows) -> (classes, confidences) or
+    classify_window(window) -> class.
+    """
+    name = "module"
+
+    def __init__(self, module="ai_model", path=None):
+        self.module_name = module
+        self.path = path
+        self.module = None
+
+    def load(self):
+        if self.path and self.path not in sys.path:
+            sys.path.append(self.path)
+        self.module = importlib.import_module(self.module_name)
+        if hasattr(self.module, "load"):
+            self.module.load()
+
+    def predict_batch(self, windows):
+        if hasattr(self.module, "predict_batch"):
+            return self.module.predict_batch(windows)
+        classes = [int(self.module.classify_window(w)) for w in windows]
+        return classes, [1.0] * len(classes)
+
+
+BACKENDS = {
+    RandomBackend.name: RandomBackend,
+    ModuleBackend.name: ModuleBackend,
+}
+
+# Backends living in other modules, imported (and registered) on first use
+OPTIONAL_BACKENDS = {
+    "numpy_mlp": "numpy_model",
+    "numpy_cnn": "numpy_model",
+}
+
+
+def create_backend(name, **options):
+    """Instantiate a registered backend by name"""
+    if name not in BACKENDS and name in OPTIONAL_BACKENDS:
+        importlib.import_module(OPTIONAL_BACKENDS[name])
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (available: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[name](**options)
+
+
+# ---------------- Engine ----------------
+class InferenceEngine:
+    """
+    Owns one warm backend and runs it on batches of windows.
+    Windows can be predicted synchronously (predict / predict_batch) or
+    submitted to a worker thread that drains whatever is queued - up to
+    max_batch windows - into a single backend call, then hands each result
+    to on_result(context, movement_class, confidence, batch_latency_ms).
+    """
+
+    def __init__(self, backend, max_batch=8, queue_size=256, on_result=None,
+                 window_size=DEFAULT_WINDOW_SIZE):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.on_result = on_result
+        self.window_size = window_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker = None
+        self.running = False
+        self.loaded = False
+
+        # Stats
+        self.load_time_ms = 0.0
+        self.batches = 0
+        self.windows = 0
+        self.dropped = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.last_batch_size = 0
+        self.last_batch_latency_ms = 0.0
+        self.inference_hist = metrics.histogram("inference")
+        self.windows_counter = metrics.counter("windows_inferred")
+        self.dropped_counter = metrics.counter("windows_dropped")
+
+    def load(self):
+        """Load the model once and run one warm-up prediction"""
+        start = time.perf_counter()
+        self.backend.load()
+        warmup = np.zeros((1, self.window_size, NUM_IMUS, NUM_CHANNELS), dtype=np.float32)
+        self.backend.predict_batch(warmup)
+        self.load_time_ms = (time.perf_counter() - start) * 1000
+        self.loaded = True
+        log.info("Inference backend '%s' loaded in %.1f ms", self.backend.name, self.load_time_ms)
+
+    def predict_batch(self, windows):
+        """Run the backend on a list/array of windows; returns [(class, confidence), ...]"""
+        batch = np.asarray(windows, dtype=np.float32)
+        start = time.perf_counter()
+        classes, confidences = self.backend.predict_batch(batch)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        self.batches += 1
+        self.windows += len(batch)
+        self.total_latency_ms += latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self.last_batch_size = len(batch)
+        self.last_batch_latency_ms = latency_ms
+        self.inference_hist.record_ms(latency_ms)
+        self.windows_counter.inc(len(batch))
+        return [(int(c), float(p)) for c, p in zip(classes, confidences)]
+
+    def predict(self, window):
+        return self.predict_batch([window])[0]
+
+    # ---------------- Background batching ----------------
+    def submit(self, window, context=None):
+        """Queue a window for the worker; returns False (and counts a drop) if the queue is full"""
+        try:
+            self.queue.put_nowait((window, context))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            self.dropped_counter.inc()
+            return False
+
+    def start(self):
+        if not self.loaded:
+            self.load()
+        self.running = True
+        self.worker = threading.Thread(target=self._run_worker, daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        if self.worker:
+            self.queue.put((None, None))
+            self.worker.join(timeout=2)
+            self.worker = None
+        self.backend.close()
+
+    def _run_worker(self):
+        while self.running:
+            item = self.queue.get()
+            if item[0] is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0] is None:
+                    self.running = False
+                    break
+                batch.append(item)
+
+            try:
+                results = self.predict_batch([window for window, _ in batch])
+            except Exception as e:
+                log.error("AI inference error: %s", e)
+                continue
+            if self.on_result:
+                for (_, context), (movement_class, confidence) in zip(batch, results):
+                    try:
+                        self.on_result(context, movement_class, confidence, self.last_batch_latency_ms)
+                    except Exception as e:
+                        log.error("Inference result handler error: %s", e)
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "load_time_ms": round(self.load_time_ms, 2),
+            "batches": self.batches,
+            "windows": self.windows,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+            "avg_batch_size": round(self.windows / self.batches, 2) if self.batches else 0.0,
+            "avg_batch_latency_ms": round(self.total_latency_ms / self.batches, 3) if self.batches else 0.0,
+            "max_batch_latency_ms": round(self.max_latency_ms, 3),
+            "last_batch_latency_ms": round(self.last_batch_latency_ms, 3),
+        }
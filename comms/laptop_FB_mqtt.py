@@ -2,11 +2,12 @@ import socket
 import os
 import time
 import struct
-import json
 import paho.mqtt.client as mqtt
 import ssl
 from threading import Thread
 
+from serializer import dumps, loads, pretty
+
 class LaptopRelayMQTT:
     def __init__(self):
         # TCP Configuration
@@ -65,7 +66,7 @@ class LaptopRelayMQTT:
         """Handle messages from Ultra96"""
         try:
             if msg.topic == self.topic_processed_data:
-                result = json.loads(msg.payload.decode())
+                result = loads(msg.payload)
                 self.display_processed_data(result)
             elif msg.topic == self.topic_errors:
                 print(f"Error from Ultra96: {msg.payload.decode()}")
@@ -119,7 +120,7 @@ class LaptopRelayMQTT:
             
             self.ultra96_client.publish(
                 self.topic_sensor_to_ultra96,
-                json.dumps(message),
+                dumps(message),
                 qos=1
             )
             
@@ -148,7 +149,7 @@ class LaptopRelayMQTT:
         print("\n" + "="*50)
         print("PROCESSED DATA FROM ULTRA96:")
         print("="*50)
-        print(json.dumps(result, indent=2))
+        print(pretty(result))
         print("="*50 + "\n")
     
     def display_imu_data(self):
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# End-to-end latency tracing keyed by frame sequence number.
+# Every hop stamps the frame with now_us():
+#   publisher (laptop): tcp_rx, decrypt, publish  -> travel in the sensor message
+#   Ultra96:            ultra96_rx, inference, result_publish -> added to the result
+#   bridge (laptop):    bridge_rx, actuator_send
+# (wire_format.FRAME_TRACE / RESULT_TRACE). Only the frame that completes a window
+# produces a result, so only those frames get a full trace; the publisher stamps one
+# message in TRACE_EVERY (off by default).
+# The publisher and the bridge run on the same laptop and share the trace clock;
+# the Ultra96 clock is unrelated, so the two network legs are reported together as
+# network_rtt. With a clock offset from clock_sync.py (for the board named in the
+# result, wire_format.result_responder) they are also split into one-way uplink
+# (publish -> ultra96_rx) and downlink (result_publish -> bridge_rx).
+STAGES = ("tcp_rx", "decrypt", "publish", "ultra96_rx", "inference", "result_publish", "bridge_rx", "actuator_send")
+LAPTOP_STAGES = STAGES[:3]
+ULTRA96_STAGES = STAGES[3:6]
+
+# name -> (from stage, to stage) on the same clock
+SEGMENTS = OrderedDict([
+    ("decrypt", ("tcp_rx", "decrypt")),
+    ("batch_wait", ("decrypt", "publish")),
+    ("ultra96_queue_inference", ("ultra96_rx", "inference")),
+    ("ultra96_result", ("inference", "result_publish")),
+    ("actuate", ("bridge_rx", "actuator_send")),
+])
+
+
+def now_us():
+    """Trace clock in microseconds. perf_counter is system wide (CLOCK_MONOTONIC /
+    QueryPerformanceCounter), so processes on the same host can compare stamps."""
+    return time.perf_counter_ns() // 1000
+
+
+def breakdown(stamps, offset_us=None):
+    """
+    Per-segment latency in ms from a {stage: us} dict with all STAGES.
+    offset_us: Ultra96 clock minus laptop clock (clock_sync.ClockSync.offset), if known.
+    """
+    result = OrderedDict()
+    for name, (start, end) in SEGMENTS.items():
+        result[name] = (stamps[end] - stamps[start]) / 1000.0
+    ultra96_ms = (stamps["result_publish"] - stamps["ultra96_rx"]) / 1000.0
+    result["network_rtt"] = (stamps["bridge_rx"] - stamps["publish"]) / 1000.0 - ultra96_ms
+    if offset_us is not None:
+        result["uplink"] = (stamps["ultra96_rx"] - offset_us - stamps["publish"]) / 1000.0
+        result["downlink"] = (stamps["bridge_rx"] - (stamps["result_publish"] - offset_us)) / 1000.0
+    result["total"] = (stamps["actuator_send"] - stamps["tcp_rx"]) / 1000.0
+    return result
+
+
+def format_breakdown(result):
+    return "  ".join(f"{name} {ms:.2f}" for name, ms in result.items()) + " ms"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+class LatencyTracer:
+    """
+    Collects completed traces at the bridge. record() takes the six stamps of a
+    traced result (wire_format.result_trace) plus the bridge's own two stamps (and
+    the Ultra96 clock offset if known) and returns that frame's breakdown; stats()
+    summarises the last `history` traces.
+    """
+
+    def __init__(self, history=1000):
+        self.history = history
+        self.lock = threading.Lock()
+        self.samples = {name: deque(maxlen=history)
+                        for name in list(SEGMENTS) + ["network_rtt", "uplink", "downlink", "total"]}
+        self.recent = OrderedDict()   # sequence -> breakdown
+        self.traces = 0
+
+    def record(self, seq, trace, bridge_rx_us, actuator_send_us, offset_us=None):
+        stamps = dict(zip(LAPTOP_STAGES + ULTRA96_STAGES, trace))
+        stamps["bridge_rx"] = bridge_rx_us
+        stamps["actuator_send"] = actuator_send_us
+        result = breakdown(stamps, offset_us)
+        with self.lock:
+            self.traces += 1
+            for name, ms in result.items():
+                self.samples[name].append(ms)
+            self.recent[seq] = result
+            while len(self.recent) > self.history:
+                self.recent.popitem(last=False)
+        return result
+
+    def get(self, seq):
+        with self.lock:
+            return self.recent.get(seq)
+
+    def stats(self):
+        with self.lock:
+            return {
+                name: {
+                    "count": len(values),
+                    "p50_ms": round(_percentile(values, 50), 3),
+                    "p99_ms": round(_percentile(values, 99), 3),
+                    "max_ms": round(max(values), 3) if values else 0.0,
+                }
+                for name, values in self.samples.items()
+            }
@@ -0,0 +1,268 @@
+import argparse
+import base64
+import math
+import random
+import socket
+import struct
+import threading
+import time
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from metrics import Histogram
+from mqtt_common import MQTTConnection, qos_for, sensor_topic
+from wire_format import pack_frames
+
+# Synthetic glove load for the pipeline: N gloves send concurrently, each at its own
+# rate (up to thousands of frames/s), with a motion profile and send jitter.
+#   tcp     AES-CBC + base64 "IMU0:ax,ay,az,gx,gy,gz;IMU1:..." lines, newline framed,
+#           to the publisher's TCP server (hardware_mqtt_tcp_temp.py, port 4210),
+#           exactly what handle_tcp_client expects from a FireBeetle
+#   direct  binary 120-byte frames over the direct link to ultra96_ai.py (TRANSPORT = "direct")
+#   mqtt    binary 120-byte frames to each glove's sensor partition topic on the broker
+# Frames are precomputed for CYCLE_S of motion per glove and replayed in a loop, so
+# generating them costs nothing while sending. A sender that falls behind writes all
+# overdue frames at once (like a FireBeetle flushing its WiFi buffer); more than
+# MAX_BEHIND_S behind, the frames are skipped and counted as missed.
+AES_KEY = bytes([0x2B, 0x7E, 0x15, 0x16, 0x28, 0xAE, 0xD2, 0xA6,
+                 0xAB, 0xF7, 0x15, 0x88, 0x09, 0xCF, 0x4F, 0x3C])    # same as FireBeetleMQTTPublisher
+AES_IV = bytes(range(16))
+IMUS = 5
+CYCLE_S = 5.0
+MAX_CYCLE_FRAMES = 5000
+MAX_BEHIND_S = 1.0
+PROFILES = ("idle", "wave", "gesture")
+
+
+def motion_sample(profile, t, rng, phase=0.0):
+    """30 values (5 IMUs x accel g, gyro dps) of a glove at time t seconds"""
+    if profile == "wave":
+        # Continuous waving, fingers slightly out of phase
+        envelope, freq = 1.0, 1.5
+    elif profile == "gesture":
+        # At rest, then a ~0.8 s gesture every 2.5 s (raised cosine envelope)
+        into = (t + phase) % 2.5
+        envelope = 0.5 - 0.5 * math.cos(2 * math.pi * into / 0.8) if into < 0.8 else 0.0
+        freq = 2.5
+    else:
+        envelope, freq = 0.0, 0.0
+    values = []
+    for imu in range(IMUS):
+        angle = 2 * math.pi * freq * t + phase + imu * 0.4
+        values += [
+            0.6 * envelope * math.sin(angle) + rng.gauss(0, 0.02),
+            0.4 * envelope * math.cos(angle) + rng.gauss(0, 0.02),
+            1.0 - 0.3 * envelope * math.sin(2 * angle) + rng.gauss(0, 0.02),    # gravity on z at rest
+            180.0 * envelope * math.cos(angle) + rng.gauss(0, 1.0),
+            120.0 * envelope * math.sin(angle) + rng.gauss(0, 1.0),
+            60.0 * envelope * math.sin(angle + 1.0) + rng.gauss(0, 1.0),
+        ]
+    return values
+
+
+def encrypted_line(values):
+    """One FireBeetle TCP line: base64(AES-CBC("IMU0:...;IMU1:...")) + newline"""
+    text = ";".join(f"IMU{imu}:" + ",".join(f"{v:.3f}" for v in values[imu * 6:imu * 6 + 6]) for imu in range(IMUS))
+    cipher = AES.new(AES_KEY, AES.MODE_CBC, AES_IV)
+    return base64.b64encode(cipher.encrypt(pad(text.encode("utf-8"), 16))) + b"\n"
+
+
+def binary_frame(values):
+    return struct.pack("!30f", *values)
+
+
+class Glove:
+    """One simulated glove: precomputed frames and the send loop (run on its own thread)"""
+
+    def __init__(self, name, rate_hz, profile, jitter_ms, mode, seed=None):
+        self.name = name
+        self.rate_hz = rate_hz
+        self.profile = profile
+        self.jitter_s = jitter_ms / 1000.0
+        self.mode = mode
+        self.rng = random.Random(seed)
+        count = max(1, min(int(rate_hz * CYCLE_S), MAX_CYCLE_FRAMES))
+        phase = self.rng.uniform(0, 2.5)
+        encode = encrypted_line if mode == "tcp" else binary_frame
+        self.frames = [encode(motion_sample(profile, i * CYCLE_S / count, self.rng, phase)) for i in range(count)]
+        self.lag = Histogram(f"{name}_lag")
+
+        # Stats
+        self.sent = 0
+        self.bytes = 0
+        self.missed = 0
+        self.errors = 0
+
+    def run(self, send, until, stopping):
+        """send(list of frames, first frame index) until time.perf_counter() >= until"""
+        period = 1.0 / self.rate_hz
+        index = 0
+        next_send = time.perf_counter() + self.rng.uniform(0, period)
+        while not stopping.is_set():
+            now = time.perf_counter()
+            if now >= until:
+                break
+            if next_send > now:
+                time.sleep(next_send - now)
+                now = time.perf_counter()
+            if now - next_send > MAX_BEHIND_S:
+                skipped = int((now - next_send) / period)
+                self.missed += skipped
+                index += skipped
+                next_send += skipped * period
+            batch = []
+            while next_send <= now:
+                self.lag.record_us((now - next_send) * 1e6)
+                batch.append(self.frames[index % len(self.frames)])
+                index += 1
+                next_send += max(0.0, period + self.rng.uniform(-self.jitter_s, self.jitter_s))
+            if not batch:
+                continue
+            try:
+                send(batch, index - len(batch))
+                self.sent += len(batch)
+                self.bytes += sum(len(frame) for frame in batch)
+            except OSError:
+                self.errors += 1
+                time.sleep(0.1)
+
+    def stats(self, elapsed_s):
+        lag = self.lag.snapshot()
+        return {
+            "target_hz": self.rate_hz,
+            "achieved_hz": round(self.sent / elapsed_s, 1) if elapsed_s else 0.0,
+            "sent": self.sent,
+            "missed": self.missed,
+            "errors": self.errors,
+            "kbytes_per_s": round(self.bytes / elapsed_s / 1024, 1) if elapsed_s else 0.0,
+            "lag_p50_ms": lag["p50_ms"],
+            "lag_p99_ms": lag["p99_ms"],
+        }
+
+
+# ---------------- Transports ----------------
+def tcp_sender(host, port):
+    """One TCP connection per glove to the publisher; overdue lines go out in one write"""
+    state = {"sock": None}
+
+    def send(frames, first_index):
+        if state["sock"] is None:
+            sock = socket.create_connection((host, port), timeout=5)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            state["sock"] = sock
+        try:
+            state["sock"].sendall(b"".join(frames))
+        except OSError:
+            state["sock"].close()
+            state["sock"] = None
+            raise
+
+    return send, lambda: state["sock"] and state["sock"].close()
+
+
+def direct_sender(host, port, glove, ssl_context):
+    """Direct link client per glove (source = glove name), one message per frame"""
+    from direct_link import DirectLinkClient
+
+    client = DirectLinkClient(host, port, source=glove, ssl_context=ssl_context, clock_interval_s=0).start()
+    client.connected.wait(10)
+
+    def send(frames, first_index):
+        for i, frame in enumerate(frames):
+            if not client.send(pack_frames([frame], first_index + i)):
+                raise OSError("direct link not connected")
+
+    return send, client.stop
+
+
+def mqtt_sender(host, port, glove, ssl_context):
+    """MQTT client per glove publishing to the glove's sensor partition"""
+    topic = sensor_topic(glove)
+    client = MQTTConnection(f"loadgen_{glove}", use_v5=False,
+                            configure=(lambda c: c.tls_set_context(ssl_context)) if ssl_context else None)
+    client.connect(host, port)
+
+    def send(frames, first_index):
+        for i, frame in enumerate(frames):
+            client.publish(topic, pack_frames([frame], first_index + i), qos=qos_for(topic))
+
+    def close():
+        client.loop_stop()
+        client.disconnect()
+
+    return send, close
+
+
+def report(gloves, elapsed_s):
+    total_target = sum(glove.rate_hz for glove in gloves)
+    total_sent = sum(glove.sent for glove in gloves)
+    print(f"[{elapsed_s:6.1f} s] {total_sent} frames, {total_sent / elapsed_s:.0f}/s of {total_target:.0f}/s target, "
+          f"missed {sum(glove.missed for glove in gloves)}, errors {sum(glove.errors for glove in gloves)}")
+
+
+# ---------------- Main ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate N gloves sending sensor frames at a fixed rate")
+    parser.add_argument("--mode", choices=("tcp", "direct", "mqtt"), default="tcp")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, help="default: 4210 (tcp), 9000 (direct), 8883 (mqtt)")
+    parser.add_argument("--gloves", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=50, help="frames/s per glove")
+    parser.add_argument("--profile", choices=PROFILES + ("mixed",), default="gesture",
+                        help="motion profile (mixed: a random one per glove)")
+    parser.add_argument("--jitter-ms", type=float, default=2.0, help="max +/- jitter of each send interval")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--report-s", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ca", help="CA certificate (TLS for direct / mqtt)")
+    parser.add_argument("--cert", help="client certificate")
+    parser.add_argument("--key", help="client key")
+    args = parser.parse_args()
+
+    port = args.port or {"tcp": 4210, "direct": 9000, "mqtt": 8883}[args.mode]
+    ssl_context = None
+    if args.ca:
+        from tls_context import client_context
+        ssl_context = client_context(args.ca, args.cert, args.key)
+
+    rng = random.Random(args.seed)
+    gloves = []
+    for i in range(args.gloves):
+        profile = rng.choice(PROFILES) if args.profile == "mixed" else args.profile
+        gloves.append(Glove(f"glove{i}", args.rate, profile, args.jitter_ms, args.mode, rng.random()))
+
+    senders = []
+    for glove in gloves:
+        if args.mode == "tcp":
+            senders.append(tcp_sender(args.host, port))
+        elif args.mode == "direct":
+            senders.append(direct_sender(args.host, port, glove.name, ssl_context))
+        else:
+            senders.append(mqtt_sender(args.host, port, glove.name, ssl_context))
+
+    print(f"{args.gloves} gloves x {args.rate:g} Hz ({args.profile}, jitter +/-{args.jitter_ms:g} ms) "
+          f"-> {args.mode} {args.host}:{port} for {args.seconds:g} s")
+    stopping = threading.Event()
+    start = time.perf_counter()
+    until = start + args.seconds
+    threads = [threading.Thread(target=glove.run, args=(send, until, stopping), daemon=True)
+               for glove, (send, _) in zip(gloves, senders)]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(min(args.report_s, max(0.0, until - time.perf_counter()) + 0.05))
+            report(gloves, time.perf_counter() - start)
+    except KeyboardInterrupt:
+        stopping.set()
+    for thread in threads:
+        thread.join()
+    elapsed_s = time.perf_counter() - start
+    for _, close in senders:
+        close()
+
+    print("=" * 60)
+    for glove in gloves:
+        print(f"{glove.name} ({glove.profile}): {glove.stats(elapsed_s)}")
+    report(gloves, elapsed_s)
@@ -0,0 +1,247 @@
+import argparse
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide counters and latency histograms for the pipeline stages
+# (framing, decrypt, parse, publish, decode, log_write, inference, actuator_send)
+# and end_to_end (traced results, laptop tcp_rx -> actuator send), plus gauges
+# read from a callback at snapshot time (queue depths and the like).
+# Exported over HTTP / to a JSON-lines file by metrics_http.py.
+# Updates take no lock: under the GIL an update can very rarely be lost when two
+# threads hit the same metric at once, which is fine for statistics and keeps the
+# hot path at a few hundred ns. snapshot() copies the bucket arrays, so it can run
+# from any thread while the pipeline keeps recording.
+#
+# Histograms are HDR-style log-linear: every power of two of microseconds is split
+# into SUB_BUCKETS linear buckets, so a percentile is within 1/SUB_BUCKETS (6%) of
+# the true value from 1 us to ~12 days, in a fixed 608-entry array.
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_SHIFT = 36
+NUM_BUCKETS = (MAX_SHIFT + 2) * SUB_BUCKETS
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(value_us):
+    if value_us < 2 * SUB_BUCKETS:
+        return max(0, value_us)
+    shift = min(value_us.bit_length() - SUB_BITS - 1, MAX_SHIFT)
+    return min((shift + 1) * SUB_BUCKETS + (value_us >> shift) - SUB_BUCKETS, NUM_BUCKETS - 1)
+
+
+def bucket_bounds(index):
+    """[low, high] microseconds covered by a bucket"""
+    if index < 2 * SUB_BUCKETS:
+        return index, index
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+class Counter:
+    """Monotonic event / byte counter"""
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """Log-bucketed latency histogram; values are recorded in microseconds"""
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record_us(self, value_us):
+        value_us = int(value_us)
+        self.counts[bucket_index(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def record_ms(self, value_ms):
+        self.record_us(value_ms * 1000)
+
+    def record_since(self, start):
+        """Record the time since start = time.perf_counter()"""
+        self.record_us((time.perf_counter() - start) * 1e6)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_since(start)
+
+    def snapshot(self, buckets=False):
+        """Count, mean, percentiles, max and sum; buckets=True adds the sparse bucket counts"""
+        counts = list(self.counts)
+        result = _summary(counts, self.total_us, self.max_us)
+        if buckets:
+            result["buckets"] = {index: bucket_count for index, bucket_count in enumerate(counts) if bucket_count}
+        return result
+
+
+def _summary(counts, total_us, max_us):
+    count = sum(counts)
+    result = {"count": count, "mean_ms": round(total_us / count / 1000.0, 3) if count else 0.0}
+    targets = [(pct, count * pct / 100.0) for pct in PERCENTILES]
+    seen = 0
+    values = {}
+    for index, bucket_count in enumerate(counts):
+        if not bucket_count:
+            continue
+        seen += bucket_count
+        while targets and seen >= targets[0][1]:
+            low, high = bucket_bounds(index)
+            values[targets.pop(0)[0]] = min((low + high) / 2.0, max_us)
+        if not targets:
+            break
+    for pct in PERCENTILES:
+        key = f"p{pct:g}".replace(".", "") + "_ms"
+        result[key] = round(values.get(pct, 0.0) / 1000.0, 3)
+    result["max_ms"] = round(max_us / 1000.0, 3)
+    result["sum_ms"] = round(total_us / 1000.0, 3)
+    return result
+
+
+def histogram_delta(before, after):
+    """
+    Summary of the values recorded between two histogram snapshots taken with
+    buckets=True (e.g. a benchmark's measurement window, without its warmup).
+    max is the upper bound of the highest bucket hit in between.
+    """
+    before_buckets = {int(index): n for index, n in (before or {}).get("buckets", {}).items()}
+    counts = [0] * NUM_BUCKETS
+    top = None
+    for index, n in after.get("buckets", {}).items():
+        index = int(index)
+        counts[index] = n - before_buckets.get(index, 0)
+        if counts[index] and (top is None or index > top):
+            top = index
+    total_us = (after["sum_ms"] - (before or {}).get("sum_ms", 0.0)) * 1000.0
+    max_us = min(bucket_bounds(top)[1], after["max_ms"] * 1000.0) if top is not None else 0
+    return _summary(counts, total_us, max_us)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}            # name -> callable returning a number
+        self.lock = threading.Lock()    # only taken when a metric is created
+        self.started = time.time()
+
+    def counter(self, name):
+        metric = self.counters.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.counters.setdefault(name, Counter(name))
+        return metric
+
+    def histogram(self, name):
+        metric = self.histograms.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.histograms.setdefault(name, Histogram(name))
+        return metric
+
+    def gauge(self, name, read):
+        """Register (or replace) a gauge; read() is called on every snapshot"""
+        with self.lock:
+            self.gauges[name] = read
+
+    def _read_gauges(self, gauges):
+        values = {}
+        for name, read in gauges:
+            try:
+                values[name] = read()
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self, buckets=False):
+        with self.lock:
+            counters = list(self.counters.values())
+            histograms = list(self.histograms.values())
+            gauges = list(self.gauges.items())
+        return {
+            "timestamp": time.time(),
+            "uptime_s": round(time.time() - self.started, 3),
+            "counters": {c.name: c.value for c in counters},
+            "gauges": self._read_gauges(gauges),
+            "histograms": {h.name: h.snapshot(buckets) for h in histograms},
+        }
+
+
+def rates(before, after):
+    """Per-second counter rates between two snapshots"""
+    elapsed = after["timestamp"] - before["timestamp"]
+    if elapsed <= 0:
+        return {}
+    return {name: round((value - before["counters"].get(name, 0)) / elapsed, 2)
+            for name, value in after["counters"].items()}
+
+
+def format_snapshot(snapshot, previous=None):
+    """One line per metric for the console stats prints"""
+    per_second = rates(previous, snapshot) if previous else {}
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        rate = f" ({per_second[name]}/s)" if name in per_second else ""
+        lines.append(f"  {name:<20} {value}{rate}")
+    for name, value in sorted(snapshot.get("gauges", {}).items()):
+        lines.append(f"  {name:<20} {value}")
+    for name, h in sorted(snapshot["histograms"].items()):
+        lines.append(f"  {name:<20} n={h['count']} p50 {h['p50_ms']} p90 {h['p90_ms']} p99 {h['p99_ms']} "
+                     f"p999 {h['p999_ms']} max {h['max_ms']} ms")
+    return "\n".join(lines)
+
+
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
+snapshot = REGISTRY.snapshot
+
+
+# ---------------- Benchmark ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metrics update cost and percentile accuracy")
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+
+    values = [random.lognormvariate(7, 1) for _ in range(args.count)]   # ~1 ms median, long tail
+    h = Histogram("bench")
+    start = time.perf_counter()
+    for value in values:
+        h.record_us(value)
+    record_ns = (time.perf_counter() - start) / args.count * 1e9
+    c = Counter("bench")
+    start = time.perf_counter()
+    for _ in range(args.count):
+        c.inc()
+    inc_ns = (time.perf_counter() - start) / args.count * 1e9
+    start = time.perf_counter()
+    result = h.snapshot()
+    snapshot_us = (time.perf_counter() - start) * 1e6
+
+    ordered = sorted(values)
+    print("=" * 60)
+    print(f"record {record_ns:.0f} ns  inc {inc_ns:.0f} ns  snapshot {snapshot_us:.0f} us")
+    for pct in PERCENTILES:
+        exact = ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))] / 1000.0
+        key = f"p{pct:g}".replace(".", "") + "_ms"
+        print(f"{key:<8} histogram {result[key]:>9.3f} ms  exact {exact:>9.3f} ms  "
+              f"error {100 * (result[key] - exact) / exact:+.2f}%")
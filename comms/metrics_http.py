@@ -0,0 +1,175 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from pipeline_log import get_logger, setup_logging
+
+# Live view of the metrics.py registry of one process:
+#   GET /metrics       Prometheus text exposition format (scrape or curl it)
+#   GET /metrics.json  the raw snapshot (?buckets=1 adds the histogram bucket counts,
+#                      for metrics.histogram_delta over a time window)
+# and an optional JSON-lines dump (one snapshot + counter rates per line) for
+# graphing a session afterwards. Both read snapshots only, never the hot path.
+PREFIX = "cg4002"
+PERCENTILE_QUANTILES = (("p50_ms", "0.5"), ("p90_ms", "0.9"), ("p99_ms", "0.99"), ("p999_ms", "0.999"))
+
+log = get_logger("metrics_http")
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", f"{PREFIX}_{name}")
+
+
+def prometheus_text(snapshot, labels=None):
+    """Prometheus exposition of a snapshot: counters, gauges, and one summary with a stage label"""
+    base = "".join(f',{key}="{value}"' for key, value in sorted((labels or {}).items()))
+    plain = "{" + base[1:] + "}" if base else ""
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{plain} {value}")
+    for name, value in sorted(snapshot.get("gauges", {}).items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{plain} {value}")
+    if snapshot["histograms"]:
+        metric = _metric_name("stage_latency_seconds")
+        lines.append(f"# TYPE {metric} summary")
+        for stage, h in sorted(snapshot["histograms"].items()):
+            for key, quantile in PERCENTILE_QUANTILES:
+                lines.append(f'{metric}{{stage="{stage}",quantile="{quantile}"{base}}} {h[key] / 1000.0:.6f}')
+            lines.append(f'{metric}_sum{{stage="{stage}"{base}}} {h["sum_ms"] / 1000.0:.6f}')
+            lines.append(f'{metric}_count{{stage="{stage}"{base}}} {h["count"]}')
+    lines.append(f"{_metric_name('uptime_seconds')}{plain} {snapshot['uptime_s']}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP endpoint for the registry; labels (e.g. {"component": "ultra96"}) go on every sample"""
+
+    def __init__(self, port, host="0.0.0.0", labels=None, registry=None):
+        self.host = host
+        self.port = port
+        self.labels = labels or {}
+        self.registry = registry or metrics.REGISTRY
+        self.httpd = None
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = prometheus_text(server.registry.snapshot(), server.labels).encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    buckets = "buckets=1" in self.path.partition("?")[2].split("&")
+                    body = json.dumps(server.registry.snapshot(buckets)).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass    # no request log on the console
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        log.info("Metrics on http://%s:%d/metrics", self.host, self.port)
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+class MetricsDumper:
+    """Append a snapshot (plus per-second counter rates) to a JSON-lines file every interval_s"""
+
+    def __init__(self, path, interval_s=5.0, labels=None, registry=None):
+        self.path = path
+        self.interval_s = interval_s
+        self.labels = labels or {}
+        self.registry = registry or metrics.REGISTRY
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        log.info("Dumping metrics to %s every %g s", self.path, self.interval_s)
+        return self
+
+    def _run(self):
+        previous = self.registry.snapshot()
+        with open(self.path, "a") as file:
+            while not self.stopping.wait(self.interval_s):
+                previous = self._write(file, previous)
+            self._write(file, previous)
+
+    def _write(self, file, previous):
+        snapshot = self.registry.snapshot()
+        record = dict(snapshot, rates=metrics.rates(previous, snapshot), **self.labels)
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        return snapshot
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+
+
+def start_exporters(port=None, dump_file=None, dump_interval_s=5.0, labels=None):
+    """Start whichever of the HTTP endpoint / JSON-lines dump is configured; returns them for stop()"""
+    exporters = []
+    try:
+        if port is not None:
+            exporters.append(MetricsServer(port, labels=labels).start())
+    except OSError as e:
+        log.warning("Metrics endpoint on port %d unavailable: %s", port, e)
+    if dump_file:
+        exporters.append(MetricsDumper(dump_file, dump_interval_s, labels).start())
+    return exporters
+
+
+def stop_exporters(exporters):
+    for exporter in exporters:
+        exporter.stop()
+
+
+# ---------------- Demo ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic pipeline metrics")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--dump", help="JSON-lines file")
+    parser.add_argument("--seconds", type=float, default=30)
+    args = parser.parse_args()
+    setup_logging()
+
+    import random
+
+    exporters = start_exporters(args.port, args.dump, 1.0, {"component": "demo"})
+    frames = metrics.counter("frames_in")
+    inference = metrics.histogram("inference")
+    metrics.gauge("inference_queue", lambda: random.randint(0, 8))
+    end = time.time() + args.seconds
+    while time.time() < end:
+        frames.inc()
+        inference.record_ms(random.lognormvariate(0, 0.5))
+        time.sleep(0.01)
+    stop_exporters(exporters)
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import ssl
+import struct
+import threading
+import time
+
+from pipeline_log import get_logger, setup_logging
+from tls_context import server_context
+
+# Small in-process MQTT 3.1.1 broker for benchmarks, CI and single-host runs.
+# Supports CONNECT / SUBSCRIBE / UNSUBSCRIBE / PUBLISH (QoS 0 and 1) / PINGREQ /
+# DISCONNECT, + and # wildcards, $share/<group>/<filter> shared subscriptions
+# (round robin) and optional TLS. Not supported: retained messages, wills, QoS 2,
+# offline queueing (a persistent session keeps its subscriptions only) and MQTT v5 -
+# a v5 CONNECT is refused with "unacceptable protocol version" so MQTTConnection
+# falls back to 3.1.1.
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+CONNACK_ACCEPTED = 0
+CONNACK_BAD_PROTOCOL = 1
+
+log = get_logger("broker")
+
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(out)
+
+
+def packet(packet_type, body, flags=0):
+    return bytes([(packet_type << 4) | flags]) + encode_length(len(body)) + body
+
+
+def encode_string(text):
+    raw = text.encode("utf-8")
+    return struct.pack("!H", len(raw)) + raw
+
+
+def read_string(body, offset):
+    (length,) = struct.unpack_from("!H", body, offset)
+    offset += 2
+    return body[offset:offset + length].decode("utf-8"), offset + length
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT topic filter match with + and # wildcards"""
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    if topic.startswith("$") and filter_levels[0] in ("+", "#"):
+        return False
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class Session:
+    def __init__(self, client_id, clean):
+        self.client_id = client_id
+        self.clean = clean
+        self.writer = None
+        self.subscriptions = {}    # subscribed filter (as sent, incl. $share) -> qos
+        self.next_packet_id = 0
+
+    def packet_id(self):
+        self.next_packet_id = self.next_packet_id % 65535 + 1
+        return self.next_packet_id
+
+
+class MiniBroker:
+    """
+    asyncio MQTT 3.1.1 broker. start() runs it on a background thread (port=0
+    picks a free port, see .port).
+    Subscribers whose socket buffer exceeds max_buffer lose QoS 0 messages
+    instead of stalling the publisher.
+    """
+
+    def __init__(self, host="127.0.0.1", port=1883, ssl_context=None, max_buffer=1 << 20, verbose=False):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.max_buffer = max_buffer
+        self.verbose = verbose
+
+        self.sessions = {}         # client id -> Session
+        self.subscribers = {}      # filter -> {Session: qos}
+        self.shared = {}           # (group, filter) -> [[Session, qos], ...]
+        self.shared_next = {}      # (group, filter) -> round robin index
+        self.route_cache = {}      # topic -> ([(Session, qos)], [shared key])
+
+        self.loop = None
+        self.server = None
+        self.stopping = None
+        self.thread = None
+        self.ready = threading.Event()
+
+        # Stats
+        self.messages_in = 0
+        self.messages_out = 0
+        self.dropped = 0
+        self.connections = 0
+
+    def log(self, message):
+        if self.verbose:
+            log.info("%s", message)
+
+    # ---------------- Subscriptions ----------------
+    def _subscribe(self, session, topic_filter, qos):
+        self.route_cache.clear()
+        session.subscriptions[topic_filter] = qos
+        if topic_filter.startswith("$share/"):
+            _, group, real_filter = topic_filter.split("/", 2)
+            members = self.shared.setdefault((group, real_filter), [])
+            for member in members:
+                if member[0] is session:
+                    member[1] = qos
+                    return
+            members.append([session, qos])
+        else:
+            self.subscribers.setdefault(topic_filter, {})[session] = qos
+
+    def _unsubscribe(self, session, topic_filter):
+        self.route_cache.clear()
+        session.subscriptions.pop(topic_filter, None)
+        if topic_filter.startswith("$share/"):
+            _, group, real_filter = topic_filter.split("/", 2)
+            key = (group, real_filter)
+            members = [m for m in self.shared.get(key, []) if m[0] is not session]
+            if members:
+                self.shared[key] = members
+            else:
+                self.shared.pop(key, None)
+        else:
+            subscribers = self.subscribers.get(topic_filter, {})
+            subscribers.pop(session, None)
+            if not subscribers:
+                self.subscribers.pop(topic_filter, None)
+
+    def _drop_session(self, session):
+        for topic_filter in list(session.subscriptions):
+            self._unsubscribe(session, topic_filter)
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+
+    def _routes(self, topic):
+        routes = self.route_cache.get(topic)
+        if routes is None:
+            direct = {}
+            for topic_filter, subscribers in self.subscribers.items():
+                if topic_matches(topic_filter, topic):
+                    for session, qos in subscribers.items():
+                        direct[session] = max(qos, direct.get(session, 0))
+            shared = [key for key in self.shared if topic_matches(key[1], topic)]
+            routes = self.route_cache[topic] = (list(direct.items()), shared)
+        return routes
+
+    # ---------------- Delivery ----------------
+    def _deliver(self, session, topic, payload, qos):
+        writer = session.writer
+        if writer is None or writer.is_closing():
+            self.dropped += 1
+            return False
+        if qos == 0 and writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            return False
+        if qos:
+            body = encode_string(topic) + struct.pack("!H", session.packet_id()) + payload
+            writer.write(packet(PUBLISH, body, 0x02))
+        else:
+            writer.write(packet(PUBLISH, encode_string(topic) + payload))
+        self.messages_out += 1
+        return True
+
+    def publish(self, topic, payload, qos=0):
+        """Route a message to every matching subscriber (also usable from broker-side code)"""
+        self.messages_in += 1
+        direct, shared = self._routes(topic)
+        for session, sub_qos in direct:
+            self._deliver(session, topic, payload, min(qos, sub_qos))
+        for key in shared:
+            members = self.shared.get(key)
+            if not members:
+                continue
+            start = self.shared_next.get(key, 0)
+            for i in range(len(members)):
+                session, sub_qos = members[(start + i) % len(members)]
+                if session.writer is not None:
+                    self._deliver(session, topic, payload, min(qos, sub_qos))
+                    self.shared_next[key] = (start + i + 1) % len(members)
+                    break
+
+    # ---------------- Connection handling ----------------
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b""
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def _handle_connect(self, body, writer):
+        protocol, offset = read_string(body, 0)
+        level, flags = body[offset], body[offset + 1]
+        keepalive = struct.unpack_from("!H", body, offset + 2)[0]
+        if protocol not in ("MQTT", "MQIsdp") or level not in (3, 4):
+            writer.write(packet(CONNACK, bytes([0, CONNACK_BAD_PROTOCOL])))
+            await writer.drain()
+            return None, 0
+        client_id, _ = read_string(body, offset + 4)
+        clean = bool(flags & 0x02)
+        if not client_id:
+            client_id = f"auto-{id(writer):x}"
+            clean = True
+
+        session = self.sessions.get(client_id)
+        if session is not None and session.writer is not None:
+            self.log(f"{client_id} taken over by a new connection")
+            session.writer.close()
+            session.writer = None
+        if session is not None and (clean or session.clean):
+            self._drop_session(session)
+            session = None
+        present = session is not None
+        if session is None:
+            session = self.sessions[client_id] = Session(client_id, clean)
+        session.clean = clean
+        session.writer = writer
+        self.route_cache.clear()
+        writer.write(packet(CONNACK, bytes([1 if present else 0, CONNACK_ACCEPTED])))
+        self.log(f"{client_id} connected (clean={clean}, session present={present})")
+        return session, keepalive
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        session = None
+        try:
+            packet_type, _, body = await asyncio.wait_for(self._read_packet(reader), 10)
+            if packet_type != CONNECT:
+                return
+            session, keepalive = await self._handle_connect(body, writer)
+            if session is None:
+                return
+            timeout = keepalive * 1.5 if keepalive else None
+            while True:
+                packet_type, flags, body = await asyncio.wait_for(self._read_packet(reader), timeout)
+                if packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic, offset = read_string(body, 0)
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        writer.write(packet(PUBACK, packet_id))
+                    self.publish(topic, body[offset:], qos)
+                elif packet_type == PUBACK:
+                    pass    # no retransmission, so nothing to release
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset = body[:2], 2
+                    granted = bytearray()
+                    while offset < len(body):
+                        topic_filter, offset = read_string(body, offset)
+                        qos = min(body[offset], 1)
+                        offset += 1
+                        self._subscribe(session, topic_filter, qos)
+                        granted.append(qos)
+                        self.log(f"{session.client_id} subscribed to {topic_filter} (QoS {qos})")
+                    writer.write(packet(SUBACK, packet_id + bytes(granted)))
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, offset = body[:2], 2
+                    while offset < len(body):
+                        topic_filter, offset = read_string(body, offset)
+                        self._unsubscribe(session, topic_filter)
+                    writer.write(packet(UNSUBACK, packet_id))
+                elif packet_type == PINGREQ:
+                    writer.write(packet(PINGRESP, b""))
+                elif packet_type == DISCONNECT:
+                    break
+                if writer.transport.get_write_buffer_size() > self.max_buffer:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ssl.SSLError):
+            pass
+        except Exception as e:
+            log.error("Error with %s: %s", session.client_id if session else "client", e)
+        finally:
+            if session is not None and session.writer is writer:
+                session.writer = None
+                self.route_cache.clear()
+                if session.clean:
+                    self._drop_session(session)
+                self.log(f"{session.client_id} disconnected")
+            writer.close()
+
+    # ---------------- Lifecycle ----------------
+    async def _serve(self):
+        self.stopping = asyncio.Event()
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port, ssl=self.ssl_context)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        await self.stopping.wait()
+
+        # Closing the sockets ends every client handler
+        self.server.close()
+        for session in list(self.sessions.values()):
+            if session.writer is not None:
+                session.writer.close()
+        await self.server.wait_closed()
+        await asyncio.sleep(0.1)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.loop.close()
+
+    def start(self, timeout=5):
+        """Run the broker on a background thread; returns once it is listening"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if not self.ready.wait(timeout):
+            raise RuntimeError("MQTT broker did not start")
+        return self
+
+    def stop(self):
+        if self.loop and self.stopping and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def stats(self):
+        return {
+            "clients": sum(1 for s in self.sessions.values() if s.writer is not None),
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "dropped": self.dropped,
+            "connections": self.connections,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lightweight MQTT 3.1.1 broker")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--cert", help="server certificate (enables TLS)")
+    parser.add_argument("--key")
+    parser.add_argument("--ca", help="CA for client certificates")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    setup_logging()
+
+    context = server_context(args.cert, args.key, args.ca) if args.cert else None
+    broker = MiniBroker(args.host, args.port, context, verbose=args.verbose)
+    print(f"MQTT broker listening on {args.host}:{args.port}{' (TLS)' if context else ''}")
+    try:
+        broker.start()
+        while True:
+            time.sleep(10)
+            print(f"Broker stats: {broker.stats()}")
+    except KeyboardInterrupt:
+        print("Stopping broker...")
+        broker.stop()
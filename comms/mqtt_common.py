@@ -0,0 +1,390 @@
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from pipeline_log import get_logger
+
+log = get_logger("mqtt")
+
+# MQTT topics shared by the laptop publisher, the Ultra96 subscriber and the laptop bridge
+TOPIC_SENSOR = "robot/sensor/to_ultra96"
+TOPIC_PROCESSED = "robot/processed/data"
+TOPIC_ERRORS = "robot/errors"
+TOPIC_PROCESSED_DEBUG = "robot/processed/debug"   # JSON copy of results, off by default
+TOPIC_CLOCK_PING = "robot/clock/ping"   # + "/<pinger>", see clock_sync.py
+TOPIC_CLOCK_PONG = "robot/clock/pong"   # + "/<pinger>"
+
+# ---------------- QoS policy ----------------
+# Live sensor frames go out at QoS 0: a lost frame is superseded by the next one
+# a few ms later, so a PUBACK round trip and an inflight slot per frame buy nothing.
+# Movement classes and errors are rare and must arrive, so they stay at QoS 1.
+# Override per topic with MQTT_QOS_POLICY="robot/sensor/to_ultra96=1,robot/errors=0".
+DEFAULT_QOS = 1
+QOS_POLICY = {
+    TOPIC_SENSOR: 0,
+    TOPIC_PROCESSED: 1,
+    TOPIC_ERRORS: 1,
+    TOPIC_PROCESSED_DEBUG: 0,
+    TOPIC_CLOCK_PING: 0,
+    TOPIC_CLOCK_PONG: 0,
+}
+
+
+def _load_overrides():
+    for item in os.environ.get("MQTT_QOS_POLICY", "").split(","):
+        if "=" in item:
+            topic, qos = item.rsplit("=", 1)
+            QOS_POLICY[topic.strip()] = int(qos)
+
+
+_load_overrides()
+
+
+def qos_for(topic):
+    """QoS for a topic: exact match, else the longest policy topic it sits under, else DEFAULT_QOS"""
+    if topic.startswith("$share/"):
+        topic = topic.split("/", 2)[2]   # $share/<group>/<topic>
+    if topic in QOS_POLICY:
+        return QOS_POLICY[topic]
+    best = None
+    for prefix in QOS_POLICY:
+        if topic.startswith(prefix + "/") and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return QOS_POLICY[best] if best else DEFAULT_QOS
+
+
+def set_qos(topic, qos):
+    QOS_POLICY[topic] = qos
+
+
+# ---------------- Sensor partitions (Ultra96 worker pool) ----------------
+# Each sensor source publishes to robot/sensor/to_ultra96/p<k>/<source>, with k a
+# stable hash of the source id over SENSOR_PARTITIONS partitions (environment
+# SENSOR_PARTITIONS; the publisher and every worker must use the same value, and it
+# caps the pool size). Worker i of N subscribes to the partitions k with k % N == i
+# through $share/<group>-p<k>/..., so one source always lands on the same worker (its
+# window / segmenter state lives there). Each index must run exactly once: two
+# workers with the same index would round-robin one share group and split every
+# source's window between them. The bare TOPIC_SENSOR (single legacy source)
+# belongs to worker 0.
+SENSOR_PARTITIONS = int(os.environ.get("SENSOR_PARTITIONS", "8"))
+SHARE_GROUP = "ultra96"
+DEFAULT_SOURCE = "default"
+
+
+def sensor_partition(source):
+    return zlib.crc32(source.encode("utf-8")) % SENSOR_PARTITIONS
+
+
+def sensor_topic(source):
+    """Partitioned sensor topic a source publishes to"""
+    return f"{TOPIC_SENSOR}/p{sensor_partition(source)}/{source}"
+
+
+def source_from_topic(topic):
+    """Source id of a sensor topic; DEFAULT_SOURCE for the bare TOPIC_SENSOR"""
+    if topic.startswith(TOPIC_SENSOR + "/"):
+        return topic.rsplit("/", 1)[1]
+    return DEFAULT_SOURCE
+
+
+def worker_subscriptions(index=0, count=1, group=SHARE_GROUP):
+    """Shared-subscription topic filters owned by worker index of count"""
+    if not 0 <= index < count:
+        raise ValueError(f"Worker index {index} outside 0..{count - 1}")
+    if count > SENSOR_PARTITIONS:
+        raise ValueError(f"{count} workers but only {SENSOR_PARTITIONS} sensor partitions "
+                         f"(raise SENSOR_PARTITIONS on the publisher and every worker)")
+    topics = [f"$share/{group}-p{k}/{TOPIC_SENSOR}/p{k}/+"
+              for k in range(SENSOR_PARTITIONS) if k % count == index]
+    if index == 0:
+        topics.append(f"$share/{group}/{TOPIC_SENSOR}")
+    return topics
+
+
+def worker_client_id(prefix, index=0):
+    """Unique, restart-stable client id per worker: <prefix>_<hostname>_w<index>"""
+    return f"{prefix}_{socket.gethostname()}_w{index}"
+
+
+# ---------------- Offline outbox ----------------
+class Outbox:
+    """
+    Messages published while the broker is unreachable (e.g. the SSH tunnel to the
+    Ultra96 dropped). Sensor frames are kept for at most max_age_ms and at most
+    max_frames of them; anything older is stale motion and is dropped instead of
+    being replayed after the reconnect. Every other (control) message is kept.
+    """
+
+    def __init__(self, max_age_ms=200, max_frames=500, frame_topics=(TOPIC_SENSOR,)):
+        self.max_age = max_age_ms / 1000.0
+        self.max_frames = max_frames
+        self.frame_topics = frame_topics
+        self.lock = threading.Lock()
+        self.messages = deque()     # (queued_at, is_frame, topic, payload, qos, options)
+        self.frames = 0
+
+        # Stats
+        self.queued = 0
+        self.sent = 0
+        self.dropped_stale = 0
+        self.dropped_overflow = 0
+
+    def is_frame(self, topic):
+        return any(topic == t or topic.startswith(t + "/") for t in self.frame_topics)
+
+    def put(self, topic, payload, qos, **options):
+        is_frame = self.is_frame(topic)
+        with self.lock:
+            if is_frame and self.frames >= self.max_frames:
+                self._drop_oldest_frame()
+            self.messages.append((time.monotonic(), is_frame, topic, payload, qos, options))
+            self.frames += is_frame
+            self.queued += 1
+
+    def _drop_oldest_frame(self):
+        for i, message in enumerate(self.messages):
+            if message[1]:
+                del self.messages[i]
+                self.frames -= 1
+                self.dropped_overflow += 1
+                return
+
+    def drain(self):
+        """Take everything still worth sending, oldest first"""
+        with self.lock:
+            messages, self.messages, self.frames = self.messages, deque(), 0
+        cutoff = time.monotonic() - self.max_age
+        fresh = []
+        for queued_at, is_frame, topic, payload, qos, options in messages:
+            if is_frame and queued_at < cutoff:
+                self.dropped_stale += 1
+            else:
+                fresh.append((topic, payload, qos, options))
+        self.sent += len(fresh)
+        return fresh
+
+    def __len__(self):
+        return len(self.messages)
+
+    def stats(self):
+        return {
+            "pending": len(self.messages),
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped_stale": self.dropped_stale,
+            "dropped_overflow": self.dropped_overflow,
+        }
+
+
+# ---------------- Client wrapper (MQTT v5 with 3.1.1 fallback) ----------------
+CONNACK_UNSUPPORTED_PROTOCOL = 132   # paho reports a v3 broker's "refused: protocol version" as this
+
+
+def message_metadata(msg):
+    """User properties (e.g. seq / ts) of a received v5 message as a dict; {} for MQTT 3.1.1"""
+    properties = getattr(msg, "properties", None)
+    if properties is None or not hasattr(properties, "UserProperty"):
+        return {}
+    return dict(properties.UserProperty)
+
+
+class MQTTConnection:
+    """
+    paho client shared by the publisher, the Ultra96 subscriber and the laptop bridge.
+    With use_v5 the client connects as MQTT v5 and
+      - sends Receive Maximum so the broker never has more than receive_maximum
+        QoS>0 messages in flight to us, and caps our own inflight window at the
+        broker's Receive Maximum,
+      - replaces the topic string with a topic alias after the first QoS 0 publish
+        on each topic (up to the broker's Topic Alias Maximum),
+      - carries seq / ts as user properties instead of JSON fields.
+    If the broker refuses v5 the client is rebuilt as MQTT 3.1.1.
+    With persistent=True the broker keeps the session (subscriptions and QoS 1
+    messages) for session_expiry seconds across disconnects; the client id must
+    then be stable. Publishes made while disconnected go to outbox (an Outbox)
+    and are sent after the reconnect, ahead of anything published after it;
+    without an outbox they are dropped.
+    paho's own queue of unacknowledged messages is capped at max_queued.
+    Callbacks use the 3.1.1 signatures: on_connect(client, userdata, flags, rc),
+    on_message(client, userdata, msg), on_disconnect(client, userdata, rc).
+    configure(paho_client) is applied to every new paho client (TLS etc.).
+    """
+
+    def __init__(self, client_id, use_v5=True, receive_maximum=20, configure=None,
+                 on_connect=None, on_message=None, on_disconnect=None,
+                 persistent=False, session_expiry=300, outbox=None, max_queued=1000):
+        self.client_id = client_id
+        self.use_v5 = use_v5
+        self.receive_maximum = receive_maximum
+        self.persistent = persistent
+        self.session_expiry = session_expiry
+        self.outbox = outbox
+        self.max_queued = max_queued
+        self.configure = configure
+        self.on_connect = on_connect
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+
+        self.v5 = False
+        self.topic_alias_maximum = 0
+        self.aliases = {}           # topic -> alias sent on this connection
+        self.alias_lock = threading.Lock()
+        self.outbox_lock = threading.Lock()
+        self.backlog_sent = False   # outbox flushed since the last (re)connect; guarded by outbox_lock
+        self.connack = threading.Event()
+        self.connack_rc = None
+        self.client = self._make_client(use_v5)
+
+    def _make_client(self, v5):
+        self.v5 = v5
+        if v5:
+            client = mqtt.Client(client_id=self.client_id, protocol=mqtt.MQTTv5)
+        else:
+            client = mqtt.Client(client_id=self.client_id, protocol=mqtt.MQTTv311,
+                                 clean_session=not self.persistent)
+        client.max_queued_messages_set(self.max_queued)
+        client.reconnect_delay_set(min_delay=1, max_delay=5)
+        if self.configure:
+            self.configure(client)
+        client.on_connect = self._handle_connect
+        client.on_message = self._handle_message
+        client.on_disconnect = self._handle_disconnect
+        return client
+
+    def _connect_properties(self):
+        properties = Properties(PacketTypes.CONNECT)
+        properties.ReceiveMaximum = self.receive_maximum
+        properties.TopicAliasMaximum = 0    # we don't accept aliases from the broker
+        if self.persistent:
+            properties.SessionExpiryInterval = self.session_expiry
+        return properties
+
+    # ---------------- paho callbacks ----------------
+    def _handle_connect(self, client, userdata, flags, rc, properties=None):
+        self.connack_rc = rc
+        if self.v5 and rc == CONNACK_UNSUPPORTED_PROTOCOL:
+            self.connack.set()
+            return
+        if rc == 0:
+            with self.alias_lock:
+                self.aliases = {}   # aliases only live as long as the network connection
+                self.topic_alias_maximum = 0
+                if self.v5 and properties is not None:
+                    self.topic_alias_maximum = getattr(properties, "TopicAliasMaximum", 0)
+            if self.v5 and properties is not None:
+                broker_receive_max = getattr(properties, "ReceiveMaximum", None)
+                if broker_receive_max:
+                    client.max_inflight_messages_set(min(broker_receive_max, 65535))
+        self.connack.set()
+        if self.on_connect:
+            self.on_connect(self, userdata, flags, rc)
+        if rc == 0 and self.outbox is not None:
+            # paho reports the client connected before this callback runs; publish() keeps
+            # queueing until the backlog is sent, so nothing overtakes it or is left behind
+            with self.outbox_lock:
+                backlog = self.outbox.drain()
+                if backlog:
+                    log.info("Reconnected: sending %d queued messages (%s)", len(backlog), self.outbox.stats())
+                for topic, payload, qos, options in backlog:
+                    self._send(topic, payload, qos, **options)
+                self.backlog_sent = True
+
+    def _handle_message(self, client, userdata, msg):
+        if self.on_message:
+            self.on_message(self, userdata, msg)
+
+    def _handle_disconnect(self, client, userdata, rc, properties=None):
+        # paho reports the next connection as connected before _handle_connect runs, so
+        # aliases of this one must be gone by then (an unknown alias is a protocol error)
+        with self.alias_lock:
+            self.aliases = {}
+            self.topic_alias_maximum = 0
+        with self.outbox_lock:
+            self.backlog_sent = False
+        if self.on_disconnect:
+            self.on_disconnect(self, userdata, rc)
+
+    # ---------------- Connection ----------------
+    def connect(self, host, port, keepalive=60, timeout=10):
+        """Connect, waiting for CONNACK so a v3-only broker can be detected; then start the network loop"""
+        self.connack.clear()
+        if self.v5:
+            self.client.connect(host, port, keepalive, clean_start=not self.persistent,
+                                properties=self._connect_properties())
+        else:
+            self.client.connect(host, port, keepalive)
+        deadline = time.monotonic() + timeout
+        while not self.connack.is_set() and time.monotonic() < deadline:
+            self.client.loop(timeout=0.1)
+
+        if self.v5 and self.connack_rc == CONNACK_UNSUPPORTED_PROTOCOL:
+            log.warning("Broker does not support MQTT v5, falling back to MQTT 3.1.1")
+            self.client.disconnect()
+            self.client = self._make_client(False)
+            return self.connect(host, port, keepalive, timeout)
+
+        self.client.loop_start()
+
+    def loop_stop(self):
+        self.client.loop_stop()
+
+    def disconnect(self):
+        self.client.disconnect()
+
+    def is_connected(self):
+        return self.client.is_connected()
+
+    def subscribe(self, topic, qos=None):
+        return self.client.subscribe(topic, qos=qos_for(topic) if qos is None else qos)
+
+    def publish(self, topic, payload=None, qos=None, seq=None, ts=None, expiry=None):
+        """
+        Publish with the policy QoS; seq / ts go out as v5 user properties when available.
+        expiry (seconds, v5 only) lets the broker discard the message if it can't be
+        delivered in time, e.g. while a persistent subscriber is offline.
+        """
+        qos = qos_for(topic) if qos is None else qos
+        if self.outbox is not None:
+            with self.outbox_lock:
+                if not (self.backlog_sent and self.client.is_connected()):
+                    self.outbox.put(topic, payload, qos, seq=seq, ts=ts, expiry=expiry)
+                    return None
+        return self._send(topic, payload, qos, seq, ts, expiry)
+
+    def _send(self, topic, payload, qos, seq=None, ts=None, expiry=None):
+        if not self.v5:
+            return self.client.publish(topic, payload, qos=qos)
+
+        properties = Properties(PacketTypes.PUBLISH)
+        if seq is not None:
+            properties.UserProperty = ("seq", str(seq))
+        if ts is not None:
+            properties.UserProperty = ("ts", str(ts))
+        if expiry is not None:
+            properties.MessageExpiryInterval = expiry
+        wire_topic = topic
+        # Aliases only for QoS 0: a queued QoS 1 message would be resent after a
+        # reconnect, where the broker no longer knows the alias
+        if self.topic_alias_maximum and qos == 0:
+            with self.alias_lock:
+                alias = self.aliases.get(topic)
+                if alias is None and len(self.aliases) < self.topic_alias_maximum:
+                    # The message registering the alias is queued in paho before any other
+                    # thread can see the alias, so an alias-only message never overtakes it
+                    alias = len(self.aliases) + 1
+                    properties.TopicAlias = alias
+                    info = self.client.publish(topic, payload, qos=qos, properties=properties)
+                    self.aliases[topic] = alias
+                    return info
+            if alias is not None:
+                wire_topic = ""
+                properties.TopicAlias = alias
+        return self.client.publish(wire_topic, payload, qos=qos, properties=properties)
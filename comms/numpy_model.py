@@ -0,0 +1,275 @@
+import argparse
+import time
+
+import numpy as np
+
+from imu_features import (DEFAULT_WINDOW_SIZE, DEFAULT_FFT_BANDS, NUM_IMUS, NUM_CHANNELS,
+                          extract_features, feature_names)
+from inference_engine import BACKENDS, InferenceBackend
+
+
+# Weight file layout (.npz, float32):
+#   MLP: W0, b0, W1, b1, ...        dense layers, W_i shape (in, out), ReLU between, softmax at the end
+#        input = "features" (imu_features vector, default) or "raw" (flattened W x 30 window)
+#   CNN: conv0_w, conv0_b, ...      1D convolutions over time, conv_w shape (out_ch, in_ch, kernel),
+#                                   stride 1, valid padding, ReLU, then global average pooling
+#        fc0_w, fc0_b, ...          dense head as in the MLP
+#   Optional for both: mean, std    input normalization (per feature / per channel)
+
+
+def _softmax_top1(logits):
+    """Return (argmax, max probability) per row without materialising the full softmax"""
+    top = logits.argmax(axis=1)
+    shifted = logits - logits[np.arange(len(logits)), top][:, np.newaxis]
+    confidence = 1.0 / np.exp(shifted).sum(axis=1)
+    return top, confidence
+
+
+class _DenseStack:
+    """Dense layers with buffers preallocated for max_batch rows"""
+
+    def __init__(self, weights, biases, max_batch):
+        self.weights = weights
+        self.biases = biases
+        self.buffers = [np.empty((max_batch, w.shape[1]), dtype=np.float32) for w in weights]
+
+    def forward(self, x):
+        rows = len(x)
+        last = len(self.weights) - 1
+        for i, (w, b, buf) in enumerate(zip(self.weights, self.biases, self.buffers)):
+            out = buf[:rows]
+            np.matmul(x, w, out=out)
+            out += b
+            if i != last:
+                np.maximum(out, 0.0, out=out)
+            x = out
+        return x
+
+
+def _load_npz(model_path):
+    with np.load(model_path) as data:
+        return {k: (data[k].astype(np.float32) if data[k].dtype.kind == "f" else data[k]) for k in data.files}
+
+
+def _numbered(params, weight_key, bias_key):
+    """Collect layers named e.g. W0/b0, W1/b1 ... until the first missing index"""
+    weights, biases = [], []
+    i = 0
+    while weight_key.format(i) in params:
+        weights.append(np.ascontiguousarray(params[weight_key.format(i)]))
+        biases.append(params[bias_key.format(i)].reshape(-1))
+        i += 1
+    return weights, biases
+
+
+class NumpyMLPBackend(InferenceBackend):
+    """Reference CPU backend: MLP over imu_features vectors (or raw windows)"""
+    name = "numpy_mlp"
+
+    def __init__(self, model_path="model.npz", max_batch=32, fft_bands=DEFAULT_FFT_BANDS):
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.fft_bands = fft_bands
+        self.use_features = True
+        self.mean = None
+        self.inv_std = None
+        self.dense = None
+        self.input_buffer = None
+
+    def load(self):
+        params = _load_npz(self.model_path)
+        self.use_features = str(params.get("input", "features")) == "features"
+        weights, biases = _numbered(params, "W{}", "b{}")
+        if not weights:
+            weights, biases = _numbered(params, "fc{}_w", "fc{}_b")
+        if not weights:
+            raise ValueError(f"{self.model_path}: no dense layers (W0/b0 ...) found")
+        if "mean" in params:
+            self.mean = params["mean"].reshape(-1)
+            self.inv_std = 1.0 / np.maximum(params["std"].reshape(-1), 1e-6)
+        self.dense = _DenseStack(weights, biases, self.max_batch)
+        self.input_buffer = np.empty((self.max_batch, weights[0].shape[0]), dtype=np.float32)
+
+    def _prepare(self, windows):
+        x = extract_features(windows, self.fft_bands) if self.use_features \
+            else windows.reshape(len(windows), -1)
+        if x.shape[1] != self.input_buffer.shape[1]:
+            raise ValueError(f"Model expects {self.input_buffer.shape[1]} inputs, got {x.shape[1]}")
+        out = self.input_buffer[:len(x)]
+        if self.mean is not None:
+            np.subtract(x, self.mean, out=out)
+            out *= self.inv_std
+        else:
+            out[...] = x
+        return out
+
+    def predict_batch(self, windows):
+        classes = np.empty(len(windows), dtype=np.int64)
+        confidences = np.empty(len(windows), dtype=np.float32)
+        for start in range(0, len(windows), self.max_batch):
+            chunk = windows[start:start + self.max_batch]
+            logits = self.dense.forward(self._prepare(chunk))
+            classes[start:start + len(chunk)], confidences[start:start + len(chunk)] = _softmax_top1(logits)
+        return classes, confidences
+
+
+class NumpyCNNBackend(InferenceBackend):
+    """Reference CPU backend: 1D-CNN over the raw (W, 30) window, im2col + matmul per layer"""
+    name = "numpy_cnn"
+
+    def __init__(self, model_path="model_cnn.npz", max_batch=32, window_size=DEFAULT_WINDOW_SIZE):
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.window_size = window_size
+        self.mean = None
+        self.inv_std = None
+        self.convs = []     # (kernel, weight matrix (in_ch*kernel, out_ch), bias, cols buffer, out buffer)
+        self.dense = None
+        self.input_buffer = None
+        self.pooled = None
+
+    def load(self):
+        params = _load_npz(self.model_path)
+        channels = NUM_IMUS * NUM_CHANNELS
+        length = self.window_size
+        self.input_buffer = np.empty((self.max_batch, length, channels), dtype=np.float32)
+        if "mean" in params:
+            self.mean = params["mean"].reshape(-1)
+            self.inv_std = 1.0 / np.maximum(params["std"].reshape(-1), 1e-6)
+
+        self.convs = []
+        i = 0
+        while f"conv{i}_w" in params:
+            w = params[f"conv{i}_w"]            # (out_ch, in_ch, kernel)
+            out_ch, in_ch, kernel = w.shape
+            if in_ch != channels:
+                raise ValueError(f"conv{i}: expected {channels} input channels, got {in_ch}")
+            length = length - kernel + 1
+            if length < 1:
+                raise ValueError(f"conv{i}: window too short for kernel {kernel}")
+            matrix = np.ascontiguousarray(w.transpose(1, 2, 0).reshape(in_ch * kernel, out_ch))
+            cols = np.empty((self.max_batch, length, in_ch, kernel), dtype=np.float32)
+            out = np.empty((self.max_batch, length, out_ch), dtype=np.float32)
+            self.convs.append((kernel, matrix, params[f"conv{i}_b"].reshape(-1), cols, out))
+            channels = out_ch
+            i += 1
+        if not self.convs:
+            raise ValueError(f"{self.model_path}: no conv layers (conv0_w ...) found")
+
+        weights, biases = _numbered(params, "fc{}_w", "fc{}_b")
+        self.dense = _DenseStack(weights, biases, self.max_batch)
+        self.pooled = np.empty((self.max_batch, channels), dtype=np.float32)
+
+    def _forward(self, windows):
+        rows = len(windows)
+        x = self.input_buffer[:rows]
+        x[...] = windows.reshape(rows, windows.shape[1], -1)
+        if self.mean is not None:
+            x -= self.mean
+            x *= self.inv_std
+        for kernel, matrix, bias, cols, out in self.convs:
+            c = cols[:rows]
+            np.copyto(c, np.lib.stride_tricks.sliding_window_view(x, kernel, axis=1))
+            y = out[:rows]
+            np.matmul(c.reshape(rows, c.shape[1], -1), matrix, out=y)
+            y += bias
+            np.maximum(y, 0.0, out=y)
+            x = y
+        pooled = self.pooled[:rows]
+        np.mean(x, axis=1, out=pooled)
+        return self.dense.forward(pooled)
+
+    def predict_batch(self, windows):
+        if windows.shape[1] != self.window_size:
+            raise ValueError(f"Model expects {self.window_size}-frame windows, got {windows.shape[1]}")
+        classes = np.empty(len(windows), dtype=np.int64)
+        confidences = np.empty(len(windows), dtype=np.float32)
+        for start in range(0, len(windows), self.max_batch):
+            chunk = windows[start:start + self.max_batch]
+            classes[start:start + len(chunk)], confidences[start:start + len(chunk)] = \
+                _softmax_top1(self._forward(chunk))
+        return classes, confidences
+
+
+BACKENDS[NumpyMLPBackend.name] = NumpyMLPBackend
+BACKENDS[NumpyCNNBackend.name] = NumpyCNNBackend
+
+
+# ---------------- Weight files ----------------
+def init_mlp(model_path, hidden=(64, 32), num_classes=4, fft_bands=DEFAULT_FFT_BANDS, seed=0):
+    """Write an untrained MLP weight file (He init) - useful for benchmarks before training"""
+    rng = np.random.default_rng(seed)
+    sizes = [len(feature_names(fft_bands))] + list(hidden) + [num_classes]
+    params = {"input": np.array("features")}
+    for i, (n_in, n_out) in enumerate(zip(sizes[:-1], sizes[1:])):
+        params[f"W{i}"] = (rng.standard_normal((n_in, n_out)) * np.sqrt(2.0 / n_in)).astype(np.float32)
+        params[f"b{i}"] = np.zeros(n_out, dtype=np.float32)
+    np.savez(model_path, **params)
+
+
+def init_cnn(model_path, conv_channels=(32, 32), kernel=5, hidden=(32,), num_classes=4, seed=0):
+    """Write an untrained 1D-CNN weight file (He init)"""
+    rng = np.random.default_rng(seed)
+    params = {}
+    in_ch = NUM_IMUS * NUM_CHANNELS
+    for i, out_ch in enumerate(conv_channels):
+        params[f"conv{i}_w"] = (rng.standard_normal((out_ch, in_ch, kernel))
+                                * np.sqrt(2.0 / (in_ch * kernel))).astype(np.float32)
+        params[f"conv{i}_b"] = np.zeros(out_ch, dtype=np.float32)
+        in_ch = out_ch
+    sizes = [in_ch] + list(hidden) + [num_classes]
+    for i, (n_in, n_out) in enumerate(zip(sizes[:-1], sizes[1:])):
+        params[f"fc{i}_w"] = (rng.standard_normal((n_in, n_out)) * np.sqrt(2.0 / n_in)).astype(np.float32)
+        params[f"fc{i}_b"] = np.zeros(n_out, dtype=np.float32)
+    np.savez(model_path, **params)
+
+
+# ---------------- Benchmark ----------------
+def benchmark(backend, batch_sizes=(1, 8, 32), seconds=2.0, window_size=DEFAULT_WINDOW_SIZE):
+    """Inferences/sec and per-call latency percentiles for each batch size"""
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in batch_sizes:
+        windows = rng.standard_normal((batch_size, window_size, NUM_IMUS, NUM_CHANNELS)).astype(np.float32)
+        backend.predict_batch(windows)  # warm-up
+        latencies = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            t0 = time.perf_counter()
+            backend.predict_batch(windows)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - start
+        lat = np.array(latencies)
+        results.append({
+            "batch": batch_size,
+            "inferences_per_sec": len(lat) * batch_size / elapsed,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p99_ms": float(np.percentile(lat, 99)),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NumPy reference inference backends")
+    parser.add_argument("model", help=".npz weight file")
+    parser.add_argument("--kind", choices=["mlp", "cnn"], default="mlp")
+    parser.add_argument("--init", action="store_true", help="write untrained weights to MODEL first")
+    parser.add_argument("--batches", default="1,8,32", help="comma-separated batch sizes")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.init:
+        (init_mlp if args.kind == "mlp" else init_cnn)(args.model)
+        print(f"Wrote untrained {args.kind.upper()} weights to {args.model}")
+
+    batch_sizes = [int(b) for b in args.batches.split(",")]
+    cls = NumpyMLPBackend if args.kind == "mlp" else NumpyCNNBackend
+    backend = cls(args.model, max_batch=max(batch_sizes))
+    backend.load()
+
+    print("=" * 60)
+    print(f"NumPy {args.kind.upper()} benchmark: {args.model}")
+    print("=" * 60)
+    for r in benchmark(backend, batch_sizes, args.seconds):
+        print(f"batch {r['batch']:>3}: {r['inferences_per_sec']:10.0f} inferences/sec   "
+              f"p50 {r['p50_ms']:.3f} ms   p99 {r['p99_ms']:.3f} ms")
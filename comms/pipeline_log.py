@@ -0,0 +1,235 @@
+import argparse
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# Logging for the pipeline processes. Callers only put records on a bounded queue;
+# a listener thread formats them and does the console / file I/O, so a slow Windows
+# console or SSH session never stalls the hot path (a full queue drops the record and
+# counts it). Every call site (logger + message template) is rate limited by a token
+# bucket before the record is even built, and the next message that gets through
+# says how many were suppressed. Use %-style arguments, not f-strings, so the
+# template identifies the call site and formatting only happens in the listener.
+# Per-frame messages are DEBUG, so they cost a level check unless enabled.
+# Modules only call get_logger(); the entry points (component __main__ blocks,
+# bench_pipeline's child processes) call setup_logging() to install the queue, so a
+# script that imports a helper module keeps its own logging configuration.
+# Environment: PIPELINE_LOG_LEVEL=DEBUG|INFO|..., PIPELINE_LOG_FORMAT=text|json,
+# PIPELINE_LOG_FILE=<path>.
+# The listener thread does not survive fork() (ultra96_ai.py --workers N): a forked
+# child gets its own queue and listener, see _restart_after_fork.
+LOG_LEVEL = os.environ.get("PIPELINE_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("PIPELINE_LOG_FORMAT", "text")
+LOG_FILE = os.environ.get("PIPELINE_LOG_FILE") or None
+QUEUE_SIZE = 10000
+RATE_PER_S = 5.0     # sustained messages per second per call site
+BURST = 20
+
+_listener = None
+_queue_handler = None
+_settings = None
+
+
+class RateLimiter:
+    """Token bucket per (logger, message template); overrides = {template: (rate_per_s, burst)}"""
+
+    def __init__(self, rate_per_s=RATE_PER_S, burst=BURST, overrides=None):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.overrides = overrides or {}
+        self.buckets = {}       # key -> [tokens, last refill, suppressed, rate, burst]
+        self.lock = threading.Lock()
+        self.suppressed = 0
+
+    def allow(self, name, template):
+        """(allowed, messages suppressed since the last allowed one)"""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get((name, template))
+            if bucket is None:
+                rate, burst = self.overrides.get(template, (self.rate_per_s, self.burst))
+                bucket = self.buckets[(name, template)] = [burst, now, 0, rate, burst]
+            bucket[0] = min(bucket[4], bucket[0] + (now - bucket[1]) * bucket[3])
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed += 1
+                return False, 0
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        return True, suppressed
+
+
+class PipelineLogger(logging.LoggerAdapter):
+    """Applies the rate limit before a LogRecord is built, so a suppressed call costs ~1 us"""
+    limiter = RateLimiter()
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def debug(self, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.DEBUG):     # per-frame messages: just the level check
+            self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        limiter = PipelineLogger.limiter
+        if limiter is not None:
+            allowed, suppressed = limiter.allow(self.logger.name, msg)
+            if not allowed:
+                return
+            if suppressed:
+                kwargs["extra"] = dict(kwargs.get("extra") or {}, suppressed=suppressed)
+        self.logger.log(level, msg, *args, **kwargs)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks: a full queue drops the record. Formatting is left to the listener thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record   # same process: no need to pre-format for pickling
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # may wait for the listener to drain a full queue
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-5s %(name)s: %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} [+{suppressed} suppressed]" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg (+ suppressed, exc)"""
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 6), "level": record.levelname, "logger": record.name,
+                 "msg": record.getMessage()}
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, log_file=None, fmt=None, stream=None):
+    """Route the root logger through the queue (idempotent); returns the queue handler"""
+    global _settings
+    if _queue_handler is not None:
+        return _queue_handler
+    _settings = (level, log_file, fmt, stream)
+    _start(*_settings)
+    atexit.register(shutdown)
+    return _queue_handler
+
+
+def _start(level, log_file, fmt, stream):
+    global _listener, _queue_handler
+    formatter = JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter()
+    handlers = [logging.StreamHandler(stream or sys.stdout)]
+    if log_file or LOG_FILE:
+        handlers.append(logging.FileHandler(log_file or LOG_FILE, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # No process / thread lookups per record (not in the format anyway)
+    logging.logProcesses = logging.logThreads = logging.logMultiprocessing = False
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(level or LOG_LEVEL)
+    _listener = _Listener(log_queue, *handlers)
+    _listener.start()
+
+
+def _restart_after_fork():
+    """
+    A forked child inherits _queue_handler but not the listener thread, so its records
+    would pile up in a queue nobody drains: start a fresh queue and listener.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is None:
+        return
+    _listener = _queue_handler = None
+    _start(*_settings)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def get_logger(name):
+    """Rate-limited logger; records reach the queue once the entry point called setup_logging()"""
+    return PipelineLogger(logging.getLogger(name))
+
+
+def shutdown():
+    """Flush queued records and stop the listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats():
+    if _queue_handler is None:
+        return {}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "suppressed": PipelineLogger.limiter.suppressed,
+    }
+
+
+# ---------------- Benchmark ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-path cost of print vs queued, rate-limited logging")
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    frame = bytes(range(120))
+
+    def per_call_us(fn):
+        start = time.perf_counter()
+        for i in range(args.count):
+            fn(i)
+        return (time.perf_counter() - start) / args.count * 1e6
+
+    results = {"print": per_call_us(lambda i: print(f"Published {len(frame)} binary bytes to robot/sensor ({i})"))}
+    setup_logging()
+    log = get_logger("bench")
+    results["logger.debug (disabled)"] = per_call_us(lambda i: log.debug("Published %d binary bytes (%d)", len(frame), i))
+    results["logger.info (rate limited)"] = per_call_us(lambda i: log.info("Published %d binary bytes (%d)", len(frame), i))
+    limiter, PipelineLogger.limiter = PipelineLogger.limiter, None
+    results["logger.info (queued)"] = per_call_us(lambda i: log.info("Queued %d binary bytes (%d)", len(frame), i))
+    PipelineLogger.limiter = limiter
+    shutdown()
+    print("=" * 60, file=sys.stderr)
+    for name, us in results.items():
+        print(f"{name:<28} {us:8.3f} us per call", file=sys.stderr)
+    print(f"logging stats: {stats()}", file=sys.stderr)
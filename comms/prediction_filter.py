@@ -0,0 +1,162 @@
+import argparse
+import time
+from collections import Counter, deque
+
+from gesture_segmenter import GestureSegmenter
+from imu_features import DEFAULT_WINDOW_SIZE, FrameWindow, load_csv_frames, sliding_windows
+
+# Smoother settings of the Ultra96 (ultra96_ai.source_state), shared with the replay below.
+# With segmentation each prediction is a whole gesture, so no vote; otherwise majority of
+# the last 5 windows, and a class held across many windows is sent once.
+SEGMENTED_SMOOTHING = {"vote_size": 1, "min_votes": 1, "min_confidence": 0.0, "cooldown_s": 1.0,
+                       "suppress_repeats": False}
+WINDOWED_SMOOTHING = {"vote_size": 5, "min_votes": 3, "min_confidence": 0.0, "cooldown_s": 1.0,
+                      "suppress_repeats": True, "repeat_timeout_s": 3.0}
+
+
+def smoothing_config(segmented):
+    return dict(SEGMENTED_SMOOTHING if segmented else WINDOWED_SMOOTHING)
+
+
+class PredictionSmoother:
+    """
+    Post-inference debounce before a movement class reaches the robot.
+    A prediction is forwarded only if
+      - its confidence is at least min_confidence,
+      - it wins a majority vote over the last vote_size confident predictions
+        (at least min_votes of them),
+      - it is not the class that was just sent (suppress_repeats) less than
+        repeat_timeout_s ago (None = until another class is sent), and
+      - its cooldown (class_cooldowns[class] or cooldown_s) has expired.
+    update() returns the class to actuate, or None if it was suppressed.
+    """
+
+    def __init__(self, vote_size=3, min_votes=2, min_confidence=0.0, cooldown_s=1.0,
+                 class_cooldowns=None, suppress_repeats=True, repeat_timeout_s=3.0):
+        self.vote_size = vote_size
+        self.min_votes = min(min_votes, vote_size)
+        self.min_confidence = min_confidence
+        self.cooldown_s = cooldown_s
+        self.class_cooldowns = class_cooldowns or {}
+        self.suppress_repeats = suppress_repeats
+        self.repeat_timeout_s = repeat_timeout_s
+
+        self.history = deque(maxlen=vote_size)
+        self.last_class = None
+        self.last_sent = {}     # class -> time it was last forwarded
+
+        # Stats
+        self.received = 0
+        self.forwarded = 0
+        self.suppressed = Counter()
+
+    def update(self, movement_class, confidence=1.0, now=None):
+        now = time.monotonic() if now is None else now
+        self.received += 1
+
+        if confidence < self.min_confidence:
+            self.suppressed["low_confidence"] += 1
+            return None
+
+        self.history.append(movement_class)
+        winner, votes = Counter(self.history).most_common(1)[0]
+        if votes < self.min_votes:
+            self.suppressed["no_majority"] += 1
+            return None
+
+        if self.suppress_repeats and winner == self.last_class and (
+                self.repeat_timeout_s is None or now - self.last_sent[winner] < self.repeat_timeout_s):
+            self.suppressed["unchanged"] += 1
+            return None
+
+        cooldown = self.class_cooldowns.get(winner, self.cooldown_s)
+        if now - self.last_sent.get(winner, float("-inf")) < cooldown:
+            self.suppressed["cooldown"] += 1
+            return None
+
+        self.last_class = winner
+        self.last_sent[winner] = now
+        self.forwarded += 1
+        return winner
+
+    def reset(self):
+        self.history.clear()
+        self.last_class = None
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "forwarded": self.forwarded,
+            "suppressed": dict(self.suppressed),
+        }
+
+
+# ---------------- Recorded session replay ----------------
+def replay_session(csv_file, engine, smoother, frame_rate=50.0, window_size=DEFAULT_WINDOW_SIZE, segment=False):
+    """
+    Classify a recorded imu_data.csv the way the Ultra96 would (one window per
+    frame, or one per gesture with segment=True) and feed the predictions
+    through the smoother using the recording's frame clock.
+    Returns (raw predictions, forwarded predictions).
+    """
+    frames = load_csv_frames(csv_file)
+    if segment:
+        ring = FrameWindow(window_size)
+        segmenter = GestureSegmenter(ring)
+        windows, times = [], []
+        for i, frame in enumerate(frames):
+            ring.push(frame)
+            gesture = segmenter.update()
+            if gesture is not None:
+                windows.append(gesture)
+                times.append((i + 1) / frame_rate)
+    else:
+        windows = sliding_windows(frames, window_size)
+        times = [(i + window_size) / frame_rate for i in range(len(windows))]
+
+    raw = forwarded = 0
+    for start in range(0, len(windows), 32):
+        for t, (movement_class, confidence) in zip(times[start:start + 32],
+                                                   engine.predict_batch(windows[start:start + 32])):
+            raw += 1
+            if smoother.update(movement_class, confidence, now=t) is not None:
+                forwarded += 1
+    return raw, forwarded
+
+
+if __name__ == "__main__":
+    from inference_engine import InferenceEngine, create_backend
+
+    parser = argparse.ArgumentParser(description="Count actuator messages saved by prediction smoothing")
+    parser.add_argument("csv", help="recorded imu_data.csv session")
+    parser.add_argument("--backend", default="numpy_mlp")
+    parser.add_argument("--model", default="model.npz")
+    parser.add_argument("--rate", type=float, default=50.0, help="frame rate of the recording (Hz)")
+    parser.add_argument("--segment", action="store_true", help="classify per gesture instead of per frame")
+    # Smoother defaults are the Ultra96's for the chosen mode (smoothing_config)
+    parser.add_argument("--vote", type=int)
+    parser.add_argument("--min-votes", type=int)
+    parser.add_argument("--min-confidence", type=float)
+    parser.add_argument("--cooldown", type=float)
+    parser.add_argument("--repeat-timeout", type=float, help="seconds a repeated class stays suppressed")
+    args = parser.parse_args()
+
+    options = {} if args.backend in ("random", "module") else {"model_path": args.model}
+    engine = InferenceEngine(create_backend(args.backend, **options))
+    engine.load()
+    config = smoothing_config(args.segment)
+    for key, value in (("vote_size", args.vote), ("min_votes", args.min_votes),
+                       ("min_confidence", args.min_confidence), ("cooldown_s", args.cooldown),
+                       ("repeat_timeout_s", args.repeat_timeout)):
+        if value is not None:
+            config[key] = value
+    smoother = PredictionSmoother(**config)
+    print(f"Smoother: {config}")
+    raw, forwarded = replay_session(args.csv, engine, smoother, args.rate, segment=args.segment)
+
+    # Every forwarded class costs one FireBeetle and one Unity message in tcp_unity.py
+    print(f"Predictions: {raw}")
+    print(f"Forwarded:   {forwarded}")
+    print(f"Suppressed:  {smoother.stats()['suppressed']}")
+    print(f"Actuator messages: {2 * forwarded} instead of {2 * raw} "
+          f"(saved {2 * (raw - forwarded)}{f', {100.0 * (raw - forwarded) / raw:.1f}%' if raw else ''})")
@@ -0,0 +1,256 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from pipeline_log import get_logger, setup_logging
+
+# Sampling profiler for the pipeline processes (--profile on the publisher, the
+# Ultra96 subscriber and the bridge). A background thread grabs the Python stack of
+# every thread (sys._current_frames) every interval; the work is spread over the
+# TCP client, paho network, inference and direct link threads, which cProfile
+# (calling thread only) would miss. Where the OS has per-thread CPU clocks (Linux:
+# the Ultra96, WSL) only threads that used CPU since the last sample are counted,
+# so threads blocked in recv / accept / queue.get don't swamp the profile; elsewhere
+# (Windows) every thread is sampled (wall clock).
+#
+# The sampler needs the GIL to read the stacks, so under load it ticks less often than
+# every interval, and a thread that releases the GIL in C code (numpy, socket and file
+# I/O) tends to be caught right there: compare regions within one run, not absolute
+# percentages across C-heavy and pure Python code.
+#
+# Output is the folded-stack format read by flamegraph.pl, speedscope and inferno:
+#   <thread>;<outer frame>;...;<leaf frame> <samples>
+# Frames of the hot-path functions in REGIONS are tagged "[region] ", and the
+# summary logged at the end gives the share of samples per region.
+INTERVAL_S = 0.005
+REGIONS = {
+    "decrypt_data": "decrypt",
+    "parse_imu_data": "parse",
+    "unpack_frames": "decode",
+    "unpack_frames_traced": "decode",
+    "unpack_result": "decode",
+    "process_binary_sensor_data": "decode",
+    "frame_from_bytes": "decode",
+    "calculate_crc16": "crc",
+    "write_to_csv": "csv_write",
+    "predict_batch": "inference",
+    "publish_frames": "publish",
+    "publish_result": "publish",
+    "send_to_firebeetle": "actuate",
+    "send_to_unity": "actuate",
+}
+
+log = get_logger("profiling")
+
+
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Stack sampler for all threads of this process; stacks are kept as tuples of code objects"""
+
+    def __init__(self, interval_s=INTERVAL_S, cpu_only=True, regions=None):
+        self.interval_s = interval_s
+        self.cpu_only = cpu_only and hasattr(time, "pthread_getcpuclockid")
+        self.regions = REGIONS if regions is None else regions
+        self.stacks = Counter()         # (thread name, (code, ...)) -> samples
+        self.cpu_times = {}             # thread id -> CPU seconds at the last sample
+        self.running = False
+        self.thread = None
+        self.started = None
+        self.elapsed_s = 0.0
+
+        # Stats
+        self.ticks = 0
+        self.samples = 0
+
+    def start(self):
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.thread.join()
+            self.elapsed_s = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while self.running:
+            time.sleep(self.interval_s)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.ticks += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.cpu_only and not self._used_cpu(ident)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+                self.samples += 1
+
+    def _used_cpu(self, ident):
+        try:
+            cpu_s = time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except (OSError, ValueError):
+            return True     # thread just exited / no CPU clock: count it
+        previous = self.cpu_times.get(ident)
+        self.cpu_times[ident] = cpu_s
+        return previous is not None and cpu_s > previous
+
+    def _label(self, code):
+        region = self.regions.get(code.co_name)
+        return f"[{region}] {frame_name(code)}" if region else frame_name(code)
+
+    def folded(self):
+        """Folded stacks, one "thread;frame;...;frame count" line each"""
+        lines = []
+        for (thread, stack), count in self.stacks.most_common():
+            frames = [thread.replace(";", ":")] + [self._label(code) for code in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_folded(self, path):
+        with open(path, "w") as file:
+            file.write(self.folded())
+
+    def region_samples(self):
+        """Samples per region (innermost tagged frame of each stack; "other" if none)"""
+        per_region = Counter()
+        for (_, stack), count in self.stacks.items():
+            region = "other"
+            for code in reversed(stack):
+                if code.co_name in self.regions:
+                    region = self.regions[code.co_name]
+                    break
+            per_region[region] += count
+        return per_region
+
+    def summary(self, top=10):
+        """Region shares and the functions with the most self samples"""
+        total = sum(self.stacks.values()) or 1
+        mode = "CPU" if self.cpu_only else "wall"
+        lines = [f"{self.samples} {mode} samples of {self.ticks} ticks over {self.elapsed_s:.1f} s "
+                 f"(every {self.interval_s * 1000:g} ms)"]
+        for region, count in self.region_samples().most_common():
+            lines.append(f"  {region:<12} {100.0 * count / total:5.1f}%")
+        leaves = Counter()
+        for (_, stack), count in self.stacks.items():
+            if stack:
+                leaves[stack[-1]] += count
+        lines.append("Top self samples:")
+        for code, count in leaves.most_common(top):
+            lines.append(f"  {100.0 * count / total:5.1f}%  {self._label(code)}")
+        return "\n".join(lines)
+
+
+class ProfileRun:
+    """
+    Profile the running component for duration_s, write the folded stacks to path, log
+    the summary and stop the component with a KeyboardInterrupt in the main thread (its
+    normal Ctrl+C shutdown). finish() after the component returns covers an earlier Ctrl+C.
+    """
+
+    def __init__(self, duration_s, path, interval_s=INTERVAL_S):
+        self.duration_s = duration_s
+        self.path = path
+        self.profiler = SamplingProfiler(interval_s)
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.written = False
+
+    def start(self):
+        self.profiler.start()
+        threading.Thread(target=self._run, name="profile-timer", daemon=True).start()
+        log.info("Profiling for %g s (%s samples) -> %s", self.duration_s,
+                 "CPU" if self.profiler.cpu_only else "wall clock", self.path)
+        return self
+
+    def _run(self):
+        if self.done.wait(self.duration_s):
+            return
+        self.finish()
+        if hasattr(signal, "pthread_kill"):
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)   # also wakes accept()
+        else:
+            import _thread
+            _thread.interrupt_main()
+
+    def finish(self):
+        with self.lock:
+            if self.written:
+                return
+            self.written = True
+        self.done.set()
+        self.profiler.stop()
+        self.profiler.write_folded(self.path)
+        log.info("Profile written to %s\n%s", self.path, self.profiler.summary())
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="run under the sampling profiler for SECONDS, write folded stacks and exit")
+    parser.add_argument("--profile-out", help="folded-stack output file for flamegraph.pl / speedscope "
+                                              "({worker} = Ultra96 worker index)")
+    parser.add_argument("--profile-interval-ms", type=float, default=INTERVAL_S * 1000)
+
+
+def profile_from_args(args, default_path, **fields):
+    """Started ProfileRun if --profile was given, else None; fields fill {placeholders} in the path"""
+    if not args.profile:
+        return None
+    path = (args.profile_out or default_path).format(**fields)
+    return ProfileRun(args.profile, path, args.profile_interval_ms / 1000.0).start()
+
+
+# ---------------- Demo ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a synthetic decode / CSV / inference workload")
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--out", default="profile_demo.folded")
+    parser.add_argument("--interval-ms", type=float, default=INTERVAL_S * 1000)
+    args = parser.parse_args()
+    setup_logging()
+
+    import io
+    import struct
+
+    frame = struct.pack("!30f", *range(30))
+    stopping = threading.Event()
+
+    def unpack_frames(payload):
+        return [struct.unpack("!30f", payload[i:i + 120]) for i in range(0, len(payload), 120)]
+
+    def write_to_csv(rows, file):
+        for row in rows:
+            file.write(",".join(f"{value:.3f}" for value in row) + "\n")
+
+    def predict_batch(windows):
+        return [max(range(4), key=lambda c: sum(row[c] for row in window)) for window in windows]
+
+    def worker():
+        while not stopping.is_set():
+            rows = unpack_frames(frame * 10)
+            write_to_csv(rows, io.StringIO())
+            predict_batch([rows] * 4)
+
+    def idle():
+        stopping.wait()     # blocked: only shows up in wall clock mode
+
+    for target in (worker, idle):
+        threading.Thread(target=target, name=target.__name__, daemon=True).start()
+    run = ProfileRun(args.seconds, args.out, args.interval_ms / 1000.0)
+    run.profiler.start()
+    time.sleep(args.seconds)
+    stopping.set()
+    run.finish()
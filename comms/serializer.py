@@ -0,0 +1,204 @@
+import argparse
+import json
+from json.encoder import encode_basestring
+import os
+import random
+import struct
+import time
+from datetime import datetime
+
+# JSON for the remaining JSON topics (legacy processors, relays, simulators).
+# Uses orjson or ujson when installed, else the stdlib. dumps() returns str or
+# bytes depending on the backend; paho publishes either. Pretty-printing only
+# happens with SERIALIZER_DEBUG=1 (or set_debug(True)).
+# Force a backend with SERIALIZER_BACKEND=orjson|ujson|json.
+
+BACKEND_ORDER = ("orjson", "ujson", "json")
+DEBUG = os.environ.get("SERIALIZER_DEBUG", "") not in ("", "0")
+
+
+def _load_backend(name):
+    """Return (dumps, loads) for a backend, or None if it isn't installed"""
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return None
+        return orjson.dumps, orjson.loads
+    if name == "ujson":
+        try:
+            import ujson
+        except ImportError:
+            return None
+        return (lambda obj: ujson.dumps(obj, ensure_ascii=False)), ujson.loads
+    if name == "json":
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        return encoder.encode, json.loads
+    raise ValueError(f"Unknown serializer backend: {name}")
+
+
+def available_backends():
+    return [name for name in BACKEND_ORDER if _load_backend(name)]
+
+
+BACKEND = None
+_dumps = _loads = None
+
+
+def select_backend(name=None):
+    """Use the named backend, or the fastest installed one"""
+    global BACKEND, _dumps, _loads
+    for candidate in (name,) if name else BACKEND_ORDER:
+        functions = _load_backend(candidate)
+        if functions:
+            BACKEND = candidate
+            _dumps, _loads = functions
+            return BACKEND
+    raise ImportError(f"Serializer backend '{name}' is not installed")
+
+
+select_backend(os.environ.get("SERIALIZER_BACKEND") or None)
+
+
+def set_debug(enabled):
+    global DEBUG
+    DEBUG = enabled
+
+
+def dumps(obj):
+    """Compact JSON (str or bytes)"""
+    return _dumps(obj)
+
+
+def loads(data):
+    return _loads(data)
+
+
+def pretty(obj):
+    """JSON text for console output: indented in debug mode, compact otherwise"""
+    if DEBUG:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    text = _dumps(obj)
+    return text.decode("utf-8") if isinstance(text, bytes) else text
+
+
+# ---------------- Cached response skeleton ----------------
+# Binary-path success responses of Ultra96ProcessorMQTT always have the same keys,
+# robot_state layout and readings; only the values change. The document text is
+# kept as one format string and only the values are formatted into it, which is
+# about twice as fast as stdlib json.dumps. orjson / ujson are faster still, so the
+# skeleton is only used with the stdlib backend; anything that doesn't match the
+# shape falls back to dumps().
+RESPONSE_KEYS = (
+    "session_id", "sequence", "timestamp", "robot_state", "sensor_data", "processing_time_ms",
+    "processed_at", "status", "data_format", "source", "original_timestamp", "received_at", "csv_written",
+)
+_READING = ('{"sensor_id":%d,"acceleration":{"x":%r,"y":%r,"z":%r},'
+            '"gyroscope":{"x":%r,"y":%r,"z":%r}}')
+_RESPONSE = ('{"session_id":%d,"sequence":%d,"timestamp":%d,"robot_state":{"emotion":%s,"activity":%s,'
+             '"battery_level":%d,"sensor_count":%d},"sensor_data":[%s],"processing_time_ms":%r,'
+             '"processed_at":%s,"status":"success","data_format":"binary","source":%s,'
+             '"original_timestamp":%d,"received_at":%s,"csv_written":true}')
+
+
+def _skeleton(doc):
+    readings = ",".join([
+        _READING % (r["sensor_id"], a["x"], a["y"], a["z"], g["x"], g["y"], g["z"])
+        for r in doc["sensor_data"] for a, g in ((r["acceleration"], r["gyroscope"]),)
+    ])
+    state = doc["robot_state"]
+    return _RESPONSE % (
+        doc["session_id"], doc["sequence"], doc["timestamp"],
+        encode_basestring(state["emotion"]), encode_basestring(state["activity"]),
+        state["battery_level"], state["sensor_count"], readings, doc["processing_time_ms"],
+        encode_basestring(doc["processed_at"]), encode_basestring(doc["source"]),
+        doc["original_timestamp"], encode_basestring(doc["received_at"]),
+    )
+
+
+def dumps_response(doc, use_skeleton=None):
+    """dumps() for Ultra96ProcessorMQTT response documents"""
+    if use_skeleton is None:
+        use_skeleton = BACKEND == "json"
+    if (not use_skeleton or tuple(doc) != RESPONSE_KEYS or doc["status"] != "success"
+            or doc["data_format"] != "binary" or doc["csv_written"] is not True):
+        return dumps(doc)
+    try:
+        return _skeleton(doc)
+    except (KeyError, TypeError, ValueError):
+        return dumps(doc)
+
+
+# ---------------- Benchmark ----------------
+def sample_response():
+    """A success response as built by Ultra96ProcessorMQTT.process_binary_sensor_data + on_message"""
+    readings = []
+    for i in range(5):
+        values = struct.unpack("6h", struct.pack("6h", *(random.randint(-4000, 4000) for _ in range(6))))
+        readings.append({
+            "sensor_id": i,
+            "acceleration": {"x": values[0] / 1000.0, "y": values[1] / 1000.0, "z": values[2] / 1000.0},
+            "gyroscope": {"x": values[3] / 100.0, "y": values[4] / 100.0, "z": values[5] / 100.0},
+        })
+    timestamp = int(time.time() * 1000) & 0xFFFFFFFF
+    return {
+        "session_id": 1000,
+        "sequence": 42,
+        "timestamp": timestamp,
+        "robot_state": {"emotion": "curious", "activity": "moving", "battery_level": 87, "sensor_count": 5},
+        "sensor_data": readings,
+        "processing_time_ms": 0.412,
+        "processed_at": datetime.now().isoformat(),
+        "status": "success",
+        "data_format": "binary",
+        "source": "firebeetle",
+        "original_timestamp": timestamp,
+        "received_at": datetime.now().isoformat(),
+        "csv_written": True,
+    }
+
+
+def _time_per_call(fn, arg, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn(arg)
+    return 1e6 * (time.perf_counter() - start) / count
+
+
+def benchmark(count=20000):
+    doc = sample_response()
+    baseline = json.dumps(doc)
+    results = []
+    for name in available_backends():
+        select_backend(name)
+        encoded = dumps(doc)
+        assert loads(encoded) == json.loads(baseline) == loads(dumps_response(doc, use_skeleton=True))
+        results.append({
+            "backend": name,
+            "bytes": len(encoded),
+            "dumps_us": round(_time_per_call(dumps, doc, count), 3),
+            "skeleton_us": round(_time_per_call(lambda d: dumps_response(d, use_skeleton=True), doc, count), 3),
+            "loads_us": round(_time_per_call(loads, encoded, count), 3),
+        })
+    results.append({
+        "backend": "json indent=2 (before)",
+        "bytes": len(json.dumps(doc, indent=2)),
+        "dumps_us": round(_time_per_call(lambda d: json.dumps(d, indent=2), doc, count), 3),
+        "skeleton_us": 0.0,
+        "loads_us": round(_time_per_call(json.loads, baseline, count), 3),
+    })
+    select_backend(os.environ.get("SERIALIZER_BACKEND") or None)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON backends on Ultra96 response documents")
+    parser.add_argument("--count", type=int, default=20000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Serializer benchmark (default backend: {BACKEND})")
+    print("=" * 60)
+    for r in benchmark(args.count):
+        print(f"{r['backend']:<24} {r['bytes']:>5} bytes  dumps {r['dumps_us']:>7.2f} us  "
+              f"skeleton {r['skeleton_us']:>7.2f} us  loads {r['loads_us']:>7.2f} us")
@@ -0,0 +1,281 @@
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+from collections import Counter, deque
+
+from latency_trace import now_us
+from mqtt_common import TOPIC_SENSOR, MQTTConnection, qos_for
+
+# Record a live glove session and replay it on identical input.
+# Recording points:
+#   tcp   the publisher's TCP ingest (FireBeetleMQTTPublisher.RECORD_FILE, --record): every
+#         encrypted base64 line, named by the glove's source id, stamped on receive
+#   mqtt  "record" below: every message on the given topics (default the sensor
+#         topics), named by its topic, stamped on arrival
+# Replay sends tcp records as newline-terminated lines to the publisher's TCP server
+# (one connection per recorded source, so the publisher sees as many gloves, and a
+# glove that reconnected mid-session stays one connection) and mqtt records onto their topic (or --topic), at the original pace,
+# N x speed or as fast as possible (--speed 0).
+#
+# File: MAGIC, then one RECORD header (receive time us, channel, name length,
+# payload length) + name + payload per message. Times are latency_trace.now_us().
+MAGIC = b"CG4002REC1\n"
+RECORD = struct.Struct("!QBHI")
+CHANNEL_TCP = 0
+CHANNEL_MQTT = 1
+CHANNEL_NAMES = {CHANNEL_TCP: "tcp", CHANNEL_MQTT: "mqtt"}
+
+
+class SessionRecorder:
+    """
+    Append-only session file. record() only appends to a deque (well under a
+    microsecond); a writer thread moves the records to disk every flush_s.
+    """
+
+    def __init__(self, path, flush_s=0.1):
+        self.path = path
+        self.flush_s = flush_s
+        self.pending = deque()
+        self.stopping = threading.Event()
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+
+        # Stats (before the writer thread starts, it updates them)
+        self.records = 0
+        self.bytes = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, channel, name, payload, ts_us=None):
+        self.pending.append((now_us() if ts_us is None else ts_us, channel, name, bytes(payload)))
+
+    def _run(self):
+        while not self.stopping.wait(self.flush_s):
+            self._write_pending()
+        self._write_pending()
+
+    def _write_pending(self):
+        chunks = []
+        while self.pending:
+            ts_us, channel, name, payload = self.pending.popleft()
+            name = name.encode("utf-8")
+            chunks += [RECORD.pack(ts_us, channel, len(name), len(payload)), name, payload]
+            self.records += 1
+            self.bytes += len(payload)
+        if chunks:
+            self.file.write(b"".join(chunks))
+            self.file.flush()
+
+    def close(self):
+        self.stopping.set()
+        self.thread.join()
+        self.file.close()
+
+    def stats(self):
+        return {"records": self.records, "bytes": self.bytes, "pending": len(self.pending)}
+
+
+def read_session(path):
+    """Yield (ts_us, channel, name, payload) for every record of a session file"""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        while True:
+            header = file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return      # end of file (or a record cut off by a crash)
+            ts_us, channel, name_len, payload_len = RECORD.unpack(header)
+            name = file.read(name_len).decode("utf-8")
+            payload = file.read(payload_len)
+            if len(payload) < payload_len:
+                return
+            yield ts_us, channel, name, payload
+
+
+def session_info(path):
+    records = Counter()
+    size = Counter()
+    first_us = last_us = None
+    for ts_us, channel, name, payload in read_session(path):
+        key = (CHANNEL_NAMES.get(channel, str(channel)), name)
+        records[key] += 1
+        size[key] += len(payload)
+        first_us = ts_us if first_us is None else first_us
+        last_us = ts_us
+    duration_s = (last_us - first_us) / 1e6 if records else 0.0
+    return {
+        "duration_s": round(duration_s, 3),
+        "records": sum(records.values()),
+        "streams": {f"{channel}:{name}": {"records": count, "bytes": size[(channel, name)],
+                                           "rate_hz": round(count / duration_s, 1) if duration_s else 0.0}
+                    for (channel, name), count in sorted(records.items())},
+    }
+
+
+# ---------------- Replay ----------------
+class TCPReplayTarget:
+    """tcp records -> the publisher's TCP server, one connection per recorded source"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sockets = {}
+
+    def send(self, channel, name, payload):
+        if channel != CHANNEL_TCP:
+            return False
+        sock = self.sockets.get(name)
+        if sock is None:
+            sock = self.sockets[name] = socket.create_connection((self.host, self.port), timeout=5)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(payload + b"\n")
+        return True
+
+    def close(self):
+        for sock in self.sockets.values():
+            sock.close()
+
+
+class MQTTReplayTarget:
+    """mqtt records -> their topic (or one override topic) on the broker"""
+
+    def __init__(self, host, port, ssl_context=None, topic=None):
+        self.topic = topic
+        self.client = MQTTConnection(f"replay_{socket.gethostname()}_{os.getpid()}", use_v5=False,
+                                     configure=(lambda c: c.tls_set_context(ssl_context)) if ssl_context else None)
+        self.client.connect(host, port)
+
+    def send(self, channel, name, payload):
+        if channel != CHANNEL_MQTT:
+            return False
+        topic = self.topic or name
+        self.client.publish(topic, payload, qos=qos_for(topic))
+        return True
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+def replay(records, target, speed=1.0):
+    """
+    Send records through target.send(channel, name, payload) with their recorded spacing
+    divided by speed (0 = as fast as possible); returns achieved rate and pacing lag.
+    """
+    sent = skipped = 0
+    lags = []
+    first_us = None
+    start = time.perf_counter()
+    for ts_us, channel, name, payload in records:
+        if first_us is None:
+            first_us = ts_us
+        if speed > 0:
+            due = start + (ts_us - first_us) / 1e6 / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - due) * 1000)
+        if target.send(channel, name, payload):
+            sent += 1
+        else:
+            skipped += 1
+    elapsed_s = time.perf_counter() - start
+    lags.sort()
+    return {
+        "sent": sent,
+        "skipped_other_channel": skipped,
+        "elapsed_s": round(elapsed_s, 3),
+        "rate_hz": round(sent / elapsed_s, 1) if elapsed_s else 0.0,
+        "lag_p50_ms": round(lags[len(lags) // 2], 3) if lags else 0.0,
+        "lag_max_ms": round(lags[-1], 3) if lags else 0.0,
+    }
+
+
+# ---------------- Command line ----------------
+def _ssl_context(args):
+    if not args.ca:
+        return None
+    from tls_context import client_context
+    return client_context(args.ca, args.cert, args.key)
+
+
+def record_mqtt(args):
+    recorder = SessionRecorder(args.out)
+
+    def on_connect(client, userdata, flags, rc):
+        for topic in args.topics:
+            client.subscribe(topic, qos=0)
+
+    ssl_context = _ssl_context(args)
+    client = MQTTConnection(f"recorder_{socket.gethostname()}", use_v5=False,
+                            configure=(lambda c: c.tls_set_context(ssl_context)) if ssl_context else None,
+                            on_connect=on_connect,
+                            on_message=lambda client, userdata, msg: recorder.record(CHANNEL_MQTT, msg.topic,
+                                                                                     msg.payload))
+    client.connect(args.host, args.port or 8883)
+    print(f"Recording {', '.join(args.topics)} to {args.out} (Ctrl+C to stop)")
+    try:
+        end = time.time() + args.seconds if args.seconds else None
+        while end is None or time.time() < end:
+            time.sleep(1 if end is None else max(0.0, min(1.0, end - time.time())))
+    except KeyboardInterrupt:
+        pass
+    client.loop_stop()
+    client.disconnect()
+    recorder.close()
+    print(f"Recorded {recorder.stats()}")
+
+
+def replay_file(args):
+    if args.to == "publisher":
+        target = TCPReplayTarget(args.host, args.port or 4210)
+    else:
+        target = MQTTReplayTarget(args.host, args.port or 8883, _ssl_context(args), args.topic)
+    info = session_info(args.file)
+    print(f"Replaying {info['records']} records ({info['duration_s']} s recorded) to {args.to} "
+          f"at {'max speed' if args.speed <= 0 else f'{args.speed:g}x'}")
+    try:
+        for run in range(args.loops):
+            print(f"Run {run + 1}: {replay(read_session(args.file), target, args.speed)}")
+    finally:
+        target.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay glove sessions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record MQTT topics (TCP ingest: publisher RECORD_FILE)")
+    record.add_argument("out")
+    record.add_argument("--topics", nargs="+", default=[f"{TOPIC_SENSOR}/#"])
+    record.add_argument("--seconds", type=float, default=0, help="stop after this long (0 = Ctrl+C)")
+
+    replay_cmd = commands.add_parser("replay", help="replay a recording")
+    replay_cmd.add_argument("file")
+    replay_cmd.add_argument("--to", choices=("publisher", "mqtt"), default="publisher",
+                            help="publisher: tcp records to its TCP server; mqtt: mqtt records to the broker")
+    replay_cmd.add_argument("--speed", type=float, default=1.0, help="N x original pace, 0 = as fast as possible")
+    replay_cmd.add_argument("--topic", help="publish every mqtt record on this topic instead of its own")
+    replay_cmd.add_argument("--loops", type=int, default=1)
+
+    info_cmd = commands.add_parser("info", help="summarise a recording")
+    info_cmd.add_argument("file")
+
+    for command in (record, replay_cmd):
+        command.add_argument("--host", default="localhost")
+        command.add_argument("--port", type=int, help="default: 4210 (publisher), 8883 (mqtt)")
+        command.add_argument("--ca", help="CA certificate (TLS to the broker)")
+        command.add_argument("--cert", help="client certificate")
+        command.add_argument("--key", help="client key")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_mqtt(args)
+    elif args.command == "replay":
+        replay_file(args)
+    else:
+        print(session_info(args.file))
@@ -1,16 +1,45 @@
-import paho.mqtt.client as mqtt
-import ssl
+import argparse
 import json
 import time
-import socket
-from Crypto.Cipher import AES
+
+from mqtt_common import TOPIC_CLOCK_PING, TOPIC_CLOCK_PONG, TOPIC_PROCESSED, MQTTConnection, message_metadata, qos_for
+from wire_format import is_binary_result, result_responder, result_trace, unpack_result
+from latency_trace import LatencyTracer, format_breakdown, now_us
+from actuators import Actuators
+from clock_sync import ClockSync
+import metrics
+from metrics_http import start_exporters, stop_exporters
+from pipeline_log import get_logger, setup_logging
+from profiling import add_profile_arguments, profile_from_args
+from tls_context import client_context, handshake_stats
+
+log = get_logger("bridge")
 
 # -------------------------------
 # MQTT Broker (WSL Mosquitto)
 # -------------------------------
 BROKER_IP = "172.17.183.135"
 BROKER_PORT = 8883
-TOPIC_RAW = "robot/processed/data"
+TOPIC_RAW = TOPIC_PROCESSED
+MQTT_V5 = True   # falls back to MQTT 3.1.1 if the broker refuses v5
+MQTT_PERSISTENT = True   # broker keeps our subscription and queued results across reconnects
+
+# Per-stage latency of traced results (publisher with TRACE_EVERY > 0, same laptop).
+# Clock pings to the Ultra96 every CLOCK_PING_S split the network time into one-way delays.
+TRACER = LatencyTracer()
+TRACE_REPORT_S = 10
+CLOCK_PING_S = 1.0
+CLOCK_ID = "laptop_bridge"
+clock = None
+
+# Stage metrics (metrics.py)
+RESULTS_IN = metrics.counter("results_in")
+DECODE_HIST = metrics.histogram("decode")
+ACTUATOR_HIST = metrics.histogram("actuator_send")
+END_TO_END_HIST = metrics.histogram("end_to_end")   # traced results: laptop tcp_rx -> actuator send
+METRICS_PORT = 9103   # Prometheus text on http://localhost:9103/metrics
+METRICS_DUMP_FILE = None   # e.g. "bridge_metrics.jsonl"
+METRICS_DUMP_INTERVAL_S = 5
 
 # TLS certs
 TLS_CA = "D:/y4sem1/CG4002/certs/ca.crt"
@@ -29,166 +58,155 @@ FIREBEETLE_PORT = 5000
 UNITY_IP = "127.0.0.1"   # Unity runs on same laptop
 UNITY_PORT = 6000
 
-AES_KEY = b"1234567890abcdef"
-AES_BLOCK_SIZE = 16
-
-tcp_socket = None
-unity_socket = None
-
-XOR_KEY = bytes([0x55, 0xAA, 0x33, 0xCC, 0x0F, 0xF0, 0x99, 0x66,
-                 0x12, 0x34, 0x56, 0x78, 0xAB, 0xCD, 0xEF, 0x01])
-
-
-# -------------------------------
-# TCP to FireBeetle
-# -------------------------------
-def connect_tcp():
-    global tcp_socket
-    if tcp_socket:
-        tcp_socket.close()
-        tcp_socket = None
-
-    while tcp_socket is None:
-        try:
-            tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp_socket.settimeout(10)
-            tcp_socket.connect((FIREBEETLE_IP, FIREBEETLE_PORT))
-            print("✅ Connected to FireBeetle")
-        except Exception as e:
-            print(f"❌ FireBeetle connection failed: {e}, retrying...")
-            time.sleep(3)
+# FireBeetle / Unity senders (actuators.py), created in main() from the settings above
+actuators = None
 
 
 def send_to_firebeetle(movement_class: int):
-    global tcp_socket
-    if tcp_socket is None:
-        connect_tcp()
-
-    try:
-        plaintext = str(movement_class).encode('utf-8').ljust(16, b'\x00')
-        encrypted = bytes([plaintext[i] ^ XOR_KEY[i] for i in range(16)])
-        print(f"📤 Sending to FireBeetle: {movement_class}")
-        tcp_socket.sendall(encrypted)
-
-        try:
-            ack = tcp_socket.recv(1024)
-            print(f"📨 FireBeetle ACK: {ack.decode().strip()}")
-        except socket.timeout:
-            print("⏰ No ACK received")
-    except Exception as e:
-        print(f"❌ FireBeetle send error: {e}")
-        tcp_socket = None
-
-
-# -------------------------------
-# TCP to Unity (AES)
-# -------------------------------
-def connect_unity():
-    global unity_socket
-    if unity_socket:
-        unity_socket.close()
-        unity_socket = None
-
-    while unity_socket is None:
-        try:
-            unity_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            unity_socket.settimeout(10)
-            unity_socket.connect((UNITY_IP, UNITY_PORT))
-            print("✅ Connected to Unity")
-        except Exception as e:
-            print(f"❌ Unity connection failed: {e}, retrying...")
-            time.sleep(3)
+    """Send a movement class to the robot; returns the send time (latency_trace clock) or None"""
+    return actuators.send_to_firebeetle(movement_class)
 
 
 def send_to_unity(movement_class: int):
-    global unity_socket
-    if unity_socket is None:
-        connect_unity()
-
-    try:
-        cipher = AES.new(AES_KEY, AES.MODE_CBC, iv=b'\x00' * 16)
-        plaintext = str(movement_class).encode('utf-8').ljust(16, b'\x00')
-        encrypted = cipher.encrypt(plaintext)
-
-        print(f"🎮 Sending to Unity: {movement_class}")
-        unity_socket.sendall(encrypted)
-    except Exception as e:
-        print(f"❌ Unity send error: {e}")
-        unity_socket = None
+    actuators.send_to_unity(movement_class)
 
 
 # -------------------------------
 # MQTT Setup
 # -------------------------------
-client = mqtt.Client(client_id="laptop_bridge")
-client.tls_set(TLS_CA, TLS_CERT, TLS_KEY, tls_version=ssl.PROTOCOL_TLSv1_2)
-client.tls_insecure_set(True)
+def configure_tls(c):
+    # Cached context: certificates loaded once, TLS session resumed after a reconnect
+    c.tls_set_context(client_context(TLS_CA, TLS_CERT, TLS_KEY))
 
 
 def on_connect(c, userdata, flags, rc):
     if rc == 0:
-        print("✅ Connected to WSL broker")
-        c.subscribe(TOPIC_RAW, qos=1)
-        print(f"📡 Subscribed to Ultra96 topic: {TOPIC_RAW}")
+        log.info("Connected to WSL broker")
+        log.info("TLS handshake: %s", handshake_stats(client_context(TLS_CA, TLS_CERT, TLS_KEY)))
+        c.subscribe(TOPIC_RAW, qos=qos_for(TOPIC_RAW))
+        c.subscribe(f"{TOPIC_CLOCK_PONG}/{CLOCK_ID}", qos=qos_for(TOPIC_CLOCK_PONG))
+        log.info("Subscribed to Ultra96 topic: %s", TOPIC_RAW)
     else:
-        print(f"❌ MQTT connection failed with code {rc}")
+        log.error("MQTT connection failed with code %s", rc)
 
 
 def on_message(c, userdata, msg):
+    received_us = now_us()
+    trace = responder = None
+    if msg.topic.startswith(TOPIC_CLOCK_PONG + "/"):
+        if clock:
+            clock.on_pong(msg.payload, received_us)
+        return
     try:
-        payload_json = json.loads(msg.payload)
-        movement_class = payload_json.get("movement_class")
+        RESULTS_IN.inc()
+        start = time.perf_counter()
+        # Binary result (default) or the JSON document (RESULT_FORMAT = "json" on the Ultra96)
+        if is_binary_result(msg.payload):
+            movement_class, confidence, seq, ts_us = unpack_result(msg.payload)
+            trace = result_trace(msg.payload)
+            responder = result_responder(msg.payload)
+        else:
+            payload_json = json.loads(msg.payload)
+            movement_class = payload_json.get("movement_class")
+            seq = message_metadata(msg).get("seq", payload_json.get("sequence"))
+        DECODE_HIST.record_since(start)
         if movement_class is not None:
-            print(f"\n🎯 Movement class from MQTT: {movement_class}")
-            send_to_firebeetle(int(movement_class))
+            log.info("Movement class from MQTT: %s (seq %s)", movement_class, seq)
+            start = time.perf_counter()
+            sent_us = send_to_firebeetle(int(movement_class))
             send_to_unity(int(movement_class))
+            ACTUATOR_HIST.record_since(start)
+            if trace and sent_us:
+                breakdown = TRACER.record(seq, trace, received_us, sent_us, clock and clock.offset(responder))
+                END_TO_END_HIST.record_ms(breakdown["total"])
+                log.info("Latency seq %s: %s", seq, format_breakdown(breakdown))
         else:
-            print("⚠️ No 'movement_class' in payload")
+            log.warning("No 'movement_class' in payload")
     except json.JSONDecodeError as e:
-        print(f"❌ JSON parse error: {e}")
+        log.error("JSON parse error: %s", e)
     except Exception as e:
-        print(f"❌ Error processing message: {e}")
+        log.error("Error processing message: %s", e)
 
 
 def on_disconnect(c, userdata, rc):
-    print(f"⚠️ Disconnected from WSL broker: {rc}")
+    log.warning("Disconnected from WSL broker: %s", rc)
+
+
+def register_clock_gauges(registered):
+    """One clock_offset_ms.<responder> gauge per Ultra96 board that has answered a ping"""
+    for peer in clock.peer_ids():
+        if peer not in registered:
+            registered.add(peer)
+            metrics.gauge(f"clock_offset_ms.{peer}", lambda peer=peer: round(clock.offset(peer) / 1000.0, 3))
 
 
 # -------------------------------
 # Main Loop
 # -------------------------------
 def main():
-    client.on_connect = on_connect
-    client.on_message = on_message
-    client.on_disconnect = on_disconnect
-
-    print("🚀 Laptop bridge starting...")
-    connect_tcp()
-    connect_unity()
+    global actuators, clock
+    actuators = Actuators((FIREBEETLE_IP, FIREBEETLE_PORT), (UNITY_IP, UNITY_PORT))
+    exporters = start_exporters(METRICS_PORT, METRICS_DUMP_FILE, METRICS_DUMP_INTERVAL_S, {"component": "bridge"})
+    metrics.gauge("firebeetle_connected", lambda: int(actuators.firebeetle_socket is not None))
+    metrics.gauge("unity_connected", lambda: int(actuators.unity_socket is not None))
+    client = MQTTConnection(
+        "laptop_bridge",
+        use_v5=MQTT_V5,
+        configure=configure_tls,
+        on_connect=on_connect,
+        on_message=on_message,
+        on_disconnect=on_disconnect,
+        persistent=MQTT_PERSISTENT
+    )
+
+    log.info("Laptop bridge starting...")
+    actuators.connect()
 
     try:
         client.connect(BROKER_IP, BROKER_PORT, keepalive=60)
-        client.loop_start()
-        print("✅ Bridge running. Press Ctrl+C to exit.")
+        ping_topic = f"{TOPIC_CLOCK_PING}/{CLOCK_ID}"
+
+        def send_ping(payload):
+            if client.is_connected():   # a queued ping would only be a stale sample
+                client.publish(ping_topic, payload, qos=qos_for(ping_topic))
+
+        clock = ClockSync(send_ping, CLOCK_PING_S).start()
+        log.info("Bridge running. Press Ctrl+C to exit.")
 
+        last_report = time.time()
+        last_metrics = metrics.snapshot()
+        clock_gauges = set()
         while True:
             time.sleep(1)
-            if tcp_socket is None:
-                connect_tcp()
-            if unity_socket is None:
-                connect_unity()
+            register_clock_gauges(clock_gauges)
+            if time.time() - last_report >= TRACE_REPORT_S:
+                last_report = time.time()
+                snapshot = metrics.snapshot()
+                log.info("Metrics:\n%s", metrics.format_snapshot(snapshot, last_metrics))
+                last_metrics = snapshot
+                if TRACER.traces:
+                    log.info("Latency breakdown (%d traces): %s", TRACER.traces, TRACER.stats())
+                    log.info("Clock offsets: %s", clock.stats())
+            actuators.connect()
 
     except KeyboardInterrupt:
-        print("\n🛑 Stopping bridge...")
+        log.info("Stopping bridge...")
     finally:
+        stop_exporters(exporters)
+        if clock:
+            clock.stop()
         client.loop_stop()
         client.disconnect()
-        if tcp_socket:
-            tcp_socket.close()
-        if unity_socket:
-            unity_socket.close()
-        print("✅ Bridge stopped")
+        actuators.close()
+        log.info("Bridge stopped")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Laptop bridge: movement classes -> FireBeetle / Unity")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    setup_logging()
+    profile = profile_from_args(args, "profile_bridge.folded")
     main()
+    if profile:
+        profile.finish()
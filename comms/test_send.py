@@ -1,11 +1,14 @@
 import paho.mqtt.client as mqtt
-import json
 import time
 import struct
 import random
 from datetime import datetime
 import ssl
 
+from mqtt_common import TOPIC_SENSOR, TOPIC_PROCESSED, TOPIC_ERRORS, qos_for
+from wire_format import is_binary_result, unpack_result
+from serializer import dumps, loads
+
 class FireBeetleSimulator:
     def __init__(self):
         # MQTT Configuration - Connect to local broker
@@ -13,9 +16,9 @@ class FireBeetleSimulator:
         self.MQTT_PORT = 8883
         
         # MQTT Topics
-        self.topic_sensor_to_ultra96 = "robot/sensor/to_ultra96"
-        self.topic_processed_data = "robot/processed/data"
-        self.topic_errors = "robot/errors"
+        self.topic_sensor_to_ultra96 = TOPIC_SENSOR
+        self.topic_processed_data = TOPIC_PROCESSED
+        self.topic_errors = TOPIC_ERRORS
         
         # TLS Certificate paths
         self.TLS_CA = "D:/y4sem1/CG4002/certs/ca.crt"
@@ -56,8 +59,8 @@ class FireBeetleSimulator:
         if rc == 0:
             print("✅ Connected to MQTT broker successfully")
             # Subscribe to processed data topic to see Ultra96 responses
-            client.subscribe(self.topic_processed_data)
-            client.subscribe(self.topic_errors)
+            client.subscribe(self.topic_processed_data, qos=qos_for(self.topic_processed_data))
+            client.subscribe(self.topic_errors, qos=qos_for(self.topic_errors))
             print(f"📝 Subscribed to response topics")
         else:
             print(f"❌ Failed to connect to MQTT broker: {rc}")
@@ -65,8 +68,13 @@ class FireBeetleSimulator:
     def on_message(self, client, userdata, msg):
         """Handle incoming MQTT messages from Ultra96"""
         try:
-            if msg.topic == self.topic_processed_data:
-                message = json.loads(msg.payload.decode())
+            if msg.topic == self.topic_processed_data and is_binary_result(msg.payload):
+                movement_class, confidence, seq, ts_us = unpack_result(msg.payload)
+                print(f"📥 Movement class {movement_class} from Ultra96 "
+                      f"(confidence {confidence:.3f}, seq {seq}, ts {ts_us} us)")
+
+            elif msg.topic == self.topic_processed_data:
+                message = loads(msg.payload)
                 self.processed_data.append(message)
                 print(f"📥 Received processed data from Ultra96:")
                 print(f"   Session ID: {message.get('session_id', 'N/A')}")
@@ -136,8 +144,8 @@ class FireBeetleSimulator:
             # Publish to Ultra96
             result = self.client.publish(
                 self.topic_sensor_to_ultra96,
-                json.dumps(message),
-                qos=1
+                dumps(message),
+                qos=qos_for(self.topic_sensor_to_ultra96)
             )
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
@@ -0,0 +1,193 @@
+import argparse
+import os
+import socket
+import ssl
+import threading
+import time
+
+# Shared TLS contexts for the MQTT clients and the direct link.
+# Loading the CA / client certificate / key and building an SSLContext is done
+# once per file set (rebuilt only if a file changes) instead of on every
+# tls_set(). Client contexts remember the last TLS session per server and offer
+# it on the next connect, so a reconnect after a tunnel drop is an abbreviated
+# handshake (session ticket / id) instead of a full one with client certificates.
+# Every handshake's duration is recorded; see handshake_stats().
+
+_contexts = {}
+_lock = threading.Lock()
+
+
+class ResumingSSLSocket(ssl.SSLSocket):
+    """SSLSocket that times its handshake and hands the session back to its context"""
+
+    def do_handshake(self, block=False):
+        start = time.perf_counter()
+        super().do_handshake()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.context.record_handshake(elapsed_ms, not self.server_side and self.session_reused)
+        self._save_session()
+
+    def _save_session(self):
+        if not self.server_side:
+            session = self.session
+            if session is not None and (session.has_ticket or session.id):
+                self.context.sessions[self.getpeername()[:2]] = session
+
+    def close(self):
+        # With TLS 1.3 the resumable session ticket arrives after the handshake
+        try:
+            self._save_session()
+        except (OSError, ValueError, AttributeError):
+            pass
+        super().close()
+
+
+class CachedContext(ssl.SSLContext):
+    sslsocket_class = ResumingSSLSocket
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True, suppress_ragged_eofs=True,
+                    server_hostname=None, session=None):
+        # Offer the cached session of this server (paho's tls_set_context and the direct
+        # link both wrap an already connected socket)
+        if not server_side and session is None:
+            try:
+                session = self.sessions.get(sock.getpeername()[:2])
+            except OSError:
+                pass
+        return super().wrap_socket(sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+                                   suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname,
+                                   session=session)
+
+    def record_handshake(self, elapsed_ms, resumed):
+        with self.stats_lock:
+            self.handshakes += 1
+            self.resumed += resumed
+            self.last_ms = elapsed_ms
+            self.last_resumed = resumed
+            key = "resumed" if resumed else "full"
+            self.totals[key][0] += 1
+            self.totals[key][1] += elapsed_ms
+
+
+def _new_context(purpose):
+    protocol = ssl.PROTOCOL_TLS_CLIENT if purpose == "client" else ssl.PROTOCOL_TLS_SERVER
+    context = CachedContext(protocol)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.sessions = {}           # (host, port) -> ssl.SSLSession
+    context.stats_lock = threading.Lock()
+    context.handshakes = context.resumed = 0
+    context.last_ms = 0.0
+    context.last_resumed = False
+    context.totals = {"full": [0, 0.0], "resumed": [0, 0.0]}
+    return context
+
+
+def _file_key(*paths):
+    return tuple((path, os.path.getmtime(path)) if path else (None, None) for path in paths)
+
+
+def client_context(ca_certs, certfile=None, keyfile=None, check_hostname=False):
+    """
+    Cached client context: verifies the broker against ca_certs, presents the client
+    certificate, and (like tls_insecure_set(True)) skips the hostname check by default.
+    Use with paho as client.tls_set_context(client_context(...)).
+    """
+    key = ("client", check_hostname) + _file_key(ca_certs, certfile, keyfile)
+    with _lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = _new_context("client")
+            context.check_hostname = check_hostname
+            context.load_verify_locations(ca_certs)
+            if certfile:
+                context.load_cert_chain(certfile, keyfile)
+            _contexts[key] = context
+    return context
+
+
+def server_context(certfile, keyfile, ca_certs=None):
+    """Cached server context; client certificates are required if ca_certs is given"""
+    key = ("server",) + _file_key(certfile, keyfile, ca_certs)
+    with _lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = _new_context("server")
+            context.load_cert_chain(certfile, keyfile)
+            if ca_certs:
+                context.load_verify_locations(ca_certs)
+                context.verify_mode = ssl.CERT_REQUIRED
+            _contexts[key] = context
+    return context
+
+
+def handshake_stats(context):
+    with context.stats_lock:
+        full_count, full_ms = context.totals["full"]
+        resumed_count, resumed_ms = context.totals["resumed"]
+        return {
+            "handshakes": context.handshakes,
+            "resumed": context.resumed,
+            "last_ms": round(context.last_ms, 3),
+            "last_resumed": context.last_resumed,
+            "avg_full_ms": round(full_ms / full_count, 3) if full_count else 0.0,
+            "avg_resumed_ms": round(resumed_ms / resumed_count, 3) if resumed_count else 0.0,
+        }
+
+
+# ---------------- Benchmark ----------------
+def benchmark(certfile, keyfile, ca_certs, client_cert=None, client_key=None, reconnects=20):
+    """Reconnect repeatedly to a local TLS echo server, with and without resumption"""
+    server = server_context(certfile, keyfile, ca_certs if client_cert else None)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+    port = listener.getsockname()[1]
+
+    def serve():
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                with server.wrap_socket(sock, server_side=True) as tls:
+                    tls.sendall(tls.recv(1))
+            except (OSError, ssl.SSLError):
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    results = {}
+    for label, resume in (("fresh context per connect", False), ("cached context + resumption", True)):
+        times = []
+        for _ in range(reconnects):
+            if not resume:
+                with _lock:
+                    _contexts.clear()   # what tls_set() does: reload everything, full handshake
+            start = time.perf_counter()
+            context = client_context(ca_certs, client_cert, client_key)
+            with socket.create_connection(("127.0.0.1", port)) as sock:
+                with context.wrap_socket(sock, server_hostname="localhost") as tls:
+                    tls.sendall(b"x")
+                    tls.recv(1)
+                    times.append((time.perf_counter() - start) * 1000)
+        results[label] = (sum(times) / len(times), handshake_stats(context))
+    listener.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure TLS reconnect cost with and without resumption")
+    parser.add_argument("--cert", required=True, help="server certificate")
+    parser.add_argument("--key", required=True, help="server key")
+    parser.add_argument("--ca", required=True, help="CA that signed the server certificate")
+    parser.add_argument("--client-cert")
+    parser.add_argument("--client-key")
+    parser.add_argument("--reconnects", type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"TLS reconnect benchmark ({args.reconnects} reconnects)")
+    print("=" * 60)
+    for label, (avg_ms, stats) in benchmark(args.cert, args.key, args.ca, args.client_cert, args.client_key,
+                                            args.reconnects).items():
+        print(f"{label:<28}: connect + round trip {avg_ms:.3f} ms  {stats}")
@@ -1,31 +1,78 @@
-import paho.mqtt.client as mqtt
 import json
 import time
 import struct
 from datetime import datetime
 import csv
 import os
-import ssl
-import random
+import argparse
+import multiprocessing
 
-#import sys
-#sys.path.append("/home/xilinx/ai_code")  # <-- path to ai_model.py
+from imu_features import FrameWindow, frame_from_bytes, DEFAULT_WINDOW_SIZE
+from inference_engine import InferenceEngine, create_backend
+from gesture_segmenter import GestureSegmenter
+from prediction_filter import PredictionSmoother, smoothing_config
+from wire_format import pack_result, unpack_frames_traced
+from latency_trace import now_us
+from clock_sync import RESPONDER_ID, answer_ping
+import metrics
+from metrics_http import start_exporters, stop_exporters
+from pipeline_log import get_logger, setup_logging, shutdown as shutdown_logging
+from profiling import add_profile_arguments, profile_from_args
+from direct_link import DEFAULT_PORT as DIRECT_PORT, DirectLinkServer
+from tls_context import client_context, handshake_stats, server_context
+from mqtt_common import (TOPIC_SENSOR, TOPIC_PROCESSED, TOPIC_PROCESSED_DEBUG, TOPIC_ERRORS, TOPIC_CLOCK_PING,
+                         TOPIC_CLOCK_PONG, SENSOR_PARTITIONS, SHARE_GROUP, MQTTConnection, message_metadata, qos_for,
+                         sensor_partition, source_from_topic, worker_client_id, worker_subscriptions)
 
-#from ai_model import classify_from_csv
+log = get_logger("ultra96")
+
+
+class SourceState:
+    """Per-source pipeline state: sliding window, gesture segmenter and prediction smoother"""
+
+    def __init__(self, window_size, smoother):
+        self.window = FrameWindow(window_size)
+        self.segmenter = GestureSegmenter(self.window, start_threshold=1.0, stop_threshold=0.1)
+        self.smoother = smoother
+        self.frames = 0
 
 
 class Ultra96MQTTSubscriber:
-    def __init__(self):
+    def __init__(self, worker_index=0, worker_count=1, share_group=SHARE_GROUP):
         self.session_counter = 1000
+
+        # Worker pool - worker_index of worker_count workers share the sensor partitions
+        # (see mqtt_common.worker_subscriptions); run more workers with --workers / --index.
+        self.WORKER_INDEX = worker_index
+        self.WORKER_COUNT = worker_count
+        self.SHARE_GROUP = share_group
         
         # MQTT Configuration - Connect to Laptop broker
         self.MQTT_BROKER = "localhost"  # Laptop IP
         self.MQTT_PORT = 8883               # TLS MQTT port
         
         # MQTT Topics
-        self.topic_sensor_to_ultra96 = "robot/sensor/to_ultra96"
-        self.topic_processed_data = "robot/processed/data"
-        self.topic_errors = "robot/errors"
+        self.topic_sensor_to_ultra96 = TOPIC_SENSOR
+        self.sensor_subscriptions = worker_subscriptions(worker_index, worker_count, share_group)
+        self.topic_processed_data = TOPIC_PROCESSED
+        self.topic_errors = TOPIC_ERRORS
+        self.topic_processed_debug = TOPIC_PROCESSED_DEBUG
+        self.topic_clock_ping = TOPIC_CLOCK_PING + "/+"   # answered by every worker (clock_sync.py)
+
+        # Results go out as a 20-byte binary message (wire_format.pack_result).
+        # RESULT_FORMAT = "json" restores the JSON document on robot/processed/data;
+        # PUBLISH_DEBUG_JSON additionally copies each result as JSON to robot/processed/debug.
+        self.RESULT_FORMAT = "binary"
+        self.PUBLISH_DEBUG_JSON = False
+
+        # Transport for frames and results: "mqtt" (via the laptop broker) or "direct"
+        # (TLS TCP stream from the publisher, see direct_link.py; results go back on the
+        # same stream). MQTT stays connected for errors / debug in both modes. Worker i
+        # listens on DIRECT_PORT + i; the publisher (DIRECT_WORKERS = worker count) sends
+        # each source to the worker of its partition, so a direct-mode pool runs on one board.
+        self.TRANSPORT = "mqtt"
+        self.DIRECT_PORT = DIRECT_PORT + worker_index
+        self.direct = None
         
         # TLS Certificate paths (on Ultra96)
         self.TLS_CA = "/home/xilinx/tls_certs/ca.crt"
@@ -33,13 +80,79 @@ class Ultra96MQTTSubscriber:
         self.TLS_KEY = "/home/xilinx/tls_certs/ultra96.key"
         
         # CSV file setup
-        self.csv_file = "imu_data.csv"
+        self.csv_file = "imu_data.csv" if worker_count == 1 else f"imu_data_w{worker_index}.csv"
         self._initialize_csv()
+
+        # Sliding window of the most recent frames (W x 5 IMUs x 6 values), one per source
+        self.WINDOW_SIZE = DEFAULT_WINDOW_SIZE
+        self.sources = {}   # source id -> SourceState
+
+        # Gesture segmentation - only classify (and publish) when a gesture ends.
+        # Set SEGMENTATION_ENABLED = False to classify every frame as before.
+        self.SEGMENTATION_ENABLED = True
+
+        # AI inference - model is loaded once in start(). Backends: "numpy_mlp" / "numpy_cnn"
+        # (weights from .npz, see numpy_model.py), "random", or an external model module:
+        # AI_BACKEND = "module", AI_BACKEND_OPTIONS = {"module": "ai_model", "path": "/home/xilinx/ai_code"}
+        self.AI_BACKEND = "numpy_mlp"
+        self.AI_BACKEND_OPTIONS = {"model_path": "model.npz"}
+        self.AI_MAX_BATCH = 8
+        self.STATS_INTERVAL = 10  # seconds between inference stats prints
+
+        self.engine = InferenceEngine(
+            create_backend(self.AI_BACKEND, **self.AI_BACKEND_OPTIONS),
+            max_batch=self.AI_MAX_BATCH,
+            on_result=self.publish_result,
+            window_size=self.WINDOW_SIZE
+        )
         
-        # MQTT Client
-        self.client = mqtt.Client(client_id="ultra96_subscriber_tls")
+        # MQTT Client (MQTT v5 if the broker supports it, else 3.1.1).
+        # Receive Maximum caps how many QoS 1 messages the broker pushes before we ack.
+        self.MQTT_V5 = True
+        self.MQTT_RECEIVE_MAXIMUM = 20
+
+        # Persistent session: subscriptions survive an SSH tunnel drop. Results expire at the
+        # broker after RESULT_EXPIRY_S so the bridge never actuates a stale movement (MQTT v5).
+        self.MQTT_PERSISTENT = True
+        self.RESULT_EXPIRY_S = 2
+
+        # Stage metrics (metrics.py), printed with the stats every STATS_INTERVAL
+        self.messages_in = metrics.counter("sensor_messages")
+        self.frames_in = metrics.counter("frames_in")
+        self.results_out = metrics.counter("results_published")
+        self.decode_hist = metrics.histogram("decode")
+        self.parse_hist = metrics.histogram("parse")
+        self.log_write_hist = metrics.histogram("log_write")
+        self.publish_hist = metrics.histogram("publish")
+        metrics.gauge("inference_queue", self.engine.queue.qsize)
+        metrics.gauge("sources", lambda: len(self.sources))
+        metrics.gauge("direct_clients", lambda: len(self.direct.clients) if self.direct else 0)
+
+        # Metrics endpoint (Prometheus text on http://<board>:METRICS_PORT/metrics) and an
+        # optional JSON-lines dump every METRICS_DUMP_INTERVAL_S. Workers take 9110 + index,
+        # clear of the publisher (9101) and bridge (9103) when they share a machine
+        self.METRICS_PORT = 9110 + worker_index
+        self.METRICS_DUMP_FILE = None
+        self.METRICS_DUMP_INTERVAL_S = 5
+        self.exporters = []
+        self.client = None
         self.setup_mqtt()
 
+    # ---------------- Per-source state ----------------
+    def source_state(self, source):
+        state = self.sources.get(source)
+        if state is None:
+            # Prediction smoothing before anything reaches the robot (prediction_filter.smoothing_config;
+            # prediction_filter.py replays a recorded session through the same settings)
+            smoother = PredictionSmoother(**smoothing_config(self.SEGMENTATION_ENABLED))
+            state = SourceState(self.WINDOW_SIZE, smoother)
+            self.sources[source] = state
+            log.info("New sensor source: %s", source)
+            if self.TRANSPORT == "direct" and sensor_partition(source) % self.WORKER_COUNT != self.WORKER_INDEX:
+                log.warning("Source %s belongs to worker %d of %d; check the publisher's DIRECT_WORKERS",
+                            source, sensor_partition(source) % self.WORKER_COUNT, self.WORKER_COUNT)
+        return state
+
     # ---------------- CSV handling ----------------
     def _initialize_csv(self):
         if not os.path.exists(self.csv_file):
@@ -53,9 +166,9 @@ class Ultra96MQTTSubscriber:
                             f"IMU{i}_gx", f"IMU{i}_gy", f"IMU{i}_gz"
                         ])
                     writer.writerow(headers)
-                print(f"Initialized CSV file: {self.csv_file}")
+                log.info("Initialized CSV file: %s", self.csv_file)
             except Exception as e:
-                print(f"Error initializing CSV: {e}")
+                log.error("Error initializing CSV: %s", e)
 
     def write_to_csv(self, sensor_readings):
         try:
@@ -77,40 +190,48 @@ class Ultra96MQTTSubscriber:
                     if not imu_found:
                         row.extend([0.0] * 6)
                 writer.writerow(row)
-                print(f"Data written to CSV: {len(row)} values")
+                log.debug("Data written to CSV: %d values", len(row))
         except Exception as e:
-            print(f"Error writing to CSV: {e}")
+            log.error("Error writing to CSV: %s", e)
 
     # ---------------- MQTT setup ----------------
+    def configure_tls(self, client):
+        # Cached context: certificates are loaded once and reconnects resume the TLS session
+        self.tls_context = client_context(self.TLS_CA, self.TLS_CERT, self.TLS_KEY)
+        client.tls_set_context(self.tls_context)  # no hostname check, for self-signed certs
+
     def setup_mqtt(self):
-        self.client.tls_set(
-            ca_certs=self.TLS_CA,
-            certfile=self.TLS_CERT,
-            keyfile=self.TLS_KEY,
-            tls_version=ssl.PROTOCOL_TLSv1_2
+        self.client = MQTTConnection(
+            worker_client_id("ultra96_subscriber_tls", self.WORKER_INDEX),
+            use_v5=self.MQTT_V5,
+            receive_maximum=self.MQTT_RECEIVE_MAXIMUM,
+            configure=self.configure_tls,
+            on_connect=self.on_connect,
+            on_message=self.on_message,
+            on_disconnect=self.on_disconnect,
+            persistent=self.MQTT_PERSISTENT
         )
-        self.client.tls_insecure_set(True)  # for self-signed certs
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.on_disconnect = self.on_disconnect
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
-            print("Connected to Laptop MQTT broker successfully")
-            client.subscribe(self.topic_sensor_to_ultra96)
-            print(f"Subscribed to topic: {self.topic_sensor_to_ultra96}")
+            log.info("Connected to Laptop MQTT broker successfully")
+            log.info("TLS handshake: %s", handshake_stats(self.tls_context))
+            for topic in self.sensor_subscriptions + [self.topic_clock_ping]:
+                client.subscribe(topic, qos=qos_for(topic))
+                log.info("Subscribed to topic: %s", topic)
         else:
-            print(f"Failed to connect to MQTT broker: {rc}")
+            log.error("Failed to connect to MQTT broker: %s", rc)
 
     def on_disconnect(self, client, userdata, rc):
-        print(f"Disconnected from broker: {rc}")
+        log.warning("Disconnected from broker: %s", rc)
 
     # ---------------- Sensor data handling ----------------
-    def process_binary_sensor_data(self, raw_data):
+    def process_binary_sensor_data(self, raw_data, window):
         try:
             if len(raw_data) != 120:
                 return self._generate_error_response(f"Invalid packet length: {len(raw_data)}")
 
+            start = time.perf_counter()
             sensor_readings = []
             offset = 0
             for imu_id in range(5):
@@ -124,7 +245,10 @@ class Ultra96MQTTSubscriber:
                 })
                 offset += 24
 
-            self.write_to_csv(sensor_readings)
+            window.push(frame_from_bytes(raw_data))
+            self.parse_hist.record_since(start)
+            with self.log_write_hist.time():
+                self.write_to_csv(sensor_readings)
 
             return {"session_id": self.session_counter, "sensor_data": sensor_readings, "status": "success"}
         except Exception as e:
@@ -147,74 +271,230 @@ class Ultra96MQTTSubscriber:
             "status": "error"
         }
 
-    # ---------------- AI simulation ----------------
-    def run_ai_inference(self, sensor_data):
-        """Simulate AI: assign a random integer 0-3 as movement class"""
-        return random.randint(0, 3)
-    #def run_ai_inference(self, sensor_data):
-    #"""Call external AI model that reads from CSV"""
-    #try:
-     #   movement_class = classify_from_csv(self.csv_file)
-      #  return movement_class
-    #except Exception as e:
-     #   print(f"AI inference error: {e}")
-      #  return -1
+    # ---------------- AI inference ----------------
+    def load_model(self):
+        """Warm-load the configured model, falling back to random classes if it can't be loaded"""
+        try:
+            self.engine.load()
+        except Exception as e:
+            log.error("Failed to load AI backend '%s': %s", self.AI_BACKEND, e)
+            log.warning("Falling back to random movement classes")
+            self.engine.backend = create_backend("random")
+            self.engine.load()
+
+    def publish_result(self, context, movement_class, confidence, batch_latency_ms):
+        """Called by the inference worker for every window in a finished batch"""
+        inference_us = now_us()
+        if self.source_state(context["source"]).smoother.update(movement_class, confidence) is None:
+            return
 
+        ts_us = time.time_ns() // 1000
+        # Traced frame: laptop stamps + ultra96_rx, then inference and result_publish
+        trace = context.get("trace")
+        if trace:
+            trace = trace + (inference_us, now_us())
+        start = time.perf_counter()
+        result = pack_result(int(movement_class), confidence, context["sequence"], ts_us, trace, RESPONDER_ID)
+        if self.direct:
+            self.direct.send_result(result, context["source"])
+            if self.PUBLISH_DEBUG_JSON:
+                self.publish_json_result(self.topic_processed_debug, context, movement_class, confidence,
+                                         batch_latency_ms, ts_us)
+        elif self.RESULT_FORMAT == "binary":
+            self.client.publish(self.topic_processed_data, result,
+                                qos=qos_for(self.topic_processed_data), expiry=self.RESULT_EXPIRY_S)
+            if self.PUBLISH_DEBUG_JSON:
+                self.publish_json_result(self.topic_processed_debug, context, movement_class, confidence,
+                                         batch_latency_ms, ts_us)
+        else:
+            self.publish_json_result(self.topic_processed_data, context, movement_class, confidence,
+                                     batch_latency_ms, ts_us)
+        self.publish_hist.record_since(start)
+        self.results_out.inc()
+        log.info("Sent movement class %s back to laptop", movement_class)
+
+    def publish_json_result(self, topic, context, movement_class, confidence, batch_latency_ms, ts_us):
+        response = {
+            "source": context["source"],
+            "movement_class": int(movement_class),
+            "confidence": round(confidence, 4),
+            "inference_ms": round(batch_latency_ms, 3),
+            "status": "success"
+        }
+
+        # Publish response over TLS; with MQTT v5 the sequence / timestamp ride as user properties
+        if self.client.v5:
+            self.client.publish(topic, json.dumps(response), qos=qos_for(topic),
+                                seq=context["sequence"], ts=ts_us, expiry=self.RESULT_EXPIRY_S)
+        else:
+            response["session_id"] = context["session_id"]
+            response["sequence"] = context["sequence"]
+            response["timestamp"] = datetime.fromtimestamp(ts_us / 1e6).isoformat()
+            self.client.publish(topic, json.dumps(response), qos=qos_for(topic))
 
     # ---------------- MQTT message handler ----------------
     def on_message(self, client, userdata, msg):
+        received_us = now_us()
         try:
-            if msg.topic == self.topic_sensor_to_ultra96:
-                raw_data = msg.payload
-                print(f"Received {len(raw_data)} bytes from laptop")
-
-                processed = self.process_binary_sensor_data(raw_data)
-                if processed["status"] != "success":
-                    self.client.publish(self.topic_errors, json.dumps(processed), qos=1)
+            if msg.topic.startswith(TOPIC_CLOCK_PING + "/"):
+                pong = answer_ping(msg.payload, received_us)
+                if pong:
+                    topic = TOPIC_CLOCK_PONG + "/" + msg.topic.rsplit("/", 1)[1]
+                    self.client.publish(topic, pong, qos=qos_for(topic))
+                return
+            if msg.topic == self.topic_sensor_to_ultra96 or msg.topic.startswith(self.topic_sensor_to_ultra96 + "/"):
+                source = source_from_topic(msg.topic)
+                log.debug("Received %d bytes from laptop", len(msg.payload))
+                try:
+                    start = time.perf_counter()
+                    first_seq, frames, traces = unpack_frames_traced(msg.payload)
+                    self.decode_hist.record_since(start)
+                    self.messages_in.inc()
+                except ValueError as e:
+                    self.client.publish(self.topic_errors, json.dumps(self._generate_error_response(str(e))), qos=qos_for(self.topic_errors))
                     return
 
-                # Run simulated AI
-                movement_class = self.run_ai_inference(processed["sensor_data"])
-                response = {
-                    "session_id": self.session_counter,
-                    "movement_class": int(movement_class),
-                    "status": "success",
-                    "timestamp": datetime.now().isoformat()
-                }
-
-                # Publish response over TLS
-                self.client.publish(self.topic_processed_data, json.dumps(response), qos=1)
-                # Publish just the integer as a string
-                #self.client.publish(self.topic_processed_data, str(movement_class), qos=1)
-                print(f"Sent movement class {movement_class} back to laptop")
+                if first_seq is None and "seq" in message_metadata(msg):
+                    first_seq = int(message_metadata(msg)["seq"])
+
+                for i, raw_frame in enumerate(frames):
+                    seq = None if first_seq is None else first_seq + i
+                    trace = traces[i] + (received_us,) if traces else None
+                    self.handle_frame(raw_frame, seq, source, trace)
 
         except Exception as e:
             error_msg = f"Error processing MQTT message: {e}"
-            print(error_msg)
-            self.client.publish(self.topic_errors, error_msg, qos=1)
+            log.error("Error processing MQTT message: %s", e)
+            self.client.publish(self.topic_errors, error_msg, qos=qos_for(self.topic_errors))
+
+    def on_direct_frames(self, source, first_seq, frames, traces=None):
+        """Sensor message from the direct link (called on the connection's thread)"""
+        received_us = now_us()
+        for i, raw_frame in enumerate(frames):
+            trace = traces[i] + (received_us,) if traces else None
+            self.handle_frame(raw_frame, None if first_seq is None else first_seq + i, source, trace)
+
+    def handle_frame(self, raw_frame, seq=None, source="default", trace=None):
+        """
+        Process one 120-byte sensor frame of a source; queue inference when a window is ready.
+        trace: the frame's laptop stamps + ultra96_rx (latency_trace.py), carried to the result.
+        """
+        state = self.source_state(source)
+        state.frames += 1
+        self.frames_in.inc()
+        processed = self.process_binary_sensor_data(raw_frame, state.window)
+        if processed["status"] != "success":
+            self.client.publish(self.topic_errors, json.dumps(processed), qos=qos_for(self.topic_errors))
+            return
+
+        # Only a completed gesture is classified while segmentation is on
+        if self.SEGMENTATION_ENABLED:
+            window = state.segmenter.update()
+            if window is None:
+                return
+            log.info("Gesture detected from %s (%d so far), running inference", source, state.segmenter.gestures)
+        else:
+            window = state.window.snapshot()
+
+        # Queue the window; the inference worker batches whatever is ready
+        context = {"session_id": self.session_counter, "sequence": seq, "source": source, "trace": trace}
+        if not self.engine.submit(window, context):
+            log.warning("Inference queue full, dropping window")
 
     # ---------------- Start subscriber ----------------
     def start(self):
         try:
-            self.client.connect(self.MQTT_BROKER, self.MQTT_PORT, 60)
-            self.client.loop_start()
-            print(f"Connected to Laptop broker at {self.MQTT_BROKER}:{self.MQTT_PORT}")
+            self.exporters = start_exporters(self.METRICS_PORT, self.METRICS_DUMP_FILE, self.METRICS_DUMP_INTERVAL_S,
+                                             {"component": "ultra96", "worker": str(self.WORKER_INDEX)})
+            self.load_model()
+            self.engine.start()
+            if self.TRANSPORT == "direct":
+                self.direct = DirectLinkServer(
+                    self.on_direct_frames,
+                    port=self.DIRECT_PORT,
+                    ssl_context=server_context(self.TLS_CERT, self.TLS_KEY, self.TLS_CA)
+                ).start()
+            try:
+                self.client.connect(self.MQTT_BROKER, self.MQTT_PORT, 60)
+                log.info("Connected to Laptop broker at %s:%d", self.MQTT_BROKER, self.MQTT_PORT)
+            except Exception as e:
+                if not self.direct:
+                    raise
+                log.warning("MQTT unavailable (%s), running on the direct link only", e)
 
+            last_stats = time.time()
+            last_metrics = metrics.snapshot()
             while True:
                 time.sleep(1)
+                if time.time() - last_stats >= self.STATS_INTERVAL:
+                    last_stats = time.time()
+                    log.info("Inference stats: %s", self.engine.stats())
+                    snapshot = metrics.snapshot()
+                    log.info("Metrics:\n%s", metrics.format_snapshot(snapshot, last_metrics))
+                    last_metrics = snapshot
+                    if self.direct:
+                        log.info("Direct link stats: %s", self.direct.stats())
+                    for source, state in list(self.sources.items()):
+                        log.info("[%s] frames: %d", source, state.frames)
+                        if self.SEGMENTATION_ENABLED:
+                            log.info("[%s] Segmentation stats: %s", source, state.segmenter.stats())
+                        log.info("[%s] Smoothing stats: %s", source, state.smoother.stats())
         except KeyboardInterrupt:
-            print("\nShutdown requested...")
+            log.info("Shutdown requested...")
         except Exception as e:
-            print(f"Failed to start: {e}")
+            log.error("Failed to start: %s", e)
         finally:
+            if self.direct:
+                self.direct.stop()
             self.client.loop_stop()
             self.client.disconnect()
+            self.engine.stop()
+            stop_exporters(self.exporters)
+
+
+def run_worker(worker_index, worker_count, share_group, args=None):
+    log.info("Starting worker %d/%d", worker_index + 1, worker_count)
+    profile = profile_from_args(args, "profile_ultra96_w{worker}.folded", worker=worker_index) if args else None
+    try:
+        subscriber = Ultra96MQTTSubscriber(worker_index, worker_count, share_group)
+        subscriber.start()
+        if profile:
+            profile.finish()
+    finally:
+        shutdown_logging()      # worker processes exit without running atexit
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ultra96 MQTT subscriber / AI inference worker")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to run on this board")
+    parser.add_argument("--index", type=int, default=0, help="index of the first worker on this board")
+    parser.add_argument("--count", type=int, default=None,
+                        help="total workers across all boards (default: --workers)")
+    parser.add_argument("--group", default=SHARE_GROUP, help="shared subscription group name")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    setup_logging()     # forked workers restart their own listener (pipeline_log._restart_after_fork)
+    count = args.count or args.workers
+    if args.index < 0 or args.index + args.workers > count:
+        parser.error(f"workers {args.index}..{args.index + args.workers - 1} outside the pool of {count} "
+                     f"(each index must run exactly once across all boards)")
+    if count > SENSOR_PARTITIONS:
+        parser.error(f"{count} workers but only {SENSOR_PARTITIONS} sensor partitions (set SENSOR_PARTITIONS)")
+
     print("="*60)
-    print("Ultra96 MQTT Subscriber (TLS, AI Simulation)")
+    print("Ultra96 MQTT Subscriber (TLS, AI Inference)")
     print("="*60)
-    subscriber = Ultra96MQTTSubscriber()
-    subscriber.start()
+    if args.workers == 1:
+        run_worker(args.index, count, args.group, args)
+    else:
+        workers = [multiprocessing.Process(target=run_worker, args=(args.index + i, count, args.group, args))
+                   for i in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.join()
 
@@ -1,5 +1,4 @@
 import paho.mqtt.client as mqtt
-import json
 import time
 import struct
 from datetime import datetime
@@ -7,6 +6,12 @@ import random
 import csv
 import os
 
+import numpy as np
+
+from imu_features import readings_to_array
+from mqtt_common import qos_for
+from serializer import dumps_response, loads
+
 class Ultra96ProcessorMQTT:
     def __init__(self):
         self.session_counter = 1000
@@ -93,15 +98,18 @@ class Ultra96ProcessorMQTT:
         if rc == 0:
             print("Ultra96 MQTT server started on port 8889")
             print("Subscribed to topic: robot/sensor/to_ultra96")
-            client.subscribe(self.topic_sensor_to_ultra96)
+            client.subscribe(self.topic_sensor_to_ultra96, qos=qos_for(self.topic_sensor_to_ultra96))
         else:
             print(f"Failed to start MQTT server: {rc}")
     
     def on_message(self, client, userdata, msg):
         """Handle incoming MQTT messages from laptop"""
+        # Device timestamps are in seconds on the device's clock, so processing time is
+        # measured locally from message arrival to publish
+        received = time.perf_counter()
         try:
             if msg.topic == self.topic_sensor_to_ultra96:
-                message = json.loads(msg.payload.decode())
+                message = loads(msg.payload)
                 
                 print(f"Received {message['length']} bytes from laptop")
                 print(f"Source: {message.get('source', 'unknown')}")
@@ -157,10 +165,12 @@ class Ultra96ProcessorMQTT:
                     result["csv_written"] = csv_success
                 
                 # 发送处理结果
+                if "processing_time_ms" in result:
+                    result["processing_time_ms"] = round((time.perf_counter() - received) * 1000, 3)
                 self.client.publish(
                     self.topic_processed_data,
-                    json.dumps(result),
-                    qos=1
+                    dumps_response(result),
+                    qos=qos_for(self.topic_processed_data)
                 )
                 
                 print(f"Processed and sent back sequence: {result.get('sequence', 'N/A')}")
@@ -170,7 +180,7 @@ class Ultra96ProcessorMQTT:
         except Exception as e:
             error_msg = f"Error processing MQTT message: {e}"
             print(error_msg)
-            self.client.publish(self.topic_errors, error_msg, qos=1)
+            self.client.publish(self.topic_errors, error_msg, qos=qos_for(self.topic_errors))
     
     def process_binary_sensor_data(self, raw_data):
         """
@@ -249,7 +259,7 @@ class Ultra96ProcessorMQTT:
                     "sensor_count": len(sensor_readings)
                 },
                 "sensor_data": sensor_readings,
-                "processing_time_ms": int((time.time() * 1000) - timestamp),
+                "processing_time_ms": 0,  # set in on_message
                 "processed_at": datetime.now().isoformat(),
                 "status": "success"
             }
@@ -327,7 +337,7 @@ class Ultra96ProcessorMQTT:
                     "sensor_count": len(imu_readings)
                 },
                 "sensor_data": imu_readings,
-                "processing_time_ms": int((time.time() * 1000) - timestamp),
+                "processing_time_ms": 0,  # set in on_message
                 "processed_at": datetime.now().isoformat(),
                 "status": "success"
             }
@@ -389,17 +399,11 @@ class Ultra96ProcessorMQTT:
     def _calculate_emotion(self, sensor_readings):
         """Calculate emotion based on sensor data patterns"""
         try:
-            total_acc = 0
-            count = 0
-            for reading in sensor_readings:
-                acc = reading["acceleration"]
-                total_acc += (acc["x"]**2 + acc["y"]**2 + acc["z"]**2)**0.5
-                count += 1
-            
-            if count == 0:
+            values = readings_to_array(sensor_readings)
+            if len(values) == 0:
                 return "unknown"
-                
-            avg_acc = total_acc / count
+            
+            avg_acc = float(np.sqrt(np.square(values[:, :3]).sum(axis=1)).mean())
             
             if avg_acc < 0.5:
                 return "calm"
@@ -415,32 +419,12 @@ class Ultra96ProcessorMQTT:
     def _determine_activity(self, sensor_readings):
         """Determine activity based on sensor data patterns"""
         try:
-            gyro_variance = 0
-            gyro_means = {"x": 0, "y": 0, "z": 0}
-            count = len(sensor_readings)
-            
-            if count == 0:
+            values = readings_to_array(sensor_readings)
+            if len(values) == 0:
                 return "unknown"
             
-            # Calculate mean values
-            for reading in sensor_readings:
-                gyro = reading["gyroscope"]
-                gyro_means["x"] += gyro["x"]
-                gyro_means["y"] += gyro["y"]
-                gyro_means["z"] += gyro["z"]
-            
-            gyro_means["x"] /= count
-            gyro_means["y"] /= count
-            gyro_means["z"] /= count
-            
-            # Calculate variance
-            for reading in sensor_readings:
-                gyro = reading["gyroscope"]
-                gyro_variance += (gyro["x"] - gyro_means["x"])**2
-                gyro_variance += (gyro["y"] - gyro_means["y"])**2
-                gyro_variance += (gyro["z"] - gyro_means["z"])**2
-            
-            gyro_variance /= count * 3
+            # Variance of gyro x/y/z around their per-axis means, pooled over all IMUs
+            gyro_variance = float(values[:, 3:].var(axis=0).mean())
             
             # Determine activity based on variance
             if gyro_variance < 0.1:
@@ -0,0 +1,142 @@
+import struct
+
+# Binary sensor frame: 5 IMUs x '!6f' (ax, ay, az, gx, gy, gz) = 120 bytes
+FRAME_BYTES = 120
+
+# Batched sensor message on robot/sensor/to_ultra96:
+#   magic (0xA5), version, frame count, frame length, sequence of the first frame
+#   followed by count x frame length bytes. A bare 120-byte payload is a single
+#   unbatched frame (the original format) and carries no sequence.
+#   Version 2 (traced) appends count x FRAME_TRACE: the laptop trace stamps
+#   (tcp_rx, decrypt, publish; see latency_trace.py) of every frame.
+SENSOR_MAGIC = 0xA5
+SENSOR_VERSION = 1
+SENSOR_VERSION_TRACED = 2
+SENSOR_HEADER = struct.Struct("!BBHHI")
+FRAME_TRACE = struct.Struct("!QQQ")
+
+
+def pack_frames(frames, first_seq=0, traces=None):
+    """Pack equally sized frames into one batched sensor message, with per-frame trace stamps if given"""
+    frame_len = len(frames[0]) if frames else FRAME_BYTES
+    version = SENSOR_VERSION_TRACED if traces else SENSOR_VERSION
+    header = SENSOR_HEADER.pack(SENSOR_MAGIC, version, len(frames), frame_len, first_seq & 0xFFFFFFFF)
+    if traces:
+        return header + b"".join(frames) + b"".join([FRAME_TRACE.pack(*trace) for trace in traces])
+    return header + b"".join(frames)
+
+
+def unpack_frames(payload):
+    """Return (first sequence or None, [frame bytes, ...]) for a batched or bare sensor message"""
+    first_seq, frames, _ = unpack_frames_traced(payload)
+    return first_seq, frames
+
+
+def unpack_frames_traced(payload):
+    """Like unpack_frames, plus the per-frame trace stamps (None for an untraced message)"""
+    if len(payload) == FRAME_BYTES:
+        return None, [bytes(payload)], None
+    if len(payload) < SENSOR_HEADER.size:
+        raise ValueError(f"Invalid packet length: {len(payload)}")
+    magic, version, count, frame_len, first_seq = SENSOR_HEADER.unpack_from(payload)
+    if magic != SENSOR_MAGIC or version not in (SENSOR_VERSION, SENSOR_VERSION_TRACED):
+        raise ValueError(f"Unknown sensor message header: magic=0x{magic:02X} version={version}")
+    frames_end = SENSOR_HEADER.size + count * frame_len
+    expected = frames_end + (count * FRAME_TRACE.size if version == SENSOR_VERSION_TRACED else 0)
+    if len(payload) != expected:
+        raise ValueError(f"Batched message length {len(payload)} != {expected} for {count} frames")
+    view = memoryview(payload)
+    frames = [bytes(view[offset:offset + frame_len])
+              for offset in range(SENSOR_HEADER.size, frames_end, frame_len)]
+    traces = None
+    if version == SENSOR_VERSION_TRACED:
+        traces = [FRAME_TRACE.unpack_from(payload, offset) for offset in range(frames_end, expected, FRAME_TRACE.size)]
+    return first_seq, frames, traces
+
+
+# Movement class result on robot/processed/data:
+#   magic (0xA6), version, class id, confidence, source sequence (0xFFFFFFFF = none),
+#   inference timestamp in integer microseconds since the epoch. 20 bytes.
+#   Version 2 (traced) appends RESULT_TRACE: the laptop stamps of the frame that
+#   completed the window followed by the Ultra96 stamps (ultra96_rx, inference,
+#   result_publish), then the responder id (utf-8, clock_sync.RESPONDER_ID) of the
+#   board whose clock took those stamps. 68 bytes + responder id.
+RESULT_MAGIC = 0xA6
+RESULT_VERSION = 1
+RESULT_VERSION_TRACED = 2
+RESULT_STRUCT = struct.Struct("!BBhfIQ")
+RESULT_TRACE = struct.Struct("!6Q")
+NO_SEQUENCE = 0xFFFFFFFF
+
+
+def pack_result(movement_class, confidence, seq=None, ts_us=0, trace=None, responder=""):
+    seq = NO_SEQUENCE if seq is None else seq & 0xFFFFFFFF
+    if trace:
+        return (RESULT_STRUCT.pack(RESULT_MAGIC, RESULT_VERSION_TRACED, movement_class, confidence, seq, ts_us)
+                + RESULT_TRACE.pack(*trace) + responder.encode("utf-8"))
+    return RESULT_STRUCT.pack(RESULT_MAGIC, RESULT_VERSION, movement_class, confidence, seq, ts_us)
+
+
+def _is_traced_result(payload):
+    return len(payload) >= RESULT_STRUCT.size + RESULT_TRACE.size and payload[1] == RESULT_VERSION_TRACED
+
+
+def is_binary_result(payload):
+    return (len(payload) == RESULT_STRUCT.size or _is_traced_result(payload)) and payload[0] == RESULT_MAGIC
+
+
+def unpack_result(payload):
+    """Return (movement class, confidence, sequence or None, timestamp us) of a binary result"""
+    if len(payload) != RESULT_STRUCT.size and not _is_traced_result(payload):
+        raise ValueError(f"Invalid result length: {len(payload)}")
+    magic, version, movement_class, confidence, seq, ts_us = RESULT_STRUCT.unpack_from(payload)
+    expected_version = RESULT_VERSION if len(payload) == RESULT_STRUCT.size else RESULT_VERSION_TRACED
+    if magic != RESULT_MAGIC or version != expected_version:
+        raise ValueError(f"Unknown result header: magic=0x{magic:02X} version={version}")
+    return movement_class, confidence, None if seq == NO_SEQUENCE else seq, ts_us
+
+
+def result_trace(payload):
+    """The six trace stamps of a traced binary result, or None"""
+    if not _is_traced_result(payload):
+        return None
+    return RESULT_TRACE.unpack_from(payload, RESULT_STRUCT.size)
+
+
+def result_responder(payload):
+    """Responder id of the board that stamped a traced result, or None"""
+    if not _is_traced_result(payload):
+        return None
+    return payload[RESULT_STRUCT.size + RESULT_TRACE.size:].decode("utf-8", "replace") or None
+
+
+# Clock sync ping / pong (clock_sync.py) on robot/clock/* or the direct link:
+#   magic (0xA7), kind (0 = ping, 1 = pong), ping id, t1 = ping sent (pinger clock),
+#   t2 = ping received, t3 = pong sent (responder clock), all trace clock microseconds.
+#   A pong is followed by the responder id (utf-8). 30 bytes + responder id.
+CLOCK_MAGIC = 0xA7
+CLOCK_PING = 0
+CLOCK_PONG = 1
+CLOCK_STRUCT = struct.Struct("!BBIQQQ")
+
+
+def pack_clock_ping(ping_id, t1_us):
+    return CLOCK_STRUCT.pack(CLOCK_MAGIC, CLOCK_PING, ping_id & 0xFFFFFFFF, t1_us, 0, 0)
+
+
+def pack_clock_pong(ping_id, t1_us, t2_us, t3_us, responder=""):
+    return CLOCK_STRUCT.pack(CLOCK_MAGIC, CLOCK_PONG, ping_id, t1_us, t2_us, t3_us) + responder.encode("utf-8")
+
+
+def is_clock_message(payload):
+    return len(payload) >= CLOCK_STRUCT.size and payload[0] == CLOCK_MAGIC
+
+
+def unpack_clock(payload):
+    """Return (kind, ping id, t1, t2, t3, responder id) of a clock ping / pong"""
+    if len(payload) < CLOCK_STRUCT.size:
+        raise ValueError(f"Invalid clock message length: {len(payload)}")
+    magic, kind, ping_id, t1_us, t2_us, t3_us = CLOCK_STRUCT.unpack_from(payload)
+    if magic != CLOCK_MAGIC or kind not in (CLOCK_PING, CLOCK_PONG):
+        raise ValueError(f"Unknown clock message header: magic=0x{magic:02X} kind={kind}")
+    return kind, ping_id, t1_us, t2_us, t3_us, bytes(payload[CLOCK_STRUCT.size:]).decode("utf-8")
@@ -1,13 +1,43 @@
+import argparse
 import socket
 import json
 import struct
 import time
-from threading import Thread
-import paho.mqtt.client as mqtt
-import ssl
+from threading import Lock, Thread
 import base64
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
+import os
+import sys
+
+# Shared pipeline modules live in comms/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "comms"))
+from frame_batcher import FrameBatcher
+from direct_link import DEFAULT_PORT as DIRECT_PORT, DirectLinkClient
+from tls_context import client_context, handshake_stats
+from actuators import ActuatorQueue, Actuators
+from mqtt_common import TOPIC_SENSOR, MQTTConnection, Outbox, qos_for, sensor_partition, sensor_topic
+from latency_trace import LatencyTracer, format_breakdown, now_us
+import metrics
+from pipeline_log import get_logger, setup_logging
+from metrics_http import start_exporters, stop_exporters
+from profiling import add_profile_arguments, profile_from_args
+from session_recorder import CHANNEL_TCP, SessionRecorder
+
+log = get_logger("publisher")
+
+
+class SourceState:
+    """Per-source publisher state: latest IMU values, frame batcher and direct link client"""
+
+    def __init__(self, source):
+        self.source = source
+        self.topic = sensor_topic(source)
+        self.imu_values = {}
+        self.batcher = None
+        self.direct = None
+        self.connections = 0
+
 
 class FireBeetleMQTTPublisher:
     def __init__(self):
@@ -30,13 +60,94 @@ class FireBeetleMQTTPublisher:
         self.TLS_CERT = "D:/y4sem1/CG4002/certs/firebeetle.crt"
         self.TLS_KEY = "D:/y4sem1/CG4002/certs/firebeetle.key"
 
-        # MQTT Topics
-        self.topic_sensor_to_ultra96 = "robot/sensor/to_ultra96"
-
-        # MQTT Client
+        # MQTT Topics - every glove (TCP connection) is its own sensor source: frames go to
+        # the source's sensor partition so the same Ultra96 worker always sees them (see
+        # mqtt_common.worker_subscriptions). A glove's source id is SOURCE_NAMES[its IP]
+        # (e.g. {"192.168.1.50": "left"}), else its IP; a second connection from an IP
+        # that is already streaming (several gloves behind one address) gets "<id>:<port>".
+        self.PUBLISHER_ID = socket.gethostname()
+        self.SOURCE_NAMES = {}
+        self.sources = {}   # source id -> SourceState
+        self.sources_lock = Lock()
+        self.topic_sensor_to_ultra96 = TOPIC_SENSOR    # legacy JSON publish_to_mqtt only
+
+        # MQTT Client (MQTT v5 with topic aliases if the broker supports it, else 3.1.1)
+        self.MQTT_V5 = True
         self.mqtt_client = None
 
-        # IMU data storage
+        # Persistent session + offline outbox: while the broker is unreachable frames are
+        # held for at most OUTBOX_MAX_AGE_MS (stale motion is dropped, not replayed) and
+        # control messages are kept until the reconnect.
+        self.MQTT_PERSISTENT = True
+        self.OUTBOX_MAX_AGE_MS = 200
+        self.OUTBOX_MAX_FRAMES = 500
+        self.outbox = Outbox(self.OUTBOX_MAX_AGE_MS, self.OUTBOX_MAX_FRAMES)
+
+        # Transport to the Ultra96: "mqtt" (laptop broker + SSH tunnel) or "direct"
+        # (persistent TLS TCP stream to ultra96_ai.py with TRANSPORT = "direct"; forward
+        # DIRECT_PORT through the tunnel). In direct mode movement classes come back on
+        # the same stream and are sent to FireBeetle / Unity from here (one actuator thread,
+        # see actuators.py) - don't run tcp_unity.py as well.
+        # With DIRECT_WORKERS Ultra96 workers on DIRECT_HOST (ultra96_ai.py --workers N),
+        # worker i listens on DIRECT_PORT + i and a source connects to the worker that owns
+        # its sensor partition, as with MQTT (partition % DIRECT_WORKERS).
+        self.TRANSPORT = "mqtt"
+        self.DIRECT_HOST = "localhost"
+        self.DIRECT_PORT = DIRECT_PORT
+        self.DIRECT_WORKERS = 1
+        self.FIREBEETLE_IP = "172.20.10.10"
+        self.FIREBEETLE_PORT = 5000
+        self.UNITY_IP = "127.0.0.1"
+        self.UNITY_PORT = 6000
+        self.actuators = None
+
+        # Latency tracing: one message in TRACE_EVERY carries tcp_rx / decrypt / publish
+        # stamps (24 bytes per frame, wire_format version 2) and its result comes back with
+        # the Ultra96 stamps; the per-stage breakdown is printed by tcp_unity.py (or here in
+        # direct mode). 0 = off: messages go out exactly as without tracing.
+        self.TRACE_EVERY = 0
+        self.tracer = LatencyTracer()
+
+        # Frame batching (per source): up to BATCH_MAX_FRAMES frames or BATCH_MAX_DELAY_MS per
+        # message. BATCH_MAX_DELAY_MS = 0 publishes every frame on its own (bare 120-byte
+        # payload, or a one-frame traced message for the frames sampled by TRACE_EVERY).
+        self.BATCH_MAX_FRAMES = 10
+        self.BATCH_MAX_DELAY_MS = 0
+
+        # Stage metrics (metrics.py)
+        self.bytes_in = metrics.counter("tcp_bytes_in")
+        self.frames_in = metrics.counter("frames_in")
+        self.decrypt_errors = metrics.counter("decrypt_errors")
+        self.messages_out = metrics.counter("messages_published")
+        self.framing_hist = metrics.histogram("framing")
+        self.decrypt_hist = metrics.histogram("decrypt")
+        self.parse_hist = metrics.histogram("parse")
+        self.publish_hist = metrics.histogram("publish")
+        self.actuator_hist = metrics.histogram("actuator_send")
+        self.end_to_end_hist = metrics.histogram("end_to_end")
+        metrics.gauge("outbox_pending", lambda: len(self.outbox.messages))
+        metrics.gauge("outbox_dropped_stale", lambda: self.outbox.dropped_stale)
+        metrics.gauge("outbox_dropped_overflow", lambda: self.outbox.dropped_overflow)
+        metrics.gauge("sources", lambda: len(self.sources))
+        metrics.gauge("batch_pending", lambda: sum(len(state.batcher.pending) for state in self.sources_list()))
+        metrics.gauge("direct_dropped", lambda: sum(state.direct.dropped for state in self.sources_list()
+                                                    if state.direct))
+        metrics.gauge("actuator_dropped", lambda: self.actuators.dropped if self.actuators else 0)
+        metrics.gauge("mqtt_connected", lambda: int(bool(self.mqtt_client and self.mqtt_client.is_connected())))
+
+        # Metrics endpoint (Prometheus text on http://localhost:METRICS_PORT/metrics) and an
+        # optional JSON-lines dump every METRICS_DUMP_INTERVAL_S
+        self.METRICS_PORT = 9101
+        self.METRICS_DUMP_FILE = None
+        self.METRICS_DUMP_INTERVAL_S = 5
+        self.exporters = []
+
+        # Session recording: every encrypted line from the sensors, with its receive stamp,
+        # is appended to RECORD_FILE (e.g. "session.rec") for session_recorder.py replay
+        self.RECORD_FILE = None
+        self.recorder = None
+
+        # IMU data storage (parse_imu_data without a source; each source keeps its own)
         self.imu_values = {}
 
         # Buffer for TCP data
@@ -61,11 +172,11 @@ class FireBeetleMQTTPublisher:
                         b64 += b'=' * padding
                     encrypted_data = base64.b64decode(b64)
                 except Exception as e:
-                    print(f"Base64 decode failed: {e}")
+                    log.warning("Base64 decode failed: %s", e)
                     return None
 
             if len(encrypted_data) % 16 != 0:
-                print(f"Invalid ciphertext length: {len(encrypted_data)}")
+                log.warning("Invalid ciphertext length: %d", len(encrypted_data))
                 return None
 
             # Decrypt with fixed IV
@@ -78,47 +189,81 @@ class FireBeetleMQTTPublisher:
             return decrypted_bytes
 
         except Exception as e:
-            print(f"Decryption error: {e}")
+            log.warning("Decryption error: %s", e)
             return None
 
 
 
 
+    def configure_tls(self, client):
+        """TLS configuration for the paho client"""
+        # Cached context (certificates loaded once, sessions resumed on reconnect);
+        # no hostname check, for self-signed certificates
+        client.tls_set_context(client_context(self.TLS_CA, self.TLS_CERT, self.TLS_KEY))
+
     def setup_mqtt(self):
         """Setup MQTT connection to laptop broker"""
-        self.mqtt_client = mqtt.Client(client_id="firebeetle_publisher")
-
-        # TLS configuration
-        self.mqtt_client.tls_set(
-            ca_certs=self.TLS_CA,
-            certfile=self.TLS_CERT,
-            keyfile=self.TLS_KEY,
-            tls_version=ssl.PROTOCOL_TLSv1_2
+        self.mqtt_client = MQTTConnection(
+            f"firebeetle_publisher_{self.PUBLISHER_ID}",
+            use_v5=self.MQTT_V5,
+            configure=self.configure_tls,
+            on_connect=self.on_mqtt_connect,
+            on_disconnect=self.on_mqtt_disconnect,
+            persistent=self.MQTT_PERSISTENT,
+            outbox=self.outbox,
+            max_queued=self.OUTBOX_MAX_FRAMES
         )
 
-        # For self-signed certificates
-        self.mqtt_client.tls_insecure_set(True)
-
-        self.mqtt_client.on_connect = self.on_mqtt_connect
-        self.mqtt_client.on_disconnect = self.on_mqtt_disconnect
-
         try:
             self.mqtt_client.connect(self.MQTT_BROKER, self.MQTT_PORT, 60)
-            self.mqtt_client.loop_start()
-            print(f"Connected to MQTT broker at {self.MQTT_BROKER}:{self.MQTT_PORT}")
+            log.info("Connected to MQTT broker at %s:%d", self.MQTT_BROKER, self.MQTT_PORT)
             return True
         except Exception as e:
-            print(f"Failed to connect to MQTT broker: {e}")
+            log.error("Failed to connect to MQTT broker: %s", e)
             return False
 
+    def setup_direct(self, state):
+        """Start the source's direct link to the Ultra96 (connects and reconnects in the background)"""
+        state.direct = DirectLinkClient(
+            self.DIRECT_HOST,
+            self.DIRECT_PORT + sensor_partition(state.source) % self.DIRECT_WORKERS,
+            source=state.source,
+            ssl_context=client_context(self.TLS_CA, self.TLS_CERT, self.TLS_KEY),
+            on_result=lambda *result: self.on_direct_result(*result, state=state)
+        ).start()
+
+    def setup_actuators(self):
+        """FireBeetle / Unity senders for direct mode, on their own thread"""
+        self.actuators = ActuatorQueue(
+            Actuators((self.FIREBEETLE_IP, self.FIREBEETLE_PORT), (self.UNITY_IP, self.UNITY_PORT)),
+            on_sent=self.on_actuated
+        ).start()
+
+    def on_direct_result(self, movement_class, confidence, seq, ts_us, trace=None, responder=None, state=None):
+        """Movement class for a source from the Ultra96 over its direct link (reader thread: only queue it)"""
+        received_us = now_us()
+        log.info("Movement class %s for %s (confidence %.3f, seq %s)", movement_class, state.source, confidence, seq)
+        if not self.actuators.submit(movement_class, (seq, trace, responder, received_us, state)):
+            log.warning("Actuator queue full, dropped movement class %s for %s", movement_class, state.source)
+
+    def on_actuated(self, movement_class, sent_us, send_ms, context):
+        """Actuator thread: a movement class went out to FireBeetle / Unity"""
+        seq, trace, responder, received_us, state = context
+        self.actuator_hist.record_ms(send_ms)
+        if trace and sent_us:
+            breakdown = self.tracer.record(seq, trace, received_us, sent_us, state.direct.clock.offset(responder))
+            self.end_to_end_hist.record_ms(breakdown["total"])
+            log.info("Latency seq %s: %s", seq, format_breakdown(breakdown))
+
     def on_mqtt_connect(self, client, userdata, flags, rc):
         if rc == 0:
-            print("MQTT client connected successfully")
+            log.info("MQTT client connected successfully")
+            log.info("TLS handshake: %s", handshake_stats(client_context(self.TLS_CA, self.TLS_CERT, self.TLS_KEY)))
         else:
-            print(f"MQTT client failed to connect: {rc}")
+            log.error("MQTT client failed to connect: %s", rc)
 
     def on_mqtt_disconnect(self, client, userdata, rc):
-        print(f"MQTT client disconnected: {rc}")
+        log.warning("MQTT client disconnected: %s, queueing up to %d ms of frames", rc, self.OUTBOX_MAX_AGE_MS)
 
     def publish_to_mqtt(self, data, addr):
         """Publish TCP data to MQTT topic"""
@@ -142,89 +287,151 @@ class FireBeetleMQTTPublisher:
                 self.mqtt_client.publish(
                     self.topic_sensor_to_ultra96,
                     json.dumps(message),
-                    qos=1
+                    qos=qos_for(self.topic_sensor_to_ultra96)
                 )
-                print(f"📤 Published {length} bytes to {self.topic_sensor_to_ultra96}")
+                log.debug("Published %d bytes to %s", length, self.topic_sensor_to_ultra96)
             else:
-                print("MQTT client not connected, cannot publish")
+                log.warning("MQTT client not connected, cannot publish")
         except Exception as e:
-            print(f"MQTT publish error: {e}")
+            log.error("MQTT publish error: %s", e)
 
-    def publish_binary_to_mqtt(self, data_bytes):
-        """Publish raw binary payload (not JSON)"""
-        if self.mqtt_client and self.mqtt_client.is_connected():
+    def publish_frames(self, data_bytes, seq=None, state=None):
+        """Send a (batched) sensor message of a source over the configured transport"""
+        start = time.perf_counter()
+        if state.direct:
+            state.direct.send(data_bytes, seq or 0)
+        else:
+            self.publish_binary_to_mqtt(data_bytes, seq, state.topic)
+        self.publish_hist.record_since(start)
+        self.messages_out.inc()
+
+    def publish_binary_to_mqtt(self, data_bytes, seq=None, topic=None):
+        """Publish raw binary payload (not JSON); seq/ts travel as MQTT v5 user properties"""
+        topic = topic or self.topic_sensor_to_ultra96
+        if self.mqtt_client:
+            # Goes to the outbox while disconnected
             self.mqtt_client.publish(
-                self.topic_sensor_to_ultra96,
+                topic,
                 payload=data_bytes,
-                qos=1
+                qos=qos_for(topic),
+                seq=seq,
+                ts=time.time_ns() // 1000
             )
-            print(f"Published {len(data_bytes)} binary bytes to {self.topic_sensor_to_ultra96}")
+            log.debug("Published %d binary bytes to %s", len(data_bytes), topic)
         else:
-            print("MQTT client not connected, cannot publish binary data")
-
+            log.warning("MQTT client not set up, cannot publish binary data")
+
+
+    # ---------------- Sensor sources ----------------
+    def acquire_source(self, addr):
+        """SourceState of a new glove connection"""
+        with self.sources_lock:
+            source = self.SOURCE_NAMES.get(addr[0], addr[0])
+            state = self.sources.get(source)
+            if state is not None and state.connections:
+                source = f"{source}:{addr[1]}"
+                state = None
+            if state is None:
+                state = SourceState(source)
+                state.batcher = FrameBatcher(lambda payload, seq: self.publish_frames(payload, seq, state),
+                                             self.BATCH_MAX_FRAMES, self.BATCH_MAX_DELAY_MS, self.TRACE_EVERY)
+                if self.TRANSPORT == "direct":
+                    self.setup_direct(state)
+                self.sources[source] = state
+            state.connections += 1
+        return state
+
+    def release_source(self, state):
+        """Glove disconnected: flush its batch; per-port sources are not reused, so drop them"""
+        state.batcher.flush()
+        with self.sources_lock:
+            state.connections -= 1
+            if state.connections or ":" not in state.source:
+                return
+            del self.sources[state.source]
+        self.close_source(state)
+
+    def close_source(self, state):
+        state.batcher.close()
+        if state.direct:
+            state.direct.stop()
+
+    def sources_list(self):
+        with self.sources_lock:
+            return list(self.sources.values())
 
     def handle_tcp_client(self, client_socket, addr):
         """Handle incoming TCP connections from sensors"""
-        print(f"🔌 TCP connection from {addr}")
+        state = self.acquire_source(addr)
+        log.info("TCP connection from %s (source %s)", addr, state.source)
         buffer = b""
         try:
             while True:
                 data = client_socket.recv(2048)  # buffer size
                 if not data:
                     break
+                received_us = now_us()
+                self.bytes_in.inc(len(data))
 
                 # Add to buffer
                 buffer += data
 
                 # Process complete messages (delimited by newline)
                 while b'\n' in buffer:
+                    start = time.perf_counter()
                     message_b, buffer = buffer.split(b'\n', 1)
                     encrypted_b64_bytes = message_b.strip()   # KEEP as bytes
+                    self.framing_hist.record_since(start)
 
                     if not encrypted_b64_bytes:
                         continue
+                    if self.recorder:
+                        self.recorder.record(CHANNEL_TCP, state.source, encrypted_b64_bytes, received_us)
 
                     # Decrypt the message (pass bytes)
                     # Decrypt the message (pass bytes) -> now returns bytes or None
+                    start = time.perf_counter()
                     decrypted_bytes = self.decrypt_data(encrypted_b64_bytes)
+                    self.decrypt_hist.record_since(start)
+                    decrypted_us = now_us()
                     if decrypted_bytes is not None:
-                        # Try print human-readable text if it is text
-                        try:
-                            text = decrypted_bytes.decode('utf-8')
-                            print(f"Decrypted text (preview): {text[:80]}...")
-                        except UnicodeDecodeError:
-                            # Not text — print hex preview
-                            print(f"Decrypted raw bytes (hex preview): {decrypted_bytes[:24].hex()}...")
-
+                        self.frames_in.inc()
                         # First, parse decrypted text if possible
+                        start = time.perf_counter()
                         try:
                             decoded = decrypted_bytes.decode('utf-8')
-                            self.parse_imu_data(decoded)  # <-- parse BEFORE packing
+                            log.debug("Decrypted text (preview): %.80s...", decoded)
+                            self.parse_imu_data(decoded, state.imu_values)  # <-- parse BEFORE packing
                         except UnicodeDecodeError:
                             # binary packet — do NOT call parse_imu_data
-                            pass
+                            log.debug("Decrypted raw bytes (hex preview): %s...", decrypted_bytes[:24].hex())
 
                         # Pack IMUs in the order they are received
                         imu_bytes = b''
                         for imu_label in ["IMU0","IMU1","IMU2","IMU3","IMU4"]:  # adjust if your labels differ
-                            imu_list = self.imu_values.get(imu_label, [0.0]*6)
+                            imu_list = state.imu_values.get(imu_label, [0.0]*6)
                             imu_list = [float(v) for v in imu_list]
                             imu_bytes += struct.pack('!6f', *imu_list)
+                        self.parse_hist.record_since(start)
 
-                        # Publish the packed binary data
-                        self.publish_binary_to_mqtt(imu_bytes)
+                        # Publish the packed binary data (batched if enabled)
+                        state.batcher.add(imu_bytes, (received_us, decrypted_us) if self.TRACE_EVERY else None)
 
                     else:
-                        print(f"Failed to decrypt message: {encrypted_b64_bytes[:50]!r}...")
+                        self.decrypt_errors.inc()
+                        log.warning("Failed to decrypt message: %r...", encrypted_b64_bytes[:50])
 
         except Exception as e:
-            print(f"Error with TCP client {addr}: {e}")
+            log.error("Error with TCP client %s: %s", addr, e)
         finally:
             client_socket.close()
-            print(f"🔌 TCP connection from {addr} closed")
+            self.release_source(state)
+            log.info("TCP connection from %s closed", addr)
 
-    def parse_imu_data(self, data):
+    def parse_imu_data(self, data, imu_values=None):
         """Parse IMU data for display — expects a plain Python string"""
+        if imu_values is None:
+            imu_values = self.imu_values
         try:
             imu_data = data.strip().split(";")
             for imu in imu_data:
@@ -234,13 +441,12 @@ class FireBeetleMQTTPublisher:
                 nums = values.split(",")
                 while len(nums) < 6:
                     nums.append("---")
-                self.imu_values[label] = nums[:6]
+                imu_values[label] = nums[:6]
 
                 # Display IMU data (optional)
-                print(f"{label}: Accel({nums[0]}, {nums[1]}, {nums[2]}), "
-                    f"Gyro({nums[3]}, {nums[4]}, {nums[5]})")
+                log.debug("%s: Accel(%s, %s, %s), Gyro(%s, %s, %s)", label, *nums[:6])
         except Exception as e:
-            print(f"Error parsing IMU data: {e}")
+            log.warning("Error parsing IMU data: %s", e)
 
 
     def start_tcp_server(self):
@@ -249,7 +455,7 @@ class FireBeetleMQTTPublisher:
         tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         tcp_socket.bind((self.TCP_IP, self.TCP_PORT))
         tcp_socket.listen(5)
-        print(f"🔌 TCP server listening on {self.TCP_IP}:{self.TCP_PORT}")
+        log.info("TCP server listening on %s:%d", self.TCP_IP, self.TCP_PORT)
         try:
             while True:
                 client_socket, addr = tcp_socket.accept()
@@ -260,21 +466,54 @@ class FireBeetleMQTTPublisher:
                 client_thread.daemon = True
                 client_thread.start()
         except KeyboardInterrupt:
-            print("TCP server shutting down...")
+            log.info("TCP server shutting down...")
         finally:
             tcp_socket.close()
+            for state in self.sources_list():
+                self.close_source(state)
+            if self.actuators:
+                self.actuators.stop()
+            if self.tracer.traces:
+                log.info("Latency breakdown (%d traces): %s", self.tracer.traces, self.tracer.stats())
+            log.info("Metrics:\n%s", metrics.format_snapshot(metrics.snapshot()))
+            stop_exporters(self.exporters)
+            if self.recorder:
+                self.recorder.close()
+                log.info("Session recorded to %s: %s", self.RECORD_FILE, self.recorder.stats())
             if self.mqtt_client:
                 self.mqtt_client.loop_stop()
                 self.mqtt_client.disconnect()
 
     def start(self):
         """Start the FireBeetle publisher"""
-        print("Starting FireBeetle as MQTT Publisher...")
+        self.exporters = start_exporters(self.METRICS_PORT, self.METRICS_DUMP_FILE, self.METRICS_DUMP_INTERVAL_S,
+                                         {"component": "publisher"})
+        if self.RECORD_FILE:
+            self.recorder = SessionRecorder(self.RECORD_FILE)
+            log.info("Recording sensor session to %s", self.RECORD_FILE)
+        if self.TRANSPORT == "direct":
+            log.info("Starting FireBeetle publisher on the direct link...")
+            self.setup_actuators()
+            self.start_tcp_server()
+            return
+        log.info("Starting FireBeetle as MQTT Publisher...")
         if not self.setup_mqtt():
-            print("Failed to setup MQTT, exiting...")
+            log.error("Failed to setup MQTT, exiting...")
             return
         self.start_tcp_server()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FireBeetle TCP -> MQTT / direct link publisher")
+    parser.add_argument("--trace-every", type=int, default=0, metavar="N",
+                        help="carry latency trace stamps in one message in N (0 = off)")
+    parser.add_argument("--record", metavar="PATH", help="record the sensor session to PATH (session_recorder.py)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    setup_logging()
+    profile = profile_from_args(args, "profile_publisher.folded")
     publisher = FireBeetleMQTTPublisher()
-    publisher.start() 
\ No newline at end of file
+    publisher.TRACE_EVERY = args.trace_every
+    publisher.RECORD_FILE = args.record
+    publisher.start()
+    if profile:
+        profile.finish()